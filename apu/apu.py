@@ -8,6 +8,7 @@ from collections import deque
 
 if TYPE_CHECKING:
     from memory.memory_bus import MemoryBus
+    from hw.scheduler import Scheduler
 
 # Constantes de audio
 SAMPLE_RATE = 32768
@@ -148,6 +149,16 @@ class SquareChannel:
             self.timer = (2048 - self.frequency) * 4
             self.duty_position = (self.duty_position + 1) & 7
     
+    def advance(self, cycles: int) -> None:
+        """Equivale a llamar step() `cycles` veces"""
+        timer = max(self.timer, 1) - cycles
+        if timer <= 0:
+            period = (2048 - self.frequency) * 4
+            steps = 1 + (-timer) // period
+            timer += steps * period
+            self.duty_position = (self.duty_position + steps) & 7
+        self.timer = timer
+    
     def get_sample(self) -> int:
         """Obtiene el sample actual (-15 a 15)"""
         if not self.enabled:
@@ -215,6 +226,16 @@ class WaveChannel:
             self.timer = (2048 - self.frequency) * 2
             self.position = (self.position + 1) & 31
     
+    def advance(self, cycles: int) -> None:
+        """Equivale a llamar step() `cycles` veces"""
+        timer = max(self.timer, 1) - cycles
+        if timer <= 0:
+            period = (2048 - self.frequency) * 2
+            steps = 1 + (-timer) // period
+            timer += steps * period
+            self.position = (self.position + steps) & 31
+        self.timer = timer
+    
     def get_sample(self) -> int:
         """Obtiene el sample actual"""
         if not self.enabled or not self.dac_enabled:
@@ -311,16 +332,28 @@ class NoiseChannel:
         self.timer -= 1
         if self.timer <= 0:
             self._reload_timer()
-            
-            # XOR bits 0 y 1
-            xor_result = (self.lfsr & 1) ^ ((self.lfsr >> 1) & 1)
-            
-            # Shift y set bit 14
-            self.lfsr = (self.lfsr >> 1) | (xor_result << 14)
-            
-            # Si modo 7-bit, también set bit 6
-            if self.width_mode:
-                self.lfsr = (self.lfsr & ~0x40) | (xor_result << 6)
+            self._clock_lfsr()
+    
+    def advance(self, cycles: int) -> None:
+        """Equivale a llamar step() `cycles` veces"""
+        timer = max(self.timer, 1) - cycles
+        while timer <= 0:
+            self._reload_timer()
+            timer += self.timer
+            self._clock_lfsr()
+        self.timer = timer
+    
+    def _clock_lfsr(self) -> None:
+        """Avanza el LFSR un paso"""
+        # XOR bits 0 y 1
+        xor_result = (self.lfsr & 1) ^ ((self.lfsr >> 1) & 1)
+        
+        # Shift y set bit 14
+        self.lfsr = (self.lfsr >> 1) | (xor_result << 14)
+        
+        # Si modo 7-bit, también set bit 6
+        if self.width_mode:
+            self.lfsr = (self.lfsr & ~0x40) | (xor_result << 6)
     
     def get_sample(self) -> int:
         """Obtiene el sample actual"""
@@ -352,9 +385,9 @@ class DirectSoundChannel:
         self.fifo.clear()
         self.current_sample = 0
     
-    def write_fifo(self, value: int) -> None:
-        """Escribe 4 bytes al FIFO"""
-        for i in range(4):
+    def write_fifo(self, value: int, count: int = 4) -> None:
+        """Escribe al FIFO los `count` bytes bajos de value (4, 2 o 1)"""
+        for i in range(count):
             sample = (value >> (i * 8)) & 0xFF
             # Convertir a signed
             if sample >= 128:
@@ -426,6 +459,9 @@ class APU:
         self.sample_counter = 0
         self.sample_buffer: List[tuple] = []
         self.buffer_size = 2048
+        
+        # Planificador de eventos (None: avanzar con step())
+        self.scheduler: Optional['Scheduler'] = None
     
     def reset(self) -> None:
         """Reinicia la APU"""
@@ -441,6 +477,9 @@ class APU:
         self.frame_sequencer_step = 0
         self.sample_counter = 0
         self.sample_buffer.clear()
+        
+        if self.scheduler is not None:
+            self._update_schedule()
     
     def step(self, cycles: int) -> None:
         """Avanza la APU por un número de ciclos"""
@@ -452,6 +491,37 @@ class APU:
             self._step_channels()
             self._generate_sample()
     
+    # ===== Eventos del planificador =====
+    
+    def attach_scheduler(self, scheduler: 'Scheduler') -> None:
+        """Pasa a avanzar por eventos (samples y frame sequencer)"""
+        self.scheduler = scheduler
+        self._update_schedule()
+    
+    def _update_schedule(self) -> None:
+        """Programa o cancela los eventos según el master enable"""
+        if self.master_enable:
+            if not self.scheduler.is_scheduled('apu_sample'):
+                self.scheduler.schedule('apu_sample', CYCLES_PER_SAMPLE, self._on_sample)
+                self.scheduler.schedule('apu_sequencer', 8192, self._on_frame_sequencer)
+        else:
+            self.scheduler.cancel('apu_sample')
+            self.scheduler.cancel('apu_sequencer')
+    
+    def _on_sample(self, late: int) -> None:
+        """Evento: avanzar los canales y generar un sample"""
+        self.channel1.advance(CYCLES_PER_SAMPLE)
+        self.channel2.advance(CYCLES_PER_SAMPLE)
+        self.channel3.advance(CYCLES_PER_SAMPLE)
+        self.channel4.advance(CYCLES_PER_SAMPLE)
+        self._mix_sample()
+        self.scheduler.schedule('apu_sample', CYCLES_PER_SAMPLE - late, self._on_sample)
+    
+    def _on_frame_sequencer(self, late: int) -> None:
+        """Evento: paso del frame sequencer (2048 Hz)"""
+        self._clock_frame_sequencer()
+        self.scheduler.schedule('apu_sequencer', 8192 - late, self._on_frame_sequencer)
+    
     def _step_frame_sequencer(self) -> None:
         """Frame sequencer para controlar timing de PSG"""
         self.frame_sequencer_counter += 1
@@ -459,25 +529,28 @@ class APU:
         # Frame sequencer corre a CPU_FREQ / 8192 = 2048 Hz
         if self.frame_sequencer_counter >= 8192:
             self.frame_sequencer_counter = 0
-            
-            # Step 0, 2, 4, 6: Length
-            if self.frame_sequencer_step % 2 == 0:
-                self.channel1.step_length()
-                self.channel2.step_length()
-                self.channel3.step_length()
-                self.channel4.step_length()
-            
-            # Step 2, 6: Sweep
-            if self.frame_sequencer_step in (2, 6):
-                self.channel1.step_sweep()
-            
-            # Step 7: Envelope
-            if self.frame_sequencer_step == 7:
-                self.channel1.step_envelope()
-                self.channel2.step_envelope()
-                self.channel4.step_envelope()
-            
-            self.frame_sequencer_step = (self.frame_sequencer_step + 1) & 7
+            self._clock_frame_sequencer()
+    
+    def _clock_frame_sequencer(self) -> None:
+        """Un paso del frame sequencer (length, sweep y envelope)"""
+        # Step 0, 2, 4, 6: Length
+        if self.frame_sequencer_step % 2 == 0:
+            self.channel1.step_length()
+            self.channel2.step_length()
+            self.channel3.step_length()
+            self.channel4.step_length()
+        
+        # Step 2, 6: Sweep
+        if self.frame_sequencer_step in (2, 6):
+            self.channel1.step_sweep()
+        
+        # Step 7: Envelope
+        if self.frame_sequencer_step == 7:
+            self.channel1.step_envelope()
+            self.channel2.step_envelope()
+            self.channel4.step_envelope()
+        
+        self.frame_sequencer_step = (self.frame_sequencer_step + 1) & 7
     
     def _step_channels(self) -> None:
         """Avanza los canales de audio"""
@@ -492,56 +565,59 @@ class APU:
         
         if self.sample_counter >= CYCLES_PER_SAMPLE:
             self.sample_counter = 0
-            
-            # Mezclar canales PSG
-            psg_left = 0
-            psg_right = 0
-            
-            samples = [
-                self.channel1.get_sample(),
-                self.channel2.get_sample(),
-                self.channel3.get_sample(),
-                self.channel4.get_sample(),
-            ]
-            
-            for i, sample in enumerate(samples):
-                if self.psg_enable_left[i]:
-                    psg_left += sample
-                if self.psg_enable_right[i]:
-                    psg_right += sample
-            
-            # Aplicar volumen PSG
-            psg_left = (psg_left * (self.psg_volume_left + 1)) >> 3
-            psg_right = (psg_right * (self.psg_volume_right + 1)) >> 3
-            
-            # Aplicar volumen master PSG
-            psg_shifts = [2, 1, 0, 0]  # 25%, 50%, 100%, prohibited
-            psg_left >>= psg_shifts[self.psg_master_volume]
-            psg_right >>= psg_shifts[self.psg_master_volume]
-            
-            # Añadir DMA
-            left = psg_left
-            right = psg_right
-            
-            dma_a_sample = self.dma_a.get_sample()
-            dma_b_sample = self.dma_b.get_sample()
-            
-            if self.dma_a.enable_left:
-                left += dma_a_sample
-            if self.dma_a.enable_right:
-                right += dma_a_sample
-            if self.dma_b.enable_left:
-                left += dma_b_sample
-            if self.dma_b.enable_right:
-                right += dma_b_sample
-            
-            # Aplicar bias y clamp
-            left = self._apply_bias(left)
-            right = self._apply_bias(right)
-            
-            # Añadir al buffer
-            if len(self.sample_buffer) < self.buffer_size:
-                self.sample_buffer.append((left, right))
+            self._mix_sample()
+    
+    def _mix_sample(self) -> None:
+        """Mezcla los canales y añade un sample al buffer"""
+        # Mezclar canales PSG
+        psg_left = 0
+        psg_right = 0
+        
+        samples = [
+            self.channel1.get_sample(),
+            self.channel2.get_sample(),
+            self.channel3.get_sample(),
+            self.channel4.get_sample(),
+        ]
+        
+        for i, sample in enumerate(samples):
+            if self.psg_enable_left[i]:
+                psg_left += sample
+            if self.psg_enable_right[i]:
+                psg_right += sample
+        
+        # Aplicar volumen PSG
+        psg_left = (psg_left * (self.psg_volume_left + 1)) >> 3
+        psg_right = (psg_right * (self.psg_volume_right + 1)) >> 3
+        
+        # Aplicar volumen master PSG
+        psg_shifts = [2, 1, 0, 0]  # 25%, 50%, 100%, prohibited
+        psg_left >>= psg_shifts[self.psg_master_volume]
+        psg_right >>= psg_shifts[self.psg_master_volume]
+        
+        # Añadir DMA
+        left = psg_left
+        right = psg_right
+        
+        dma_a_sample = self.dma_a.get_sample()
+        dma_b_sample = self.dma_b.get_sample()
+        
+        if self.dma_a.enable_left:
+            left += dma_a_sample
+        if self.dma_a.enable_right:
+            right += dma_a_sample
+        if self.dma_b.enable_left:
+            left += dma_b_sample
+        if self.dma_b.enable_right:
+            right += dma_b_sample
+        
+        # Aplicar bias y clamp
+        left = self._apply_bias(left)
+        right = self._apply_bias(right)
+        
+        # Añadir al buffer
+        if len(self.sample_buffer) < self.buffer_size:
+            self.sample_buffer.append((left, right))
     
     def _apply_bias(self, sample: int) -> int:
         """Aplica bias y limita el sample"""
@@ -675,6 +751,9 @@ class APU:
             self.channel2.reset()
             self.channel3.reset()
             self.channel4.reset()
+        
+        if self.scheduler is not None:
+            self._update_schedule()
     
     def write_soundbias(self, value: int) -> None:
         """SOUNDBIAS - Sound PWM Control"""
@@ -688,13 +767,13 @@ class APU:
         self.channel3.wave_ram[idx] = (value >> 4) & 0x0F
         self.channel3.wave_ram[idx + 1] = value & 0x0F
     
-    def write_fifo_a(self, value: int) -> None:
+    def write_fifo_a(self, value: int, count: int = 4) -> None:
         """Escribe al FIFO A"""
-        self.dma_a.write_fifo(value)
+        self.dma_a.write_fifo(value, count)
     
-    def write_fifo_b(self, value: int) -> None:
+    def write_fifo_b(self, value: int, count: int = 4) -> None:
         """Escribe al FIFO B"""
-        self.dma_b.write_fifo(value)
+        self.dma_b.write_fifo(value, count)
     
     def timer_overflow(self, timer_id: int) -> None:
         """Llamado cuando un timer hace overflow"""
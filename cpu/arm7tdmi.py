@@ -1,10 +1,16 @@
 """
 ARM7TDMI CPU Core - CORREGIDO
 """
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 from .registers import CPURegisters, CPUMode, PSRFlags
 from .arm_instructions import ARMInstructions
 from .thumb_instructions import ThumbInstructions
+from .block_cache import BlockCache
+from .jit import BlockCompiler, JIT_THRESHOLD
+from .bios_hle import BiosHLE
+from .profiler import Profiler
+from .trace import TraceBuffer, TRACE_SIZE
+from .disassembler import Disassembler
 
 if TYPE_CHECKING:
     from memory.memory_bus import MemoryBus
@@ -24,7 +30,14 @@ class ARM7TDMI:
     VECTOR_IRQ       = 0x00000018
     VECTOR_FIQ       = 0x0000001C
     
-    def __init__(self, memory: 'MemoryBus'):
+    def __init__(self, memory: 'MemoryBus', bios_hle: Optional[bool] = None):
+        """
+        Args:
+            memory: Bus de memoria
+            bios_hle: True fuerza la HLE de los SWIs aunque haya BIOS, False
+                la desactiva y None (por defecto) la usa solo mientras no
+                haya una imagen de BIOS cargada
+        """
         self.memory = memory
         self.registers = CPURegisters()
         
@@ -32,15 +45,53 @@ class ARM7TDMI:
         self.arm_decoder = ARMInstructions(self)
         self.thumb_decoder = ThumbInstructions(self)
         
+        # Caché de bloques básicos pre-decodificados
+        self.block_cache = BlockCache(self)
+        self._block_exit = False
+        
+        # Pedido de salida del lote de run_cycles (DMA, cambio de timers...)
+        self._exit_requested = False
+        
+        # IRQ pedida a mitad de instrucción: se atiende al terminar el bloque
+        self._interrupt_pending = False
+        
+        # JIT para bloques calientes (None para usar solo el intérprete)
+        self.jit = BlockCompiler(self)
+        
+        # SWIs del BIOS emulados en alto nivel (None para usar siempre el BIOS)
+        self.bios_hle = BiosHLE(self) if bios_hle is not False else None
+        self.bios_hle_forced = bool(bios_hle)
+        
+        # Detección de bucles de espera (saltan directo al próximo evento)
+        self.idle_skip = True
+        self._idle_state = None
+        self._idle_detected = False
+        self.idle_cycles_skipped = 0
+        
+        # Profiler opcional (ver enable_profiler)
+        self.profiler = None
+        
+        # Trace de las últimas instrucciones (ver enable_trace)
+        self.trace = None
+        
+        # Desensamblador para depuración (trace, profiler, estado)
+        self.disassembler = Disassembler(self)
+        
         # Pipeline - NO pre-llenado
         self.pipeline_valid = False
         
         # Ciclos
         self.cycles = 0
         
+        # self.cycles al empezar el lote de run_cycles en curso y bloque que
+        # se está ejecutando (ver batch_cycles)
+        self._batch_start = 0
+        self._current_block = None
+        
         # Estado
         self.halted = False
         self.stopped = False
+        self.halted_cycles = 0
         
         # Debug
         self._current_instruction = 0
@@ -51,8 +102,13 @@ class ARM7TDMI:
         self.registers.reset()
         self.pipeline_valid = False
         self.cycles = 0
+        self._batch_start = 0
+        self._current_block = None
+        self._interrupt_pending = False
         self.halted = False
         self.stopped = False
+        if self.bios_hle is not None:
+            self.bios_hle.reset()
         print(f"CPU Reset - PC: {self.registers.pc:08X}")
     
     def flush_pipeline(self) -> None:
@@ -67,29 +123,299 @@ class ARM7TDMI:
         # Guardar PC de la instrucción actual ANTES de fetch
         self._current_pc = self.registers.pc
         
+        trace = self.trace
+        if trace is not None:
+            trace_cpsr = self.registers.cpsr
+        
         # Fetch de la instrucción
         if self.registers.thumb_mode:
             instruction = self.memory.read_16(self.registers.pc)
-            self.registers._r15 = (self.registers.pc + 2) & 0xFFFFFFFF
+            self.registers._regs[15] = (self.registers.pc + 2) & 0xFFFFFFFF
         else:
             instruction = self.memory.read_32(self.registers.pc)
-            self.registers._r15 = (self.registers.pc + 4) & 0xFFFFFFFF
+            self.registers._regs[15] = (self.registers.pc + 4) & 0xFFFFFFFF
         
         self._current_instruction = instruction
         
+        if trace is not None:
+            trace.record(self._current_pc, instruction, trace_cpsr)
+        
         # Execute
         if self.registers.thumb_mode:
             cycles = self.thumb_decoder.execute(instruction)
         else:
             cond = (instruction >> 28) & 0xF
-            if self.registers.check_condition(cond):
+            if cond == 0xE or self.registers.check_condition(cond):
                 cycles = self.arm_decoder.execute(instruction)
             else:
                 cycles = 1
+        
+        # El fetch ya contó sus esperas en el bus
+        memory = self.memory
+        cycles += memory.stall_cycles
+        memory.stall_cycles = 0
             
         self.cycles += cycles
+        if self._interrupt_pending:
+            self._interrupt_pending = False
+            memory.check_interrupts()
         return cycles
     
+    def execute_block(self) -> int:
+        """
+        Ejecuta un bloque básico completo desde la caché
+        
+        El bloque se interrumpe en cuanto PC deja de ser secuencial
+        (salto, IRQ, excepción) o si se invalida/detiene la CPU.
+        
+        Returns:
+            Ciclos consumidos por todo el bloque
+        """
+        if self.halted:
+            return 1
+        
+        reg = self.registers
+        pc = reg.pc
+        thumb = reg.thumb_mode
+        block = self.block_cache.lookup(pc, thumb)
+        if block is None:
+            return self.step()
+        
+        self._block_exit = False
+        self._current_block = block
+        
+        idle_candidate = block.idle_candidate and self.idle_skip
+        if idle_candidate:
+            self.memory.volatile_read = False
+        else:
+            self._idle_state = None
+        
+        # Se registra antes de ejecutar, para que un volcado a mitad de
+        # bloque (instrucción indefinida) lo incluya, y la cuenta de
+        # instrucciones se corrige al terminar
+        trace = self.trace
+        if trace is not None:
+            trace.record_block(block, len(block.entries), reg.cpsr)
+        
+        memory = self.memory
+        compiled = block.compiled
+        if compiled:
+            cycles = compiled(self, reg, memory)
+        else:
+            cycles = self._interpret_block(block, pc, thumb)
+        
+        # Intérprete y JIT dejan en _current_pc la última instrucción
+        # ejecutada (el bloque puede salir antes de su final)
+        sequential = (self._current_pc - pc) >> (1 if thumb else 2)
+        if trace is not None:
+            trace.set_last_count(sequential + 1)
+        
+        # Esperas del fetch de las instrucciones ejecutadas (N la primera,
+        # S el resto) y de los accesos a datos acumulados en el bus
+        region = (block.pc >> 24) & 0xF
+        if thumb:
+            cycles += memory.wait_n16[region] + sequential * memory.fetch_wait_16[region]
+        else:
+            cycles += memory.wait_n32[region] + sequential * memory.fetch_wait_32[region]
+        cycles += memory.stall_cycles
+        memory.stall_cycles = 0
+        
+        self.cycles += cycles
+        self._current_block = None
+        if self._interrupt_pending:
+            self._interrupt_pending = False
+            memory.check_interrupts()
+        if idle_candidate:
+            self._check_idle_loop(block)
+        return cycles
+    
+    def _interpret_block(self, block, pc: int, thumb: bool) -> int:
+        """Ejecuta un bloque con el intérprete (y lo compila si está caliente)"""
+        block.exec_count += 1
+        if block.compiled is None and block.exec_count >= JIT_THRESHOLD and self.jit is not None:
+            block.compiled = self.jit.compile(block) or False
+        
+        reg = self.registers
+        cycles = 0
+        regs = reg._regs
+        
+        if thumb:
+            for handler, instruction in block.entries:
+                self._current_pc = pc
+                self._current_instruction = instruction
+                pc += 2
+                regs[15] = pc
+                cycles += handler(instruction)
+                if regs[15] != pc or self._block_exit:
+                    break
+        else:
+            check_condition = reg.check_condition
+            for handler, instruction, cond in block.entries:
+                self._current_pc = pc
+                self._current_instruction = instruction
+                pc += 4
+                regs[15] = pc
+                if cond == 0xE or check_condition(cond):
+                    cycles += handler(instruction)
+                else:
+                    cycles += 1
+                if regs[15] != pc or self._block_exit:
+                    break
+        
+        return cycles
+    
+    def _check_idle_loop(self, block) -> None:
+        """
+        Confirma un bucle de espera tras una vuelta de un bloque candidato
+        
+        Si el bloque volvió a su inicio sin leer registros que cambian con
+        cada ciclo (contadores de timer) y el estado de la CPU es idéntico
+        al de la vuelta anterior, nada cambiará hasta el próximo evento de
+        hardware: se pide salir del lote para saltar el tiempo restante.
+        """
+        reg = self.registers
+        regs = reg._regs
+        if regs[15] != block.pc or self.memory.volatile_read:
+            self._idle_state = None
+            return
+        
+        state = (*regs, reg.flag_n, reg.flag_z, reg.flag_c, reg.flag_v)
+        if state == self._idle_state:
+            self._idle_detected = True
+            self._exit_requested = True
+        else:
+            self._idle_state = state
+    
+    def run_cycles(self, cycles: int) -> int:
+        """
+        Ejecuta bloques en un bucle local hasta consumir al menos `cycles`
+        
+        Sale antes si un periférico pide salir con request_exit() (p.ej.
+        al iniciar un DMA). En HALT/STOP o si se detecta un bucle de espera
+        se consume el resto del lote de golpe: la CPU solo puede despertar
+        con una IRQ, así que el llamador debe limitar `cycles` al próximo
+        evento de hardware.
+        
+        Returns:
+            Ciclos realmente consumidos
+        """
+        if self.halted:
+            self.cycles += cycles
+            self.halted_cycles += cycles
+            self._batch_start = self.cycles
+            return cycles
+        
+        self._batch_start = self.cycles
+        self._exit_requested = False
+        self._idle_detected = False
+        execute_block = self.execute_block
+        executed = 0
+        
+        while executed < cycles:
+            executed += execute_block()
+            if self._exit_requested or self.halted:
+                if executed < cycles:
+                    skipped = cycles - executed
+                    if self.halted:
+                        self.cycles += skipped
+                        self.halted_cycles += skipped
+                        executed = cycles
+                    elif self._idle_detected:
+                        self.cycles += skipped
+                        self.idle_cycles_skipped += skipped
+                        executed = cycles
+                break
+        
+        # Fuera del lote el planificador ya cuenta estos ciclos
+        self._batch_start = self.cycles
+        return executed
+    
+    def batch_cycles(self) -> int:
+        """
+        Ciclos transcurridos desde el inicio del lote de run_cycles en curso
+        
+        El planificador solo avanza al terminar el lote, así que un
+        periférico leído a mitad de lote (contador de timer) suma esto a su
+        timestamp. La parte ya ejecutada del bloque en curso se estima por
+        las instrucciones hasta _current_pc (un ciclo más la espera de fetch
+        cada una) y las esperas de datos acumuladas en el bus.
+        """
+        memory = self.memory
+        elapsed = self.cycles - self._batch_start + memory.stall_cycles
+        
+        block = self._current_block
+        if block is not None:
+            region = (block.pc >> 24) & 0xF
+            if block.thumb:
+                done = (self._current_pc - block.pc) >> 1
+                fetch = memory.fetch_wait_16[region]
+            else:
+                done = (self._current_pc - block.pc) >> 2
+                fetch = memory.fetch_wait_32[region]
+            if 0 < done < len(block.entries):
+                elapsed += done * (1 + fetch)
+        
+        return elapsed
+    
+    def run_until(self, cycle_target: int) -> int:
+        """
+        Ejecuta hasta que el contador total de ciclos alcance cycle_target
+        
+        Returns:
+            Ciclos consumidos
+        """
+        return self.run_cycles(cycle_target - self.cycles)
+    
+    def enable_profiler(self) -> Profiler:
+        """Activa el profiler por PC/bloque (sin coste mientras está apagado)"""
+        if self.profiler is None:
+            self.profiler = Profiler(self)
+        self.profiler.attach()
+        return self.profiler
+    
+    def disable_profiler(self) -> None:
+        """Desactiva el profiler conservando sus resultados"""
+        if self.profiler is not None:
+            self.profiler.detach()
+    
+    def enable_trace(self, size: int = TRACE_SIZE) -> TraceBuffer:
+        """Activa el trace de las últimas `size` instrucciones ejecutadas"""
+        if self.trace is None or self.trace.size != size:
+            self.trace = TraceBuffer(size)
+        return self.trace
+    
+    def disable_trace(self) -> None:
+        self.trace = None
+    
+    def undefined_instruction(self, instruction: int) -> None:
+        """Instrucción no reconocida: vuelca el trace (si está activo)"""
+        if self.trace is None:
+            return
+        # El bloque en curso está registrado entero: solo hasta esta instrucción
+        block = self._current_block
+        if block is not None:
+            shift = 1 if block.thumb else 2
+            self.trace.set_last_count(((self._current_pc - block.pc) >> shift) + 1)
+        print(f"Instrucción indefinida {instruction:08X} en {self._current_pc:08X}")
+        print(self.trace.dump(32, self.disassembler))
+    
+    def request_exit(self) -> None:
+        """Termina el bloque y el lote de run_cycles en curso"""
+        self._exit_requested = True
+        self._block_exit = True
+    
+    def defer_interrupt(self) -> None:
+        """
+        Atiende IE/IF al terminar el bloque en curso
+        
+        Para IRQs que se levantan a mitad de una instrucción (un overflow
+        de timer al leer su contador): entrar en modo IRQ ahí dejaría a la
+        instrucción, o a las variables locales de un bloque compilado,
+        escribiendo sobre los registros del modo IRQ.
+        """
+        self._interrupt_pending = True
+        self._block_exit = True
+    
     def get_prefetch_pc(self) -> int:
         """
         Obtiene el valor de PC que se ve durante la ejecución
@@ -100,8 +426,8 @@ class ARM7TDMI:
         else:
             return (self._current_pc + 8) & 0xFFFFFFFF
     
-    def trigger_exception(self, vector: int, new_mode: int) -> None:
-        """Dispara una excepción"""
+    def trigger_exception(self, vector: int, new_mode: int, lr: int) -> None:
+        """Dispara una excepción (lr: valor de R14 en el nuevo modo)"""
         self.registers.switch_mode(new_mode, save_cpsr=True)
         self.registers.irq_disabled = True
         
@@ -109,33 +435,58 @@ class ARM7TDMI:
             self.registers.fiq_disabled = True
             
         self.registers.thumb_mode = False
-        self.registers.lr = self.registers.pc
+        self.registers.lr = lr & 0xFFFFFFFF
         self.registers.pc = vector
         self.flush_pipeline()
     
     def trigger_irq(self) -> None:
         """Dispara IRQ"""
         if not self.registers.irq_disabled:
-            # LR debe apuntar a la instrucción a la que volver + 4
-            self.registers._r14_bank[CPUMode.IRQ] = self.registers.pc
-            self.trigger_exception(self.VECTOR_IRQ, CPUMode.IRQ)
+            # LR apunta a la instrucción a la que volver + 4 (SUBS PC, LR, #4)
+            self.trigger_exception(self.VECTOR_IRQ, CPUMode.IRQ, self.registers.pc + 4)
             self.halted = False
+        else:
+            # Enmascarada en el CPSR: no se atiende, pero despierta de HALT
+            self.wake()
     
     def trigger_swi(self) -> None:
         """Dispara SWI"""
         # LR debe apuntar a la siguiente instrucción
         if self.registers.thumb_mode:
-            self.registers._r14_bank[CPUMode.SUPERVISOR] = (self._current_pc + 2) & 0xFFFFFFFF
+            lr = self._current_pc + 2
         else:
-            self.registers._r14_bank[CPUMode.SUPERVISOR] = (self._current_pc + 4) & 0xFFFFFFFF
-        self.trigger_exception(self.VECTOR_SWI, CPUMode.SUPERVISOR)
+            lr = self._current_pc + 4
+        self.trigger_exception(self.VECTOR_SWI, CPUMode.SUPERVISOR, lr)
+    
+    def handle_swi(self, number: int) -> int:
+        """
+        Atiende un SWI: de forma nativa si hay implementación HLE (y no hay
+        BIOS cargado, salvo que la HLE sea forzada), si no vectorizando al BIOS
+        
+        Returns:
+            Ciclos consumidos
+        """
+        if self.bios_hle is not None and (self.bios_hle_forced or not self.memory.bios_loaded):
+            cycles = self.bios_hle.call(number)
+            if cycles is not None:
+                return cycles
+        
+        self.trigger_swi()
+        return 3
     
     def halt(self) -> None:
         self.halted = True
+        self._block_exit = True
+    
+    def wake(self) -> None:
+        """Sale de HALT por una IRQ pendiente (STOP no se ve afectado)"""
+        if not self.stopped:
+            self.halted = False
     
     def stop(self) -> None:
         self.stopped = True
         self.halted = True
+        self._block_exit = True
     
     def get_state_str(self) -> str:
         """Estado actual como string"""
@@ -145,9 +496,11 @@ class ARM7TDMI:
         lines.append(f"Cycles: {self.cycles}")
         lines.append(f"Halted: {self.halted} | Stopped: {self.stopped}")
         
-        if self.registers.thumb_mode:
-            lines.append(f"Last: {self._current_pc:08X}: {self._current_instruction:04X} (THUMB)")
+        thumb = self.registers.thumb_mode
+        text = self.disassembler.disassemble(self._current_pc, self._current_instruction, thumb)
+        if thumb:
+            lines.append(f"Last: {self._current_pc:08X}: {self._current_instruction:04X}  {text} (THUMB)")
         else:
-            lines.append(f"Last: {self._current_pc:08X}: {self._current_instruction:08X} (ARM)")
+            lines.append(f"Last: {self._current_pc:08X}: {self._current_instruction:08X}  {text} (ARM)")
         
         return "\n".join(lines)
\ No newline at end of file
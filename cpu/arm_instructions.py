@@ -2,12 +2,40 @@
 Instrucciones ARM (32-bit) para el ARM7TDMI
 Implementa el set completo de instrucciones ARM
 """
-from typing import TYPE_CHECKING, Tuple
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from .registers import register_list
 
 if TYPE_CHECKING:
     from .arm7tdmi import ARM7TDMI
 
 
+def _build_immediate_table() -> Tuple[List[int], List[Optional[bool]]]:
+    """
+    Precalcula los inmediatos rotados del operando 2 (campo de 12 bits)
+    
+    Returns:
+        (valores, carry de salida); el carry es None si la rotación es 0
+        y el shifter conserva el flag C actual
+    """
+    values = []
+    carries = []
+    for field in range(4096):
+        imm = field & 0xFF
+        rotate = (field >> 8) * 2
+        if rotate == 0:
+            values.append(imm)
+            carries.append(None)
+        else:
+            value = ((imm >> rotate) | (imm << (32 - rotate))) & 0xFFFFFFFF
+            values.append(value)
+            carries.append(bool(value >> 31))
+    return values, carries
+
+
+IMMEDIATE_VALUES, IMMEDIATE_CARRIES = _build_immediate_table()
+
+
 class ARMInstructions:
     """
     Decodificador y ejecutor de instrucciones ARM
@@ -18,6 +46,25 @@ class ARMInstructions:
         self.reg = cpu.registers
         self.mem = cpu.memory
         
+        # Procesamiento de datos especializado por tipo de operando 2
+        self._dp_shift_imm_handlers = (
+            self._execute_dp_lsl_imm, self._execute_dp_lsr_imm,
+            self._execute_dp_asr_imm, self._execute_dp_ror_imm,
+        )
+        self._dp_shift_reg_handlers = (
+            self._execute_dp_lsl_reg, self._execute_dp_lsr_reg,
+            self._execute_dp_asr_reg, self._execute_dp_ror_reg,
+        )
+        self._data_processing_handlers = (
+            (self._execute_dp_immediate,) + self._dp_shift_imm_handlers + self._dp_shift_reg_handlers
+        )
+        
+        # Tabla de despacho precalculada
+        self._decode_table = self._build_decode_table()
+        
+        # Índices de registros por máscara de LDM/STM (se llena al usarse)
+        self._register_lists: Dict[int, Tuple[int, ...]] = {}
+        
     # ===== Utilidades de Barrel Shifter =====
     
     def _shift_lsl(self, value: int, amount: int, carry: bool) -> Tuple[int, bool]:
@@ -106,44 +153,6 @@ class ARMInstructions:
         else:  # shift_type == 3
             return self._shift_ror(value, amount, carry, immediate)
     
-    def _get_operand2(self, instruction: int, set_carry: bool = True) -> Tuple[int, bool]:
-        """
-        Obtiene el segundo operando de una instrucción de procesamiento de datos
-        """
-        carry = self.reg.flag_c
-        
-        if instruction & (1 << 25):  # Immediate
-            imm = instruction & 0xFF
-            rotate = ((instruction >> 8) & 0xF) * 2
-            
-            if rotate == 0:
-                return imm, carry
-            
-            result = ((imm >> rotate) | (imm << (32 - rotate))) & 0xFFFFFFFF
-            if set_carry:
-                carry = bool(result >> 31)
-            return result, carry
-        else:
-            # Register with shift
-            rm = instruction & 0xF
-            rm_value = self.reg.get(rm)
-            
-            # Si Rm es PC, añadir offset del pipeline (PC + 8 para ARM)
-            if rm == 15:
-                rm_value = self.cpu.get_prefetch_pc()
-                if instruction & (1 << 4):  # Register shift
-                    rm_value += 4  # Ciclo extra para register shift
-            
-            shift_type = (instruction >> 5) & 0x3
-            
-            if instruction & (1 << 4):  # Shift by register
-                rs = (instruction >> 8) & 0xF
-                shift_amount = self.reg.get(rs) & 0xFF
-                return self._apply_shift(rm_value, shift_type, shift_amount, carry, False)
-            else:  # Shift by immediate
-                shift_amount = (instruction >> 7) & 0x1F
-                return self._apply_shift(rm_value, shift_type, shift_amount, carry, True)
-    
     # ===== Operaciones de Datos =====
     
     def _alu_add(self, a: int, b: int, carry_in: bool = False) -> Tuple[int, bool, bool]:
@@ -181,72 +190,222 @@ class ARMInstructions:
         Returns:
             Ciclos consumidos
         """
-        # Identificar tipo de instrucción (bits 27-25 y otros)
+        # Índice de 12 bits: bits 27-20 y bits 7-4
+        index = ((instruction >> 16) & 0xFF0) | ((instruction >> 4) & 0xF)
+        return self._decode_table[index](instruction)
+    
+    # ===== Tabla de decodificación =====
+    
+    def _build_decode_table(self) -> List[Callable[[int], int]]:
+        """
+        Construye la tabla de 4096 entradas indexada por bits 27-20 y 7-4
+        
+        Los casos especiales (SWP, BX, PSR, halfword) se resuelven aquí
+        una sola vez, de forma que execute() es un único acceso a lista.
+        """
+        table = []
+        for index in range(4096):
+            # Instrucción representativa con los bits del índice
+            instruction = ((index >> 4) << 20) | ((index & 0xF) << 4)
+            table.append(self._decode(instruction))
+        return table
+    
+    def _decode(self, instruction: int) -> Callable[[int], int]:
+        """Resuelve el handler para una instrucción representativa"""
         bits_27_25 = (instruction >> 25) & 0x7
         
         # Branch (101)
         if bits_27_25 == 0b101:
-            return self._execute_branch(instruction)
+            return self._execute_branch
         
         # Block Data Transfer (100)
         if bits_27_25 == 0b100:
-            return self._execute_block_transfer(instruction)
+            return self._execute_block_transfer
         
-        # Single Data Transfer (01x)
-        if bits_27_25 in (0b010, 0b011):
-            return self._execute_single_transfer(instruction)
+        # Single Data Transfer (01x), con registro y bit 4 = 1 es indefinida
+        if bits_27_25 == 0b010:
+            return self._execute_single_transfer
+        if bits_27_25 == 0b011:
+            if instruction & (1 << 4):
+                return self._execute_undefined
+            return self._execute_single_transfer
         
-        # Data Processing / PSR Transfer / Multiply (00x)
-        if bits_27_25 in (0b000, 0b001):
-            # Distinguir entre tipos
-            if bits_27_25 == 0b000:
-                bit4 = (instruction >> 4) & 1
-                bit7 = (instruction >> 7) & 1
-                
-                # Multiply (bit 7=1, bit 4=1)
-                if bit4 and bit7:
-                    bits_7_4 = (instruction >> 4) & 0xF
-                    if bits_7_4 == 0b1001:
-                        return self._execute_multiply(instruction)
-                    elif bits_7_4 in (0b1011, 0b1101, 0b1111):
-                        return self._execute_halfword_transfer(instruction)
-                    else:
-                        return self._execute_multiply_long(instruction)
-                
-                # Swap (bits 24-20 = 1x0x0, bits 7-4 = 1001)
-                if ((instruction >> 4) & 0xF) == 0b1001:
-                    opcode = (instruction >> 20) & 0x1F
-                    if opcode in (0b10000, 0b10100):
-                        return self._execute_swap(instruction)
-                
-                # Halfword Transfer (bit 7=1, bit 4=1)
-                if bit7 and bit4:
-                    bits_6_5 = (instruction >> 5) & 0x3
-                    if bits_6_5 != 0:
-                        return self._execute_halfword_transfer(instruction)
-                
-                # Branch and Exchange
-                if (instruction & 0x0FFFFFF0) == 0x012FFF10:
-                    return self._execute_bx(instruction)
-                
-                # PSR Transfer
-                opcode = (instruction >> 21) & 0xF
-                s_bit = (instruction >> 20) & 1
-                if opcode in (0b1000, 0b1001, 0b1010, 0b1011) and not s_bit:
-                    return self._execute_psr_transfer(instruction)
-            
-            # Data Processing
-            return self._execute_data_processing(instruction)
+        # Software Interrupt (1111)
+        if (instruction >> 24) & 0xF == 0b1111:
+            return self._execute_swi
         
-        # Software Interrupt (111)
-        if bits_27_25 == 0b111:
-            return self._execute_swi(instruction)
+        # Coprocesador (110x) - no existe en el GBA
+        if bits_27_25 in (0b110, 0b111):
+            return self._execute_undefined
         
-        # Instrucción no implementada/desconocida
+        # Data Processing / PSR Transfer / Multiply (00x)
+        if bits_27_25 == 0b000:
+            bits_7_4 = (instruction >> 4) & 0xF
+            bits_27_20 = (instruction >> 20) & 0xFF
+            
+            if bits_7_4 == 0b1001:
+                # Multiply (000000xx)
+                if (bits_27_20 >> 2) == 0b000000:
+                    return self._execute_multiply
+                # Multiply Long (00001xxx)
+                if (bits_27_20 >> 3) == 0b00001:
+                    return self._execute_multiply_long
+                # Swap (00010x00)
+                if (bits_27_20 & 0xFB) == 0b00010000:
+                    return self._execute_swap
+                return self._execute_undefined
+            
+            # Halfword Transfer (1SH1 con SH != 00)
+            if bits_7_4 in (0b1011, 0b1101, 0b1111):
+                return self._execute_halfword_transfer
+            
+            # Branch and Exchange (0001 0010 ... 0001)
+            if bits_27_20 == 0x12 and bits_7_4 == 0b0001:
+                return self._execute_bx
+            
+            # PSR Transfer (opcodes TST/TEQ/CMP/CMN sin S)
+            opcode = (instruction >> 21) & 0xF
+            s_bit = (instruction >> 20) & 1
+            if opcode in (0b1000, 0b1001, 0b1010, 0b1011) and not s_bit:
+                return self._execute_psr_transfer
+        
+        elif bits_27_25 == 0b001:
+            # MSR inmediato
+            opcode = (instruction >> 21) & 0xF
+            s_bit = (instruction >> 20) & 1
+            if opcode in (0b1000, 0b1001, 0b1010, 0b1011) and not s_bit:
+                return self._execute_psr_transfer
+        
+        # Data Processing: handler según el tipo de operando 2
+        if instruction & (1 << 25):
+            return self._execute_dp_immediate
+        shift_type = (instruction >> 5) & 0x3
+        if instruction & (1 << 4):
+            return self._dp_shift_reg_handlers[shift_type]
+        return self._dp_shift_imm_handlers[shift_type]
+    
+    def _execute_undefined(self, instruction: int) -> int:
+        """Instrucción no implementada/desconocida"""
+        self.cpu.undefined_instruction(instruction)
         return 1
     
-    def _execute_data_processing(self, instruction: int) -> int:
-        """Ejecuta instrucciones de procesamiento de datos"""
+    # ===== Procesamiento de datos: operando 2 =====
+    
+    def _execute_dp_immediate(self, instruction: int) -> int:
+        """Operando 2 inmediato rotado (tabla precalculada)"""
+        field = instruction & 0xFFF
+        carry = IMMEDIATE_CARRIES[field]
+        if carry is None:
+            carry = self.reg.flag_c
+        return self._data_processing(instruction, IMMEDIATE_VALUES[field], carry)
+    
+    def _shift_operand(self, instruction: int) -> int:
+        """Valor de Rm (PC + 8 si es R15)"""
+        rm = instruction & 0xF
+        if rm == 15:
+            return self.cpu.get_prefetch_pc()
+        return self.reg._regs[rm]
+    
+    def _execute_dp_lsl_imm(self, instruction: int) -> int:
+        """Rm, LSL #n"""
+        value = self._shift_operand(instruction)
+        amount = (instruction >> 7) & 0x1F
+        if amount == 0:
+            return self._data_processing(instruction, value, self.reg.flag_c)
+        return self._data_processing(instruction, (value << amount) & 0xFFFFFFFF,
+                                     bool((value >> (32 - amount)) & 1))
+    
+    def _execute_dp_lsr_imm(self, instruction: int) -> int:
+        """Rm, LSR #n (LSR #0 es LSR #32)"""
+        value = self._shift_operand(instruction)
+        amount = (instruction >> 7) & 0x1F
+        if amount == 0:
+            return self._data_processing(instruction, 0, bool(value >> 31))
+        return self._data_processing(instruction, value >> amount,
+                                     bool((value >> (amount - 1)) & 1))
+    
+    def _execute_dp_asr_imm(self, instruction: int) -> int:
+        """Rm, ASR #n (ASR #0 es ASR #32)"""
+        value = self._shift_operand(instruction)
+        amount = (instruction >> 7) & 0x1F
+        if amount == 0:
+            if value >> 31:
+                return self._data_processing(instruction, 0xFFFFFFFF, True)
+            return self._data_processing(instruction, 0, False)
+        signed = value - 0x100000000 if value & 0x80000000 else value
+        return self._data_processing(instruction, (signed >> amount) & 0xFFFFFFFF,
+                                     bool((value >> (amount - 1)) & 1))
+    
+    def _execute_dp_ror_imm(self, instruction: int) -> int:
+        """Rm, ROR #n (ROR #0 es RRX)"""
+        value = self._shift_operand(instruction)
+        amount = (instruction >> 7) & 0x1F
+        if amount == 0:
+            return self._data_processing(instruction, (value >> 1) | (int(self.reg.flag_c) << 31),
+                                         bool(value & 1))
+        return self._data_processing(instruction,
+                                     ((value >> amount) | (value << (32 - amount))) & 0xFFFFFFFF,
+                                     bool((value >> (amount - 1)) & 1))
+    
+    def _register_shift_operands(self, instruction: int) -> Tuple[int, int]:
+        """Valor de Rm (PC + 12 si es R15) y cantidad de shift (Rs, 8 bits)"""
+        rm = instruction & 0xF
+        regs = self.reg._regs
+        if rm == 15:
+            value = (self.cpu.get_prefetch_pc() + 4) & 0xFFFFFFFF
+        else:
+            value = regs[rm]
+        return value, regs[(instruction >> 8) & 0xF] & 0xFF
+    
+    def _execute_dp_lsl_reg(self, instruction: int) -> int:
+        """Rm, LSL Rs"""
+        value, amount = self._register_shift_operands(instruction)
+        if amount == 0:
+            return self._data_processing(instruction, value, self.reg.flag_c)
+        if amount < 32:
+            return self._data_processing(instruction, (value << amount) & 0xFFFFFFFF,
+                                         bool((value >> (32 - amount)) & 1))
+        return self._data_processing(instruction, 0, amount == 32 and bool(value & 1))
+    
+    def _execute_dp_lsr_reg(self, instruction: int) -> int:
+        """Rm, LSR Rs"""
+        value, amount = self._register_shift_operands(instruction)
+        if amount == 0:
+            return self._data_processing(instruction, value, self.reg.flag_c)
+        if amount < 32:
+            return self._data_processing(instruction, value >> amount,
+                                         bool((value >> (amount - 1)) & 1))
+        return self._data_processing(instruction, 0, amount == 32 and bool(value >> 31))
+    
+    def _execute_dp_asr_reg(self, instruction: int) -> int:
+        """Rm, ASR Rs"""
+        value, amount = self._register_shift_operands(instruction)
+        if amount == 0:
+            return self._data_processing(instruction, value, self.reg.flag_c)
+        if amount >= 32:
+            if value >> 31:
+                return self._data_processing(instruction, 0xFFFFFFFF, True)
+            return self._data_processing(instruction, 0, False)
+        signed = value - 0x100000000 if value & 0x80000000 else value
+        return self._data_processing(instruction, (signed >> amount) & 0xFFFFFFFF,
+                                     bool((value >> (amount - 1)) & 1))
+    
+    def _execute_dp_ror_reg(self, instruction: int) -> int:
+        """Rm, ROR Rs"""
+        value, amount = self._register_shift_operands(instruction)
+        if amount == 0:
+            return self._data_processing(instruction, value, self.reg.flag_c)
+        amount &= 31
+        if amount == 0:
+            return self._data_processing(instruction, value, bool(value >> 31))
+        return self._data_processing(instruction,
+                                     ((value >> amount) | (value << (32 - amount))) & 0xFFFFFFFF,
+                                     bool((value >> (amount - 1)) & 1))
+    
+    # ===== Procesamiento de datos =====
+    
+    def _data_processing(self, instruction: int, op2: int, shifter_carry: bool) -> int:
+        """Ejecuta una instrucción de procesamiento de datos ya resuelto el operando 2"""
         opcode = (instruction >> 21) & 0xF
         s_bit = bool(instruction & (1 << 20))
         rn = (instruction >> 16) & 0xF
@@ -257,8 +416,6 @@ class ARMInstructions:
         if rn == 15:
             rn_value = self.cpu.get_prefetch_pc()  # PC + 8
         
-        op2, shifter_carry = self._get_operand2(instruction, s_bit)
-        
         result = 0
         carry = self.reg.flag_c
         overflow = self.reg.flag_v
@@ -329,13 +486,16 @@ class ARMInstructions:
         
         # Escribir resultado
         if write_result:
+            # Retorno de excepción: el CPSR se restaura antes de escribir PC,
+            # que se alinea según el modo (ARM/THUMB) al que se vuelve
+            if rd == 15 and s_bit:
+                self.reg.restore_cpsr_from_spsr()
+            
             self.reg.set(rd, result)
             
             # Si Rd es PC
             if rd == 15:
                 self.cpu.flush_pipeline()
-                if s_bit:
-                    self.reg.restore_cpsr_from_spsr()
                 return 3
         
         # Actualizar flags si S está activado
@@ -616,14 +776,11 @@ class ARMInstructions:
         pre_index = bool(instruction & (1 << 24))
         
         rn = (instruction >> 16) & 0xF
-        register_list = instruction & 0xFFFF
+        mask = instruction & 0xFFFF
         
         base = self.reg.get(rn)
         
-        # Contar registros
-        count = bin(register_list).count('1')
-        
-        if count == 0:
+        if mask == 0:
             # Lista vacía - comportamiento especial
             if load:
                 self.reg.pc = self.mem.read_32(base)
@@ -638,7 +795,12 @@ class ARMInstructions:
                     self.reg.set(rn, base - 0x40)
             return 2
         
-        # Calcular dirección inicial
+        registers = self._register_lists.get(mask)
+        if registers is None:
+            registers = self._register_lists[mask] = register_list(mask)
+        count = len(registers)
+        
+        # Calcular dirección inicial (en memoria siempre se recorre hacia arriba)
         if up:
             if pre_index:
                 address = base + 4
@@ -652,35 +814,30 @@ class ARMInstructions:
                 address = base - count * 4 + 4
             final_address = base - count * 4
         
-        cycles = 2
+        regs = self.reg._regs
         
-        for i in range(16):
-            if register_list & (1 << i):
-                if load:
-                    value = self.mem.read_32(address)
-                    self.reg.set(i, value)
-                else:
-                    value = self.reg.get(i)
-                    if i == 15:
-                        value += 4
-                    self.mem.write_32(address, value)
-                
-                if up:
-                    address += 4
-                else:
-                    address += 4  # Siempre incrementa en memoria
-                
-                cycles += 1
+        if load:
+            values = self.mem.read_block_32(address & 0xFFFFFFFF, count)
+            for i, value in zip(registers, values):
+                regs[i] = value
+        else:
+            values = [regs[i] for i in registers]
+            if mask & 0x8000:
+                values[-1] = (values[-1] + 4) & 0xFFFFFFFF
+            self.mem.write_block_32(address & 0xFFFFFFFF, values)
+        
+        cycles = 2 + count
         
         # Write-back
         if write_back:
             self.reg.set(rn, final_address)
         
         # Si cargamos PC
-        if load and (register_list & (1 << 15)):
-            self.cpu.flush_pipeline()
+        if load and (mask & 0x8000):
             if s_bit:
                 self.reg.restore_cpsr_from_spsr()
+            self.reg.pc = regs[15]
+            self.cpu.flush_pipeline()
             cycles += 2
         
         return cycles
@@ -759,8 +916,5 @@ class ARMInstructions:
     
     def _execute_swi(self, instruction: int) -> int:
         """Ejecuta Software Interrupt"""
-        # El número del SWI está en los bits 0-23
-        # swi_number = instruction & 0x00FFFFFF
-        
-        self.cpu.trigger_swi()
-        return 3
\ No newline at end of file
+        # En el GBA el número del SWI está en los bits 16-23
+        return self.cpu.handle_swi((instruction >> 16) & 0xFF)
\ No newline at end of file
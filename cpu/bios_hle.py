@@ -0,0 +1,498 @@
+"""
+Emulación de alto nivel (HLE) de las llamadas SWI del BIOS
+Implementa en Python/NumPy las funciones más usadas del BIOS del GBA
+"""
+import math
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .arm7tdmi import ARM7TDMI
+
+
+# Flags de IRQ que el handler del usuario marca para IntrWait (mirror de IWRAM)
+INTR_CHECK = 0x03007FF8
+
+# Registro IME
+IME_ADDRESS = 0x04000208
+
+# Ciclos aproximados de una llamada (entrada/salida del BIOS)
+HLE_CALL_CYCLES = 20
+
+# Bytes del flujo de Huffman desplegados a bits de una vez
+HUFFMAN_CHUNK = 0x400
+
+# Dispatcher de IRQ mínimo para cuando no hay imagen de BIOS cargada
+# (misma secuencia que el BIOS original a partir de 0x128)
+IRQ_STUB = (
+    (0x018, 0xEA000042),  # B     0x128
+    (0x128, 0xE92D500F),  # STMFD SP!, {R0-R3, R12, LR}
+    (0x12C, 0xE3A00301),  # MOV   R0, #0x04000000
+    (0x130, 0xE28FE000),  # ADD   LR, PC, #0
+    (0x134, 0xE510F004),  # LDR   PC, [R0, #-4]
+    (0x138, 0xE8BD500F),  # LDMFD SP!, {R0-R3, R12, LR}
+    (0x13C, 0xE25EF004),  # SUBS  PC, LR, #4
+)
+
+
+def _signed16(value: int) -> int:
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def _signed32(value: int) -> int:
+    value &= 0xFFFFFFFF
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+class BiosHLE:
+    """
+    Implementación nativa de las funciones SWI del BIOS
+    
+    call() devuelve los ciclos consumidos, o None si el SWI no está
+    implementado y debe ejecutarse el código del BIOS real.
+    
+    Las copias y descompresiones trabajan directamente sobre los arrays
+    NumPy del bus cuando el rango cae entero en una región lineal, y
+    recurren al bus byte a byte en el resto de casos.
+    """
+    
+    def __init__(self, cpu: 'ARM7TDMI'):
+        self.cpu = cpu
+        self.memory = cpu.memory
+        
+        # IntrWait en curso (se reejecuta el SWI al despertar de HALT)
+        self._intr_wait_pending = False
+        
+        self._handlers: Dict[int, Callable[[], Optional[int]]] = {
+            0x02: self._halt,
+            0x04: self._intr_wait,
+            0x05: self._vblank_intr_wait,
+            0x06: self._div,
+            0x07: self._div_arm,
+            0x08: self._sqrt,
+            0x0A: self._arctan2,
+            0x0B: self._cpu_set,
+            0x0C: self._cpu_fast_set,
+            0x0E: self._bg_affine_set,
+            0x0F: self._obj_affine_set,
+            0x11: self._lz77_uncomp,
+            0x12: self._lz77_uncomp,
+            0x13: self._huff_uncomp,
+            0x14: self._rl_uncomp,
+            0x15: self._rl_uncomp,
+        }
+        
+        self.install_irq_stub()
+    
+    def install_irq_stub(self) -> None:
+        """Escribe el dispatcher de IRQ en el BIOS si no hay imagen cargada"""
+        bios = self.memory.bios
+        if bios[0x18:0x1C].any():
+            return
+        
+        for address, word in IRQ_STUB:
+            bios[address:address + 4] = np.frombuffer(word.to_bytes(4, 'little'), dtype=np.uint8)
+    
+    def reset(self) -> None:
+        self._intr_wait_pending = False
+    
+    def call(self, number: int) -> Optional[int]:
+        """
+        Ejecuta el SWI indicado
+        
+        Returns:
+            Ciclos consumidos, o None si no hay implementación HLE
+        """
+        handler = self._handlers.get(number)
+        if handler is None:
+            return None
+        return handler()
+    
+    # ===== Acceso a memoria =====
+    
+    def _region(self, address: int, length: int) -> Optional[Tuple[np.ndarray, int]]:
+        """
+        Obtiene (array, offset) si el rango cae entero en una región lineal
+        
+        Returns:
+            None si el rango cruza el final de la región o un mirror
+        """
+        memory = self.memory
+        region = (address >> 24) & 0xFF
+        
+        if region == 0x02:
+            array, offset = memory.ewram, address & 0x3FFFF
+        elif region == 0x03:
+            array, offset = memory.iwram, address & 0x7FFF
+        elif region == 0x05:
+            array, offset = memory.palette_ram, address & 0x3FF
+        elif region == 0x06:
+            array, offset = memory.vram, address & 0x1FFFF
+        elif region == 0x07:
+            array, offset = memory.oam, address & 0x3FF
+        elif 0x08 <= region <= 0x0D:
+            array, offset = memory.rom, address & 0x01FFFFFF
+        else:
+            return None
+        
+        if offset + length > len(array):
+            return None
+        return array, offset
+    
+    def _read_bytes(self, address: int, length: int) -> bytes:
+        view = self._region(address, length)
+        if view is not None:
+            array, offset = view
+            return array[offset:offset + length].tobytes()
+        
+        read_8 = self.memory.read_8
+        return bytes(read_8(address + i) for i in range(length))
+    
+    def _write_bytes(self, address: int, data: bytes) -> None:
+        """Escribe datos (longitud par) como halfwords"""
+        length = len(data)
+        region = (address >> 24) & 0xFF
+        view = self._region(address, length) if region != 0x08 else None
+        
+        if view is not None and 0x02 <= region <= 0x07:
+            array, offset = view
+            array[offset:offset + length] = np.frombuffer(data, dtype=np.uint8)
+            
+            # El código en RAM escrito por el BIOS debe invalidarse
+            self.memory.invalidate_code(address, length)
+            return
+        
+        write_16 = self.memory.write_16
+        for i in range(0, length, 2):
+            write_16(address + i, data[i] | (data[i + 1] << 8))
+    
+    def _source(self, address: int) -> memoryview:
+        """Vista de solo lectura desde la dirección hasta el fin de su región"""
+        view = self._region(address, 0)
+        if view is not None:
+            array, offset = view
+            return memoryview(array)[offset:]
+        
+        # Región sin array lineal: copiar un máximo razonable por el bus
+        return memoryview(self._read_bytes(address, 0x10000))
+    
+    # ===== Interrupciones y HALT =====
+    
+    def _halt(self) -> int:
+        """SWI 0x02: Halt"""
+        self.cpu.halt()
+        return HLE_CALL_CYCLES
+    
+    def _intr_wait(self) -> int:
+        """SWI 0x04: IntrWait(R0 = descartar flags viejos, R1 = flags esperados)"""
+        reg = self.cpu.registers
+        return self._wait_interrupt(reg.get(0), reg.get(1))
+    
+    def _vblank_intr_wait(self) -> int:
+        """SWI 0x05: VBlankIntrWait"""
+        return self._wait_interrupt(1, 0x0001)
+    
+    def _wait_interrupt(self, discard: int, flags: int) -> int:
+        """
+        Espera hasta que el handler de IRQ marque alguno de los flags
+        
+        Si aún no llegó, se rebobina PC al propio SWI y se entra en HALT:
+        la IRQ despierta a la CPU, se atiende y al volver se reejecuta el
+        SWI, que vuelve a comprobar los flags sin descartarlos.
+        """
+        memory = self.memory
+        
+        if not self._intr_wait_pending:
+            memory.write_16(IME_ADDRESS, 1)
+            if discard:
+                memory.write_16(INTR_CHECK, memory.read_16(INTR_CHECK) & ~flags)
+        
+        check = memory.read_16(INTR_CHECK)
+        if check & flags:
+            memory.write_16(INTR_CHECK, check & ~flags)
+            self._intr_wait_pending = False
+            return HLE_CALL_CYCLES
+        
+        self._intr_wait_pending = True
+        self.cpu.registers._regs[15] = self.cpu._current_pc
+        self.cpu.halt()
+        return HLE_CALL_CYCLES
+    
+    # ===== Aritmética =====
+    
+    def _div(self) -> int:
+        """SWI 0x06: Div(R0 = numerador, R1 = denominador)"""
+        reg = self.cpu.registers
+        return self._divide(_signed32(reg.get(0)), _signed32(reg.get(1)))
+    
+    def _div_arm(self) -> int:
+        """SWI 0x07: DivArm(R0 = denominador, R1 = numerador)"""
+        reg = self.cpu.registers
+        return self._divide(_signed32(reg.get(1)), _signed32(reg.get(0)))
+    
+    def _divide(self, numerator: int, denominator: int) -> int:
+        """R0 = cociente, R1 = resto, R3 = |cociente| (truncando hacia 0)"""
+        reg = self.cpu.registers
+        
+        if denominator == 0:
+            # El BIOS real queda en un bucle; devolver algo determinista
+            quotient = -1 if numerator < 0 else 1
+            remainder = numerator
+        else:
+            quotient = abs(numerator) // abs(denominator)
+            if (numerator < 0) != (denominator < 0):
+                quotient = -quotient
+            remainder = numerator - quotient * denominator
+        
+        reg.set(0, quotient & 0xFFFFFFFF)
+        reg.set(1, remainder & 0xFFFFFFFF)
+        reg.set(3, abs(quotient) & 0xFFFFFFFF)
+        return HLE_CALL_CYCLES + 40
+    
+    def _sqrt(self) -> int:
+        """SWI 0x08: Sqrt(R0) -> R0 (entero, sin signo)"""
+        reg = self.cpu.registers
+        reg.set(0, math.isqrt(reg.get(0)))
+        return HLE_CALL_CYCLES + 40
+    
+    def _arctan2(self) -> int:
+        """SWI 0x0A: ArcTan2(R0 = x, R1 = y) -> R0 en 0x0000-0xFFFF"""
+        reg = self.cpu.registers
+        x = _signed16(reg.get(0))
+        y = _signed16(reg.get(1))
+        angle = math.atan2(y, x) / (2 * math.pi)
+        reg.set(0, int(round(angle * 0x10000)) & 0xFFFF)
+        return HLE_CALL_CYCLES + 40
+    
+    # ===== Copias =====
+    
+    def _cpu_set(self) -> int:
+        """
+        SWI 0x0B: CpuSet(R0 = origen, R1 = destino, R2 = control)
+        
+        R2: bits 0-20 cantidad, bit 24 relleno, bit 26 unidades de 32 bits
+        """
+        reg = self.cpu.registers
+        control = reg.get(2)
+        count = control & 0x1FFFFF
+        unit = 4 if control & (1 << 26) else 2
+        
+        self._copy(reg.get(0) & ~(unit - 1), reg.get(1) & ~(unit - 1),
+                   count, unit, bool(control & (1 << 24)))
+        return HLE_CALL_CYCLES + count * 2
+    
+    def _cpu_fast_set(self) -> int:
+        """
+        SWI 0x0C: CpuFastSet(R0 = origen, R1 = destino, R2 = control)
+        
+        Siempre en words; la cantidad se redondea a múltiplos de 8
+        """
+        reg = self.cpu.registers
+        control = reg.get(2)
+        count = ((control & 0x1FFFFF) + 7) & ~7
+        
+        self._copy(reg.get(0) & ~3, reg.get(1) & ~3, count, 4, bool(control & (1 << 24)))
+        return HLE_CALL_CYCLES + count
+    
+    def _copy(self, source: int, dest: int, count: int, unit: int, fill: bool) -> None:
+        """Copia o rellena `count` unidades de `unit` bytes"""
+        if count == 0:
+            return
+        
+        length = count * unit
+        if fill:
+            data = self._read_bytes(source, unit) * count
+        elif source < dest < source + length:
+            # Solapamiento hacia adelante: el BIOS copia unidad a unidad
+            memory = self.memory
+            read, write = ((memory.read_32, memory.write_32) if unit == 4
+                           else (memory.read_16, memory.write_16))
+            for i in range(0, length, unit):
+                write(dest + i, read(source + i))
+            return
+        else:
+            data = self._read_bytes(source, length)
+        
+        self._write_bytes(dest, data)
+    
+    # ===== Matrices afines =====
+    
+    def _bg_affine_set(self) -> int:
+        """SWI 0x0E: BgAffineSet(R0 = origen, R1 = destino, R2 = cantidad)"""
+        reg = self.cpu.registers
+        memory = self.memory
+        source = reg.get(0)
+        dest = reg.get(1)
+        count = reg.get(2)
+        
+        for _ in range(count):
+            center_x = _signed32(memory.read_32(source)) / 256.0
+            center_y = _signed32(memory.read_32(source + 4)) / 256.0
+            display_x = _signed16(memory.read_16(source + 8))
+            display_y = _signed16(memory.read_16(source + 10))
+            scale_x = _signed16(memory.read_16(source + 12)) / 256.0
+            scale_y = _signed16(memory.read_16(source + 14)) / 256.0
+            theta = (memory.read_16(source + 16) >> 8) / 128.0 * math.pi
+            source += 20
+            
+            pa, pb, pc, pd = self._affine(scale_x, scale_y, theta)
+            start_x = center_x - (pa * display_x + pb * display_y)
+            start_y = center_y - (pc * display_x + pd * display_y)
+            
+            memory.write_16(dest, int(pa * 256) & 0xFFFF)
+            memory.write_16(dest + 2, int(pb * 256) & 0xFFFF)
+            memory.write_16(dest + 4, int(pc * 256) & 0xFFFF)
+            memory.write_16(dest + 6, int(pd * 256) & 0xFFFF)
+            memory.write_32(dest + 8, int(start_x * 256) & 0xFFFFFFFF)
+            memory.write_32(dest + 12, int(start_y * 256) & 0xFFFFFFFF)
+            dest += 16
+        
+        return HLE_CALL_CYCLES + count * 30
+    
+    def _obj_affine_set(self) -> int:
+        """
+        SWI 0x0F: ObjAffineSet(R0 = origen, R1 = destino, R2 = cantidad,
+        R3 = distancia entre parámetros: 2 para BG, 8 para OAM)
+        """
+        reg = self.cpu.registers
+        memory = self.memory
+        source = reg.get(0)
+        dest = reg.get(1)
+        count = reg.get(2)
+        stride = reg.get(3)
+        
+        for _ in range(count):
+            scale_x = _signed16(memory.read_16(source)) / 256.0
+            scale_y = _signed16(memory.read_16(source + 2)) / 256.0
+            theta = (memory.read_16(source + 4) >> 8) / 128.0 * math.pi
+            source += 8
+            
+            for value in self._affine(scale_x, scale_y, theta):
+                memory.write_16(dest, int(value * 256) & 0xFFFF)
+                dest += stride
+        
+        return HLE_CALL_CYCLES + count * 20
+    
+    @staticmethod
+    def _affine(scale_x: float, scale_y: float, theta: float) -> Tuple[float, float, float, float]:
+        """Parámetros PA, PB, PC, PD de rotación y escala"""
+        cos_t = math.cos(theta)
+        sin_t = math.sin(theta)
+        return scale_x * cos_t, -scale_x * sin_t, scale_y * sin_t, scale_y * cos_t
+    
+    # ===== Descompresión =====
+    
+    def _lz77_uncomp(self) -> int:
+        """SWI 0x11/0x12: LZ77UnCompWram/Vram(R0 = origen, R1 = destino)"""
+        reg = self.cpu.registers
+        source = self._source(reg.get(0) & ~3)
+        size = self._header_size(source)
+        
+        out = bytearray()
+        pos = 4
+        while len(out) < size:
+            flags = source[pos]
+            pos += 1
+            for bit in range(8):
+                if len(out) >= size:
+                    break
+                if flags & (0x80 >> bit):
+                    # Referencia: 4 bits largo-3, 12 bits distancia-1
+                    high = source[pos]
+                    length = (high >> 4) + 3
+                    disp = (((high & 0xF) << 8) | source[pos + 1]) + 1
+                    pos += 2
+                    start = len(out) - disp
+                    if disp >= length:
+                        out += out[start:start + length]
+                    else:
+                        # Copia solapada: repite periódicamente los últimos disp bytes
+                        out += (out[start:] * (length // disp + 1))[:length]
+                else:
+                    out.append(source[pos])
+                    pos += 1
+        
+        self._write_output(reg.get(1), out, size)
+        return HLE_CALL_CYCLES + size
+    
+    def _rl_uncomp(self) -> int:
+        """SWI 0x14/0x15: RLUnCompWram/Vram(R0 = origen, R1 = destino)"""
+        reg = self.cpu.registers
+        source = self._source(reg.get(0) & ~3)
+        size = self._header_size(source)
+        
+        out = bytearray()
+        pos = 4
+        while len(out) < size:
+            flag = source[pos]
+            if flag & 0x80:
+                out += bytes((source[pos + 1],)) * ((flag & 0x7F) + 3)
+                pos += 2
+            else:
+                length = (flag & 0x7F) + 1
+                out += source[pos + 1:pos + 1 + length]
+                pos += 1 + length
+        
+        self._write_output(reg.get(1), out, size)
+        return HLE_CALL_CYCLES + size
+    
+    def _huff_uncomp(self) -> int:
+        """SWI 0x13: HuffUnComp(R0 = origen, R1 = destino)"""
+        reg = self.cpu.registers
+        source = self._source(reg.get(0) & ~3)
+        size = self._header_size(source)
+        bits = source[0] & 0xF
+        if bits not in (1, 2, 4, 8):
+            return HLE_CALL_CYCLES  # Los datos se empaquetan en words enteras
+        mask = (1 << bits) - 1
+        per_byte = 8 // bits
+        
+        # Símbolos hasta completar la última word de salida
+        needed = (size + 3) // 4 * 4 * per_byte
+        
+        # Árbol en 5.., flujo de words (MSB primero) tras la tabla. Los bits
+        # se despliegan con NumPy por tandas; recorrer el árbol es secuencial
+        root = 5
+        pos = 4 + (source[4] + 1) * 2
+        
+        symbols = bytearray()
+        node = root
+        while len(symbols) < needed:
+            raw = source[pos:pos + HUFFMAN_CHUNK]
+            raw = raw[:len(raw) & ~3]
+            if not raw:
+                break
+            pos += len(raw)
+            words = np.frombuffer(raw, dtype='<u4').astype('>u4')
+            for bit in np.unpackbits(words.view(np.uint8)).tolist():
+                info = source[node]
+                child = (node & ~1) + (info & 0x3F) * 2 + 2 + bit
+                if info & (0x80 >> bit):
+                    symbols.append(source[child] & mask)
+                    if len(symbols) >= needed:
+                        break
+                    node = root
+                else:
+                    node = child
+        
+        # Empaquetado: cada byte se llena desde los bits bajos
+        values = np.frombuffer(bytes(symbols[:len(symbols) - len(symbols) % per_byte]), dtype=np.uint8)
+        shifts = np.arange(per_byte, dtype=np.uint8) * bits
+        out = (values.reshape(-1, per_byte) << shifts).sum(axis=1, dtype=np.uint8).tobytes()
+        
+        self._write_output(reg.get(1), bytearray(out), size)
+        return HLE_CALL_CYCLES + size * 2
+    
+    @staticmethod
+    def _header_size(source: memoryview) -> int:
+        """Tamaño descomprimido del header (bits 8-31)"""
+        return source[1] | (source[2] << 8) | (source[3] << 16)
+    
+    def _write_output(self, dest: int, out: bytearray, size: int) -> None:
+        """Escribe la salida descomprimida (VRAM solo acepta halfwords)"""
+        data = bytes(out[:size])
+        if len(data) & 1:
+            data += bytes((self.memory.read_8(dest + len(data)),))
+        self._write_bytes(dest, data)
@@ -0,0 +1,320 @@
+"""
+Caché de bloques básicos del ARM7TDMI
+Decodifica secuencias lineales de instrucciones una sola vez
+"""
+from array import array
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from memory.memory_bus import CODE_PAGE_SHIFT
+
+if TYPE_CHECKING:
+    from .arm7tdmi import ARM7TDMI
+
+
+# Tamaño de página para invalidación (el mismo que el bitmap del bus)
+PAGE_SHIFT = CODE_PAGE_SHIFT
+
+# Máximo de instrucciones por bloque
+MAX_BLOCK_INSTRUCTIONS = 32
+
+# Máximo de instrucciones de un bucle de espera (idle loop)
+IDLE_LOOP_MAX_INSTRUCTIONS = 8
+
+
+def code_page(address: int) -> int:
+    """
+    Obtiene la página canónica de una dirección de RAM
+    
+    Los mirrors de EWRAM/IWRAM se reducen a la misma página para que
+    una escritura por cualquier mirror invalide el mismo código.
+    """
+    region = (address >> 24) & 0xFF
+    if region == 0x02:
+        address = 0x02000000 | (address & 0x3FFFF)
+    elif region == 0x03:
+        address = 0x03000000 | (address & 0x7FFF)
+    return address >> PAGE_SHIFT
+
+
+class BasicBlock:
+    """Secuencia lineal de instrucciones pre-decodificadas"""
+    
+    __slots__ = ('pc', 'thumb', 'entries', 'page', 'valid', 'exec_count', 'compiled',
+                 'idle_candidate', 'pcs', 'opcodes')
+    
+    def __init__(self, pc: int, thumb: bool, entries: list, page: int):
+        self.pc = pc
+        self.thumb = thumb
+        # THUMB: (handler, instruction)
+        # ARM:   (handler, instruction, cond)
+        self.entries = entries
+        self.page = page
+        self.valid = True
+        self.exec_count = 0
+        # Función generada por el JIT (None: aún no compilado, False: no compilable)
+        self.compiled = None
+        # Bucle corto sin escrituras que salta a su propio inicio
+        self.idle_candidate = False
+        # PC y opcode de cada instrucción (para el trace de ejecución)
+        size = 2 if thumb else 4
+        self.pcs = array('I', [(pc + i * size) & 0xFFFFFFFF for i in range(len(entries))])
+        self.opcodes = array('I', [entry[1] for entry in entries])
+
+
+class BlockCache:
+    """
+    Caché de bloques indexada por (PC, estado THUMB)
+    
+    Solo se cachea código en BIOS, ROM, EWRAM e IWRAM. Las páginas de
+    EWRAM/IWRAM con bloques se marcan en el bitmap del bus, que llama a
+    invalidate() solo cuando una escritura cae en una de ellas.
+    """
+    
+    def __init__(self, cpu: 'ARM7TDMI'):
+        self.cpu = cpu
+        self.memory = cpu.memory
+        
+        # Clave: (pc << 1) | thumb
+        self._blocks: Dict[int, BasicBlock] = {}
+        
+        # Página canónica -> bloques que contiene
+        self._pages: Dict[int, List[BasicBlock]] = {}
+        
+        # Registrarse en el bus para recibir invalidaciones
+        self.memory.block_cache = self
+    
+    def clear(self) -> None:
+        """Descarta todos los bloques (p.ej. al cargar ROM o BIOS)"""
+        for block in self._blocks.values():
+            block.valid = False
+        self._blocks.clear()
+        self._pages.clear()
+        
+        memory = self.memory
+        memory.ewram_code_pages[:] = bytes(len(memory.ewram_code_pages))
+        memory.iwram_code_pages[:] = bytes(len(memory.iwram_code_pages))
+    
+    def __len__(self) -> int:
+        return len(self._blocks)
+    
+    def lookup(self, pc: int, thumb: bool) -> Optional[BasicBlock]:
+        """
+        Obtiene el bloque que empieza en PC, decodificándolo si hace falta
+        
+        Returns:
+            El bloque, o None si la región no es cacheable
+        """
+        key = (pc << 1) | thumb
+        block = self._blocks.get(key)
+        if block is None:
+            block = self._decode_block(pc, thumb)
+            if block is not None:
+                self._blocks[key] = block
+                blocks = self._pages.get(block.page)
+                if blocks is None:
+                    self._pages[block.page] = [block]
+                    self._mark_code_page(pc, 1)
+                else:
+                    blocks.append(block)
+        return block
+    
+    def invalidate(self, address: int) -> None:
+        """Invalida los bloques de la página que contiene la dirección"""
+        blocks = self._pages.pop(code_page(address), None)
+        if blocks is None:
+            return
+        
+        self._mark_code_page(address, 0)
+        
+        for block in blocks:
+            block.valid = False
+            self._blocks.pop((block.pc << 1) | block.thumb, None)
+        
+        # El bloque en ejecución podría ser uno de los invalidados
+        self.cpu._block_exit = True
+    
+    def _mark_code_page(self, address: int, value: int) -> None:
+        """Actualiza el bitmap de páginas con código del bus (solo RAM)"""
+        region = (address >> 24) & 0xFF
+        if region == 0x02:
+            self.memory.ewram_code_pages[(address & 0x3FFFF) >> PAGE_SHIFT] = value
+        elif region == 0x03:
+            self.memory.iwram_code_pages[(address & 0x7FFF) >> PAGE_SHIFT] = value
+    
+    # ===== Decodificación =====
+    
+    @staticmethod
+    def _is_cacheable(pc: int) -> bool:
+        """BIOS, EWRAM, IWRAM y ROM"""
+        region = (pc >> 24) & 0xFF
+        return region in (0x00, 0x02, 0x03) or 0x08 <= region <= 0x0D
+    
+    def _decode_block(self, pc: int, thumb: bool) -> Optional[BasicBlock]:
+        """Decodifica instrucciones hasta el siguiente salto o escritura de PC"""
+        if not self._is_cacheable(pc):
+            return None
+        
+        page = code_page(pc)
+        entries = []
+        address = pc
+        
+        if thumb:
+            table = self.cpu.thumb_decoder._decode_table
+            read = self.memory.read_16
+            ends_block = self._thumb_ends_block
+            size = 2
+        else:
+            table = self.cpu.arm_decoder._decode_table
+            read = self.memory.read_32
+            ends_block = self._arm_ends_block
+            size = 4
+        
+        # Decodificar no es ejecutar: las esperas del fetch se cuentan al correr
+        stall = self.memory.stall_cycles
+        
+        while len(entries) < MAX_BLOCK_INSTRUCTIONS:
+            instruction = read(address)
+            if thumb:
+                handler = table[instruction >> 6]
+                entries.append((handler, instruction))
+            else:
+                handler = table[((instruction >> 16) & 0xFF0) | ((instruction >> 4) & 0xF)]
+                entries.append((handler, instruction, (instruction >> 28) & 0xF))
+            
+            if ends_block(handler, instruction):
+                break
+            
+            address = (address + size) & 0xFFFFFFFF
+            
+            # Un bloque nunca cruza una página
+            if code_page(address) != page:
+                break
+        
+        self.memory.stall_cycles = stall
+        block = BasicBlock(pc, thumb, entries, page)
+        block.idle_candidate = self._is_idle_candidate(block)
+        return block
+    
+    def _thumb_ends_block(self, handler, instruction: int) -> bool:
+        """Indica si una instrucción THUMB puede modificar PC o el estado"""
+        thumb = self.cpu.thumb_decoder
+        
+        if handler == thumb._format5_hireg_bx:
+            # BX o destino R15
+            return ((instruction >> 8) & 0x3) == 0b11 or (instruction & 0x87) == 0x87
+        
+        if handler == thumb._format14_push_pop:
+            # POP {.., PC}
+            return bool(instruction & (1 << 11)) and bool(instruction & (1 << 8))
+        
+        if handler == thumb._format19_long_branch:
+            # Solo la segunda mitad del BL salta
+            return bool(instruction & (1 << 11))
+        
+        return handler in (thumb._format16_cond_branch, thumb._format17_swi,
+                           thumb._format18_branch, thumb._undefined)
+    
+    def _arm_ends_block(self, handler, instruction: int) -> bool:
+        """Indica si una instrucción ARM puede modificar PC o el estado"""
+        arm = self.cpu.arm_decoder
+        
+        if handler in (arm._execute_branch, arm._execute_bx, arm._execute_swi,
+                       arm._execute_psr_transfer, arm._execute_undefined):
+            return True
+        
+        if handler == arm._execute_block_transfer:
+            # LDM con PC en la lista
+            return bool(instruction & (1 << 20)) and bool(instruction & (1 << 15))
+        
+        if (handler in arm._data_processing_handlers
+                or handler in (arm._execute_single_transfer, arm._execute_halfword_transfer)):
+            return ((instruction >> 12) & 0xF) == 15
+        
+        return False
+    
+    # ===== Detección de bucles de espera =====
+    
+    def _is_idle_candidate(self, block: BasicBlock) -> bool:
+        """
+        Indica si el bloque puede ser un bucle de espera (busy-wait)
+        
+        Debe ser corto, terminar en un salto (sin link) a su propio inicio
+        y no tener más efectos que leer memoria y modificar registros. Que
+        realmente esté esperando se confirma en ejecución comparando el
+        estado de la CPU entre dos vueltas.
+        """
+        entries = block.entries
+        if len(entries) > IDLE_LOOP_MAX_INSTRUCTIONS:
+            return False
+        
+        if block.thumb:
+            branch_pc = block.pc + (len(entries) - 1) * 2
+            target = self._thumb_branch_target(entries[-1][0], entries[-1][1], branch_pc)
+            side_effect_free = self._thumb_side_effect_free
+        else:
+            branch_pc = block.pc + (len(entries) - 1) * 4
+            target = self._arm_branch_target(entries[-1][0], entries[-1][1], branch_pc)
+            side_effect_free = self._arm_side_effect_free
+        
+        if target != block.pc:
+            return False
+        
+        return all(side_effect_free(entry[0], entry[1]) for entry in entries[:-1])
+    
+    def _thumb_branch_target(self, handler, instruction: int, pc: int) -> Optional[int]:
+        """Destino de un salto THUMB B/Bcc (None si no lo es)"""
+        thumb = self.cpu.thumb_decoder
+        
+        if handler == thumb._format16_cond_branch:
+            offset = instruction & 0xFF
+            if offset & 0x80:
+                offset -= 0x100
+        elif handler == thumb._format18_branch:
+            offset = instruction & 0x7FF
+            if offset & 0x400:
+                offset -= 0x800
+        else:
+            return None
+        
+        return (pc + 4 + offset * 2) & 0xFFFFFFFF
+    
+    def _arm_branch_target(self, handler, instruction: int, pc: int) -> Optional[int]:
+        """Destino de un salto ARM B (None si no lo es o es BL)"""
+        if handler != self.cpu.arm_decoder._execute_branch or instruction & (1 << 24):
+            return None
+        
+        offset = instruction & 0xFFFFFF
+        if offset & 0x800000:
+            offset -= 0x1000000
+        
+        return (pc + 8 + offset * 4) & 0xFFFFFFFF
+    
+    def _thumb_side_effect_free(self, handler, instruction: int) -> bool:
+        """ALU, comparaciones y cargas THUMB (sin escrituras a memoria)"""
+        thumb = self.cpu.thumb_decoder
+        
+        if handler in (thumb._format7_load_store_reg, thumb._format9_load_store_imm,
+                       thumb._format10_load_store_half, thumb._format11_sp_relative):
+            return bool(instruction & (1 << 11))
+        
+        if handler == thumb._format8_load_store_signed:
+            # STRH es la única variante que escribe
+            return ((instruction >> 10) & 0x3) != 0
+        
+        # Un BX o escritura de PC en formato 5 ya habría cerrado el bloque
+        if handler in (thumb._format2_add_sub, thumb._format5_hireg_bx, thumb._format6_pc_load,
+                       thumb._format12_load_address, thumb._format13_sp_offset):
+            return True
+        
+        return (handler in thumb._format1_ops or handler in thumb._format3_ops
+                or handler in thumb._format4_ops)
+    
+    def _arm_side_effect_free(self, handler, instruction: int) -> bool:
+        """Procesamiento de datos, multiplicaciones y cargas ARM"""
+        arm = self.cpu.arm_decoder
+        
+        if handler in (arm._execute_single_transfer, arm._execute_halfword_transfer):
+            return bool(instruction & (1 << 20))
+        
+        return (handler in arm._data_processing_handlers
+                or handler in (arm._execute_multiply, arm._execute_multiply_long))
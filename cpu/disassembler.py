@@ -0,0 +1,455 @@
+"""
+Desensamblador ARM/THUMB
+Reutiliza las tablas de decodificación de la CPU y memoiza por dirección
+"""
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
+
+from .arm_instructions import IMMEDIATE_VALUES
+
+if TYPE_CHECKING:
+    from .arm7tdmi import ARM7TDMI
+
+# Máximo de entradas memoizadas antes de vaciar la caché
+CACHE_LIMIT = 1 << 16
+
+CONDITIONS = ('EQ', 'NE', 'CS', 'CC', 'MI', 'PL', 'VS', 'VC',
+              'HI', 'LS', 'GE', 'LT', 'GT', 'LE', '', 'NV')
+
+DP_NAMES = ('AND', 'EOR', 'SUB', 'RSB', 'ADD', 'ADC', 'SBC', 'RSC',
+            'TST', 'TEQ', 'CMP', 'CMN', 'ORR', 'MOV', 'BIC', 'MVN')
+
+SHIFT_NAMES = ('LSL', 'LSR', 'ASR', 'ROR')
+
+
+def reg_name(r: int) -> str:
+    return ('SP', 'LR', 'PC')[r - 13] if r >= 13 else f"R{r}"
+
+
+def reg_list(mask: int) -> str:
+    """Lista de registros con rangos: {R0-R3, R5, LR}"""
+    parts = []
+    r = 0
+    while r < 16:
+        if mask & (1 << r):
+            start = r
+            while r + 1 < 16 and mask & (1 << (r + 1)) and r + 1 < 13:
+                r += 1
+            if r - start >= 2:
+                parts.append(f"{reg_name(start)}-{reg_name(r)}")
+            else:
+                parts.extend(reg_name(i) for i in range(start, r + 1))
+        r += 1
+    return "{" + ", ".join(parts) + "}"
+
+
+def _signed(value: int, bits: int) -> int:
+    sign = 1 << (bits - 1)
+    return (value & (sign - 1)) - (value & sign)
+
+
+def _offset(value: int) -> str:
+    return f"#-0x{-value:X}" if value < 0 else f"#0x{value:X}"
+
+
+class Disassembler:
+    """
+    Desensamblador de instrucciones ARM y THUMB
+    
+    Cada handler de las tablas de decodificación de la CPU tiene un
+    formateador asociado, así que clasificar una instrucción es el mismo
+    acceso a tabla que al ejecutarla. Los resultados se memoizan por
+    (dirección, opcode): los saltos relativos dependen de la dirección.
+    """
+    
+    def __init__(self, cpu: 'ARM7TDMI'):
+        self.cpu = cpu
+        self.memory = cpu.memory
+        
+        arm = {
+            '_execute_dp_immediate': self._arm_data_processing,
+            '_execute_dp_lsl_imm': self._arm_data_processing,
+            '_execute_dp_lsr_imm': self._arm_data_processing,
+            '_execute_dp_asr_imm': self._arm_data_processing,
+            '_execute_dp_ror_imm': self._arm_data_processing,
+            '_execute_dp_lsl_reg': self._arm_data_processing,
+            '_execute_dp_lsr_reg': self._arm_data_processing,
+            '_execute_dp_asr_reg': self._arm_data_processing,
+            '_execute_dp_ror_reg': self._arm_data_processing,
+            '_execute_multiply': self._arm_multiply,
+            '_execute_multiply_long': self._arm_multiply_long,
+            '_execute_swap': self._arm_swap,
+            '_execute_bx': self._arm_bx,
+            '_execute_psr_transfer': self._arm_psr_transfer,
+            '_execute_single_transfer': self._arm_single_transfer,
+            '_execute_halfword_transfer': self._arm_halfword_transfer,
+            '_execute_block_transfer': self._arm_block_transfer,
+            '_execute_branch': self._arm_branch,
+            '_execute_swi': self._arm_swi,
+        }
+        thumb = {
+            '_format1_lsl': self._thumb_shift_imm,
+            '_format1_lsr': self._thumb_shift_imm,
+            '_format1_asr': self._thumb_shift_imm,
+            '_format2_add_sub': self._thumb_add_sub,
+            '_format3_mov': self._thumb_imm8,
+            '_format3_cmp': self._thumb_imm8,
+            '_format3_add': self._thumb_imm8,
+            '_format3_sub': self._thumb_imm8,
+            '_format5_hireg_bx': self._thumb_hireg,
+            '_format6_pc_load': self._thumb_pc_load,
+            '_format7_load_store_reg': self._thumb_load_store_reg,
+            '_format8_load_store_signed': self._thumb_load_store_signed,
+            '_format9_load_store_imm': self._thumb_load_store_imm,
+            '_format10_load_store_half': self._thumb_load_store_half,
+            '_format11_sp_relative': self._thumb_sp_relative,
+            '_format12_load_address': self._thumb_load_address,
+            '_format13_sp_offset': self._thumb_sp_offset,
+            '_format14_push_pop': self._thumb_push_pop,
+            '_format15_multiple': self._thumb_multiple,
+            '_format16_cond_branch': self._thumb_cond_branch,
+            '_format17_swi': self._thumb_swi,
+            '_format18_branch': self._thumb_branch,
+            '_format19_long_branch': self._thumb_long_branch,
+        }
+        
+        # Tablas paralelas a las de decodificación (mismo índice)
+        self._arm_table: List[Callable[[int, int], str]] = [
+            arm.get(handler.__name__, self._undefined)
+            for handler in cpu.arm_decoder._decode_table]
+        self._thumb_table: List[Callable[[int, int], str]] = []
+        for handler in cpu.thumb_decoder._decode_table:
+            name = handler.__name__
+            if name.startswith('_format4_'):
+                self._thumb_table.append(self._thumb_alu)
+            else:
+                self._thumb_table.append(thumb.get(name, self._undefined))
+        
+        self._cache: Dict[Tuple[int, int, bool], str] = {}
+    
+    # ===== API =====
+    
+    def disassemble(self, address: int, opcode: int, thumb: bool) -> str:
+        """
+        Texto de la instrucción `opcode` ubicada en `address`
+        
+        La primera mitad de un BL THUMB lleva la segunda en los bits 16-31;
+        si no viene, se lee de memoria (la clave de la caché incluye ambas).
+        """
+        if thumb and (opcode & 0xFFFFF800) == 0xF000:
+            opcode |= self._read_16(address + 2) << 16
+        
+        key = (address, opcode, thumb)
+        text = self._cache.get(key)
+        if text is None:
+            if len(self._cache) >= CACHE_LIMIT:
+                self._cache.clear()
+            if thumb:
+                text = self._thumb_table[(opcode & 0xFFFF) >> 6](address, opcode)
+            else:
+                index = ((opcode >> 16) & 0xFF0) | ((opcode >> 4) & 0xF)
+                text = self._arm_table[index](address, opcode)
+            self._cache[key] = text
+        return text
+    
+    def disassemble_at(self, address: int, thumb: bool) -> str:
+        """Desensambla leyendo la instrucción de memoria"""
+        if thumb:
+            return self.disassemble(address, self._read_16(address), True)
+        return self.disassemble(address, self._read_32(address), False)
+    
+    def disassemble_range(self, start: int, end: int,
+                          thumb: bool) -> List[Tuple[int, int, str]]:
+        """
+        Desensambla [start, end) devolviendo (dirección, opcode, texto)
+        
+        En ROM los opcodes se extraen de una vez con NumPy; en el resto de
+        regiones se leen por el bus.
+        """
+        size = 2 if thumb else 4
+        start &= ~(size - 1)
+        count = max(0, (end - start) // size)
+        rom = self.memory.rom
+        offset = start & 0x01FFFFFF
+        
+        if 0x08 <= (start >> 24) <= 0x0D and offset + count * size <= len(rom):
+            data = rom[offset:offset + count * size]
+            opcodes = data.view('<u2' if thumb else '<u4').tolist()
+        else:
+            read = self._read_16 if thumb else self._read_32
+            opcodes = [read(start + i * size) for i in range(count)]
+        
+        lines = []
+        for i, opcode in enumerate(opcodes):
+            address = start + i * size
+            if thumb and (opcode & 0xF800) == 0xF000 and i + 1 < count:
+                text = self.disassemble(address, opcode | (opcodes[i + 1] << 16), True)
+            else:
+                text = self.disassemble(address, opcode, thumb)
+            lines.append((address, opcode, text))
+        return lines
+    
+    def clear(self) -> None:
+        self._cache.clear()
+    
+    def _read_16(self, address: int) -> int:
+        """Lectura sin contar esperas (no es un acceso de la CPU)"""
+        memory = self.memory
+        stall = memory.stall_cycles
+        value = memory.read_16(address)
+        memory.stall_cycles = stall
+        return value
+    
+    def _read_32(self, address: int) -> int:
+        memory = self.memory
+        stall = memory.stall_cycles
+        value = memory.read_32(address)
+        memory.stall_cycles = stall
+        return value
+    
+    def _undefined(self, address: int, opcode: int) -> str:
+        return f"UND 0x{opcode:X}"
+    
+    # ===== ARM =====
+    
+    def _arm_shifter(self, opcode: int) -> str:
+        """Operando 2 con registro desplazado"""
+        rm = reg_name(opcode & 0xF)
+        shift = (opcode >> 5) & 0x3
+        if opcode & (1 << 4):
+            return f"{rm}, {SHIFT_NAMES[shift]} {reg_name((opcode >> 8) & 0xF)}"
+        
+        amount = (opcode >> 7) & 0x1F
+        if amount == 0:
+            if shift == 0:
+                return rm
+            if shift == 3:
+                return f"{rm}, RRX"
+            amount = 32
+        return f"{rm}, {SHIFT_NAMES[shift]} #{amount}"
+    
+    def _arm_data_processing(self, address: int, opcode: int) -> str:
+        cond = CONDITIONS[opcode >> 28]
+        op = (opcode >> 21) & 0xF
+        name = DP_NAMES[op]
+        rd = reg_name((opcode >> 12) & 0xF)
+        rn = reg_name((opcode >> 16) & 0xF)
+        
+        if opcode & (1 << 25):
+            operand = f"#0x{IMMEDIATE_VALUES[opcode & 0xFFF]:X}"
+        else:
+            operand = self._arm_shifter(opcode)
+        
+        if 0x8 <= op <= 0xB:
+            return f"{name}{cond} {rn}, {operand}"
+        s = 'S' if opcode & (1 << 20) else ''
+        if op in (0xD, 0xF):
+            return f"{name}{cond}{s} {rd}, {operand}"
+        return f"{name}{cond}{s} {rd}, {rn}, {operand}"
+    
+    def _arm_multiply(self, address: int, opcode: int) -> str:
+        cond = CONDITIONS[opcode >> 28]
+        s = 'S' if opcode & (1 << 20) else ''
+        rd = reg_name((opcode >> 16) & 0xF)
+        rm = reg_name(opcode & 0xF)
+        rs = reg_name((opcode >> 8) & 0xF)
+        if opcode & (1 << 21):
+            return f"MLA{cond}{s} {rd}, {rm}, {rs}, {reg_name((opcode >> 12) & 0xF)}"
+        return f"MUL{cond}{s} {rd}, {rm}, {rs}"
+    
+    def _arm_multiply_long(self, address: int, opcode: int) -> str:
+        cond = CONDITIONS[opcode >> 28]
+        s = 'S' if opcode & (1 << 20) else ''
+        name = ('S' if opcode & (1 << 22) else 'U') + ('MLAL' if opcode & (1 << 21) else 'MULL')
+        lo = reg_name((opcode >> 12) & 0xF)
+        hi = reg_name((opcode >> 16) & 0xF)
+        return f"{name}{cond}{s} {lo}, {hi}, {reg_name(opcode & 0xF)}, {reg_name((opcode >> 8) & 0xF)}"
+    
+    def _arm_swap(self, address: int, opcode: int) -> str:
+        cond = CONDITIONS[opcode >> 28]
+        b = 'B' if opcode & (1 << 22) else ''
+        return (f"SWP{cond}{b} {reg_name((opcode >> 12) & 0xF)}, "
+                f"{reg_name(opcode & 0xF)}, [{reg_name((opcode >> 16) & 0xF)}]")
+    
+    def _arm_bx(self, address: int, opcode: int) -> str:
+        return f"BX{CONDITIONS[opcode >> 28]} {reg_name(opcode & 0xF)}"
+    
+    def _arm_psr_transfer(self, address: int, opcode: int) -> str:
+        cond = CONDITIONS[opcode >> 28]
+        psr = 'SPSR' if opcode & (1 << 22) else 'CPSR'
+        if not opcode & (1 << 21):
+            return f"MRS{cond} {reg_name((opcode >> 12) & 0xF)}, {psr}"
+        
+        fields = ''.join(letter for bit, letter in ((19, 'f'), (18, 's'), (17, 'x'), (16, 'c'))
+                         if opcode & (1 << bit))
+        if opcode & (1 << 25):
+            operand = f"#0x{IMMEDIATE_VALUES[opcode & 0xFFF]:X}"
+        else:
+            operand = reg_name(opcode & 0xF)
+        return f"MSR{cond} {psr}_{fields}, {operand}"
+    
+    def _arm_address(self, address: int, opcode: int, offset: str) -> str:
+        """Modo de direccionamiento [Rn, off]{!} o [Rn], off"""
+        rn = (opcode >> 16) & 0xF
+        if opcode & (1 << 24):
+            writeback = '!' if opcode & (1 << 21) else ''
+            if offset is None:
+                return f"[{reg_name(rn)}]{writeback}"
+            return f"[{reg_name(rn)}, {offset}]{writeback}"
+        return f"[{reg_name(rn)}], {offset or '#0x0'}"
+    
+    def _arm_single_transfer(self, address: int, opcode: int) -> str:
+        cond = CONDITIONS[opcode >> 28]
+        name = 'LDR' if opcode & (1 << 20) else 'STR'
+        b = 'B' if opcode & (1 << 22) else ''
+        t = 'T' if not opcode & (1 << 24) and opcode & (1 << 21) else ''
+        rd = reg_name((opcode >> 12) & 0xF)
+        up = opcode & (1 << 23)
+        
+        if opcode & (1 << 25):
+            offset = ('' if up else '-') + self._arm_shifter(opcode & ~(1 << 4))
+        else:
+            value = opcode & 0xFFF
+            if (opcode >> 16) & 0xF == 15 and opcode & (1 << 24) and not opcode & (1 << 21):
+                # Literal relativo a PC
+                target = (address + 8 + (value if up else -value)) & 0xFFFFFFFF
+                return f"{name}{cond}{b} {rd}, [PC, {_offset(value if up else -value)}] ; =0x{target:08X}"
+            offset = _offset(value if up else -value) if value else None
+        
+        return f"{name}{cond}{b}{t} {rd}, {self._arm_address(address, opcode, offset)}"
+    
+    def _arm_halfword_transfer(self, address: int, opcode: int) -> str:
+        cond = CONDITIONS[opcode >> 28]
+        load = opcode & (1 << 20)
+        kind = (opcode >> 5) & 0x3
+        name = ('LDR' if load else 'STR') + ('', 'H', 'SB', 'SH')[kind]
+        rd = reg_name((opcode >> 12) & 0xF)
+        up = opcode & (1 << 23)
+        
+        if opcode & (1 << 22):
+            value = ((opcode >> 4) & 0xF0) | (opcode & 0xF)
+            offset = _offset(value if up else -value) if value else None
+        else:
+            offset = ('' if up else '-') + reg_name(opcode & 0xF)
+        
+        return f"{name}{cond} {rd}, {self._arm_address(address, opcode, offset)}"
+    
+    def _arm_block_transfer(self, address: int, opcode: int) -> str:
+        cond = CONDITIONS[opcode >> 28]
+        name = 'LDM' if opcode & (1 << 20) else 'STM'
+        mode = ('DA', 'IA', 'DB', 'IB')[(opcode >> 23) & 0x3]
+        writeback = '!' if opcode & (1 << 21) else ''
+        user = '^' if opcode & (1 << 22) else ''
+        rn = reg_name((opcode >> 16) & 0xF)
+        return f"{name}{cond}{mode} {rn}{writeback}, {reg_list(opcode & 0xFFFF)}{user}"
+    
+    def _arm_branch(self, address: int, opcode: int) -> str:
+        cond = CONDITIONS[opcode >> 28]
+        link = 'L' if opcode & (1 << 24) else ''
+        target = (address + 8 + _signed(opcode & 0xFFFFFF, 24) * 4) & 0xFFFFFFFF
+        return f"B{link}{cond} 0x{target:08X}"
+    
+    def _arm_swi(self, address: int, opcode: int) -> str:
+        return f"SWI{CONDITIONS[opcode >> 28]} 0x{opcode & 0xFFFFFF:06X}"
+    
+    # ===== THUMB =====
+    
+    def _thumb_shift_imm(self, address: int, opcode: int) -> str:
+        op = (opcode >> 11) & 0x3
+        amount = (opcode >> 6) & 0x1F
+        if amount == 0 and op:
+            amount = 32
+        return (f"{SHIFT_NAMES[op]} {reg_name(opcode & 0x7)}, "
+                f"{reg_name((opcode >> 3) & 0x7)}, #{amount}")
+    
+    def _thumb_add_sub(self, address: int, opcode: int) -> str:
+        name = 'SUB' if opcode & (1 << 9) else 'ADD'
+        value = (opcode >> 6) & 0x7
+        operand = f"#{value}" if opcode & (1 << 10) else reg_name(value)
+        return f"{name} {reg_name(opcode & 0x7)}, {reg_name((opcode >> 3) & 0x7)}, {operand}"
+    
+    def _thumb_imm8(self, address: int, opcode: int) -> str:
+        name = ('MOV', 'CMP', 'ADD', 'SUB')[(opcode >> 11) & 0x3]
+        return f"{name} {reg_name((opcode >> 8) & 0x7)}, #0x{opcode & 0xFF:X}"
+    
+    def _thumb_alu(self, address: int, opcode: int) -> str:
+        name = ('AND', 'EOR', 'LSL', 'LSR', 'ASR', 'ADC', 'SBC', 'ROR',
+                'TST', 'NEG', 'CMP', 'CMN', 'ORR', 'MUL', 'BIC', 'MVN')[(opcode >> 6) & 0xF]
+        return f"{name} {reg_name(opcode & 0x7)}, {reg_name((opcode >> 3) & 0x7)}"
+    
+    def _thumb_hireg(self, address: int, opcode: int) -> str:
+        op = (opcode >> 8) & 0x3
+        rd = (opcode & 0x7) | ((opcode >> 4) & 0x8)
+        rs = (opcode >> 3) & 0xF
+        if op == 3:
+            return f"BX {reg_name(rs)}"
+        return f"{('ADD', 'CMP', 'MOV')[op]} {reg_name(rd)}, {reg_name(rs)}"
+    
+    def _thumb_pc_load(self, address: int, opcode: int) -> str:
+        offset = (opcode & 0xFF) << 2
+        target = (((address + 4) & ~3) + offset) & 0xFFFFFFFF
+        return f"LDR {reg_name((opcode >> 8) & 0x7)}, [PC, #0x{offset:X}] ; =0x{target:08X}"
+    
+    def _thumb_load_store_reg(self, address: int, opcode: int) -> str:
+        name = ('LDR' if opcode & (1 << 11) else 'STR') + ('B' if opcode & (1 << 10) else '')
+        return (f"{name} {reg_name(opcode & 0x7)}, [{reg_name((opcode >> 3) & 0x7)}, "
+                f"{reg_name((opcode >> 6) & 0x7)}]")
+    
+    def _thumb_load_store_signed(self, address: int, opcode: int) -> str:
+        name = ('STRH', 'LDRSB', 'LDRH', 'LDRSH')[(opcode >> 10) & 0x3]
+        return (f"{name} {reg_name(opcode & 0x7)}, [{reg_name((opcode >> 3) & 0x7)}, "
+                f"{reg_name((opcode >> 6) & 0x7)}]")
+    
+    def _thumb_load_store_imm(self, address: int, opcode: int) -> str:
+        byte = opcode & (1 << 12)
+        name = ('LDR' if opcode & (1 << 11) else 'STR') + ('B' if byte else '')
+        offset = ((opcode >> 6) & 0x1F) << (0 if byte else 2)
+        return f"{name} {reg_name(opcode & 0x7)}, [{reg_name((opcode >> 3) & 0x7)}, #0x{offset:X}]"
+    
+    def _thumb_load_store_half(self, address: int, opcode: int) -> str:
+        name = 'LDRH' if opcode & (1 << 11) else 'STRH'
+        offset = ((opcode >> 6) & 0x1F) << 1
+        return f"{name} {reg_name(opcode & 0x7)}, [{reg_name((opcode >> 3) & 0x7)}, #0x{offset:X}]"
+    
+    def _thumb_sp_relative(self, address: int, opcode: int) -> str:
+        name = 'LDR' if opcode & (1 << 11) else 'STR'
+        return f"{name} {reg_name((opcode >> 8) & 0x7)}, [SP, #0x{(opcode & 0xFF) << 2:X}]"
+    
+    def _thumb_load_address(self, address: int, opcode: int) -> str:
+        base = 'SP' if opcode & (1 << 11) else 'PC'
+        return f"ADD {reg_name((opcode >> 8) & 0x7)}, {base}, #0x{(opcode & 0xFF) << 2:X}"
+    
+    def _thumb_sp_offset(self, address: int, opcode: int) -> str:
+        offset = (opcode & 0x7F) << 2
+        return f"ADD SP, {_offset(-offset if opcode & 0x80 else offset)}"
+    
+    def _thumb_push_pop(self, address: int, opcode: int) -> str:
+        mask = opcode & 0xFF
+        if opcode & (1 << 11):
+            return f"POP {reg_list(mask | ((opcode & 0x100) << 7))}"
+        return f"PUSH {reg_list(mask | ((opcode & 0x100) << 6))}"
+    
+    def _thumb_multiple(self, address: int, opcode: int) -> str:
+        name = 'LDMIA' if opcode & (1 << 11) else 'STMIA'
+        return f"{name} {reg_name((opcode >> 8) & 0x7)}!, {reg_list(opcode & 0xFF)}"
+    
+    def _thumb_cond_branch(self, address: int, opcode: int) -> str:
+        target = (address + 4 + _signed(opcode & 0xFF, 8) * 2) & 0xFFFFFFFF
+        return f"B{CONDITIONS[(opcode >> 8) & 0xF]} 0x{target:08X}"
+    
+    def _thumb_swi(self, address: int, opcode: int) -> str:
+        return f"SWI 0x{opcode & 0xFF:02X}"
+    
+    def _thumb_branch(self, address: int, opcode: int) -> str:
+        target = (address + 4 + _signed(opcode & 0x7FF, 11) * 2) & 0xFFFFFFFF
+        return f"B 0x{target:08X}"
+    
+    def _thumb_long_branch(self, address: int, opcode: int) -> str:
+        """BL: la primera mitad lleva la segunda en los bits 16-31"""
+        if opcode & (1 << 11):
+            return f"BL (2ª mitad) #0x{(opcode & 0x7FF) << 1:X}"
+        
+        low = opcode >> 16
+        if (low & 0xF800) != 0xF800:
+            return f"BL (1ª mitad) #0x{(opcode & 0x7FF) << 12:X}"
+        offset = (_signed(opcode & 0x7FF, 11) << 12) | ((low & 0x7FF) << 1)
+        return f"BL 0x{(address + 4 + offset) & 0xFFFFFFFF:08X}"
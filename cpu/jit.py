@@ -0,0 +1,1027 @@
+"""
+JIT a código Python para bloques básicos calientes
+Genera una función Python especializada por bloque y la compila con compile()
+"""
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set
+
+if TYPE_CHECKING:
+    from .arm7tdmi import ARM7TDMI
+    from .block_cache import BasicBlock
+
+
+# Ejecuciones de un bloque antes de compilarlo
+JIT_THRESHOLD = 64
+
+ALL_FLAGS = frozenset('nzcv')
+
+# Condiciones ARM en función de los flags locales
+CONDITION_EXPRESSIONS = [
+    "z",                       # EQ
+    "not z",                   # NE
+    "c",                       # CS/HS
+    "not c",                   # CC/LO
+    "n",                       # MI
+    "not n",                   # PL
+    "v",                       # VS
+    "not v",                   # VC
+    "c and not z",             # HI
+    "not c or z",              # LS
+    "n == v",                  # GE
+    "n != v",                  # LT
+    "not z and n == v",        # GT
+    "z or n != v",             # LE
+    "True",                    # AL
+    "True",                    # NV (tratado como AL)
+]
+
+# Flags leídos por cada condición
+CONDITION_FLAGS = [
+    'z', 'z', 'c', 'c', 'n', 'n', 'v', 'v',
+    'cz', 'cz', 'nv', 'nv', 'znv', 'znv', '', '',
+]
+
+FLAG_ATTRS = {'n': 'flag_n', 'z': 'flag_z', 'c': 'flag_c', 'v': 'flag_v'}
+
+
+class _Op:
+    """Una instrucción del bloque ya analizada"""
+    
+    __slots__ = ('pc', 'instruction', 'kind', 'reads', 'writes', 'flags_read',
+                 'flags_written', 'cond', 'cycles', 'emit', 'handler', 'live')
+    
+    def __init__(self, pc: int, instruction: int, kind: str):
+        self.pc = pc
+        self.instruction = instruction
+        # 'alu', 'load', 'store', 'branch' o 'fallback'
+        self.kind = kind
+        self.reads: Set[int] = set()
+        self.writes: Set[int] = set()
+        self.flags_read: Set[str] = set()
+        self.flags_written: Set[str] = set()
+        self.cond = 0xE
+        self.cycles = 1
+        self.emit: Optional[Callable] = None
+        self.handler = None
+        self.live: Set[str] = set()
+
+
+class _Emitter:
+    """Acumula las líneas de código generado"""
+    
+    def __init__(self):
+        self.lines: List[str] = []
+        self.depth = 1
+    
+    def line(self, text: str) -> None:
+        self.lines.append("    " * self.depth + text)
+
+
+class BlockCompiler:
+    """
+    Compila bloques básicos calientes a funciones Python
+    
+    El código generado mantiene los registros y los flags en variables
+    locales, pliega las constantes dependientes de PC, evalúa las
+    condiciones en línea y solo calcula los flags que una instrucción
+    posterior llega a leer. Las instrucciones no soportadas se ejecutan
+    llamando al handler del intérprete (que sigue siendo la referencia).
+    """
+    
+    def __init__(self, cpu: 'ARM7TDMI'):
+        self.cpu = cpu
+        self.memory = cpu.memory
+        self.compiled_count = 0
+    
+    def compile(self, block: 'BasicBlock') -> Optional[Callable]:
+        """
+        Compila un bloque
+        
+        Returns:
+            Función f(cpu, reg, mem) -> ciclos, o None si no merece la pena
+        """
+        ops = self._analyze(block)
+        if all(op.kind == 'fallback' for op in ops):
+            return None
+        
+        self._compute_liveness(ops)
+        
+        namespace: Dict[str, object] = {}
+        source = self._generate(block, ops, namespace)
+        code = compile(source, f"<jit {block.pc:08X}{'T' if block.thumb else 'A'}>", 'exec')
+        exec(code, namespace)
+        self.compiled_count += 1
+        return namespace['block']
+    
+    # ===== Análisis =====
+    
+    def _analyze(self, block: 'BasicBlock') -> List[_Op]:
+        """Convierte cada instrucción en una _Op compilable o de fallback"""
+        ops = []
+        pc = block.pc
+        
+        for entry in block.entries:
+            handler, instruction = entry[0], entry[1]
+            
+            if block.thumb:
+                op = self._thumb_op(pc, instruction, handler)
+                size = 2
+            else:
+                op = self._arm_op(pc, instruction, handler)
+                op.cond = entry[2]
+                size = 4
+            
+            if op.kind == 'fallback':
+                op.handler = handler
+            
+            ops.append(op)
+            pc += size
+        
+        return ops
+    
+    def _compute_liveness(self, ops: List[_Op]) -> None:
+        """
+        Calcula qué flags escritos por cada instrucción se leen después
+        
+        Al salir del bloque, en un fallback o en una escritura que puede
+        terminar el bloque, todos los flags se consideran vivos.
+        """
+        live = set(ALL_FLAGS)
+        
+        for op in reversed(ops):
+            if op.kind == 'fallback':
+                op.live = set(ALL_FLAGS)
+                live = set(ALL_FLAGS)
+                continue
+            
+            op.live = op.flags_written & live
+            
+            if op.cond == 0xE or op.cond == 0xF:
+                live -= op.flags_written
+            live |= op.flags_read
+            
+            if op.cond not in (0xE, 0xF):
+                live |= set(CONDITION_FLAGS[op.cond])
+            
+            if op.kind in ('store', 'branch'):
+                live = set(ALL_FLAGS)
+    
+    # ===== Generación =====
+    
+    def _generate(self, block: 'BasicBlock', ops: List[_Op], namespace: dict) -> str:
+        """Genera el código fuente de la función del bloque"""
+        cached = set()
+        for op in ops:
+            cached |= op.reads | op.writes
+        cached = sorted(cached)
+        
+        em = _Emitter()
+        self._cached = cached
+        self._dirty: Set[int] = set()
+        self._dirty_flags: Set[str] = set()
+        self._thumb = block.thumb
+        
+        header = "def block(cpu, reg, mem):"
+        em.line("cycles = 0")
+        em.line("regs = reg._regs")
+        self._emit_load_state(em)
+        
+        size = 2 if block.thumb else 4
+        acc = 0
+        terminated = False
+        
+        for index, op in enumerate(ops):
+            next_pc = (op.pc + size) & 0xFFFFFFFF
+            
+            if op.kind == 'fallback':
+                name = f"H{index}"
+                namespace[name] = op.handler
+                if acc:
+                    em.line(f"cycles += {acc}")
+                    acc = 0
+                self._emit_flush(em)
+                em.line(f"cpu._current_pc = {op.pc:#x}")
+                em.line(f"cpu._current_instruction = {op.instruction:#x}")
+                em.line(f"regs[15] = {next_pc:#x}")
+                if op.cond in (0xE, 0xF):
+                    em.line(f"cycles += {name}({op.instruction:#x})")
+                else:
+                    em.line(f"if reg.check_condition({op.cond}):")
+                    em.line(f"    cycles += {name}({op.instruction:#x})")
+                    em.line("else:")
+                    em.line("    cycles += 1")
+                em.line(f"if regs[15] != {next_pc:#x} or cpu._block_exit:")
+                em.line("    return cycles")
+                self._emit_load_state(em)
+                continue
+            
+            conditional = op.cond not in (0xE, 0xF)
+            if conditional:
+                if acc:
+                    em.line(f"cycles += {acc}")
+                    acc = 0
+                em.line(f"if {CONDITION_EXPRESSIONS[op.cond]}:")
+                em.depth += 1
+                op.emit(self, em, op, next_pc, f"cycles + {op.cycles}")
+                em.line(f"cycles += {op.cycles}")
+                em.depth -= 1
+                em.line("else:")
+                em.line("    cycles += 1")
+            else:
+                op.emit(self, em, op, next_pc, f"cycles + {acc + op.cycles}")
+                acc += op.cycles
+            
+            self._dirty |= op.writes
+            self._dirty_flags |= op.live
+            
+            if op.kind == 'branch' and not conditional:
+                terminated = True
+                break
+        
+        if not terminated:
+            last = ops[-1]
+            next_pc = (last.pc + size) & 0xFFFFFFFF
+            self._emit_flush(em)
+            em.line(f"regs[15] = {next_pc:#x}")
+            em.line(f"cpu._current_pc = {last.pc:#x}")
+            em.line(f"cpu._current_instruction = {last.instruction:#x}")
+            em.line(f"return cycles + {acc}")
+        
+        return header + "\n" + "\n".join(em.lines) + "\n"
+    
+    def _emit_load_state(self, em: _Emitter) -> None:
+        """Carga registros y flags a variables locales"""
+        for r in self._cached:
+            em.line(f"r{r} = regs[{r}]")
+        for flag in 'nzcv':
+            em.line(f"{flag} = reg.{FLAG_ATTRS[flag]}")
+        self._dirty = set()
+        self._dirty_flags = set()
+    
+    def _emit_flush(self, em: _Emitter) -> None:
+        """Escribe los registros y flags modificados de vuelta"""
+        for r in sorted(self._dirty):
+            em.line(f"regs[{r}] = r{r}")
+        for flag in 'nzcv':
+            if flag in self._dirty_flags:
+                em.line(f"reg.{FLAG_ATTRS[flag]} = {flag}")
+    
+    def _emit_store(self, em: _Emitter, op: _Op, next_pc: int, cycles: str,
+                    call: str) -> None:
+        """
+        Emite una escritura a memoria
+        
+        Las escrituras a I/O pueden disparar una IRQ o un HALT, así que antes
+        se vuelca todo el estado. Las escrituras a RAM pueden invalidar el
+        propio bloque (código automodificable), en cuyo caso se sale.
+        """
+        em.line("if (a >> 24) == 0x04:")
+        em.depth += 1
+        self._emit_flush(em)
+        em.line(f"cpu._current_pc = {op.pc:#x}")
+        em.line(f"cpu._current_instruction = {op.instruction:#x}")
+        em.line(f"regs[15] = {next_pc:#x}")
+        em.line(call)
+        em.line(f"if regs[15] != {next_pc:#x} or cpu._block_exit:")
+        em.line(f"    return {cycles}")
+        em.depth -= 1
+        em.line("else:")
+        em.depth += 1
+        em.line(call)
+        em.line("if cpu._block_exit:")
+        em.depth += 1
+        self._emit_flush(em)
+        em.line(f"regs[15] = {next_pc:#x}")
+        em.line(f"cpu._current_pc = {op.pc:#x}")
+        em.line(f"return {cycles}")
+        em.depth -= 2
+    
+    def _emit_exit(self, em: _Emitter, op: _Op, cycles: str) -> None:
+        """Vuelca el estado y sale del bloque tras `op` (PC ya escrito)"""
+        self._emit_flush(em)
+        em.line(f"cpu._current_pc = {op.pc:#x}")
+        em.line(f"return {cycles}")
+    
+    # ===== Helpers de flags =====
+    
+    @staticmethod
+    def _emit_nz(em: _Emitter, op: _Op, var: str = "res") -> None:
+        if 'n' in op.live:
+            em.line(f"n = {var} > 0x7FFFFFFF")
+        if 'z' in op.live:
+            em.line(f"z = {var} == 0")
+    
+    @staticmethod
+    def _emit_add(em: _Emitter, op: _Op, a: str, b: str, carry_in: str = "") -> None:
+        """res = a + b (+ carry), con flags NZCV según liveness"""
+        em.line(f"a_ = {a}")
+        em.line(f"b_ = {b}")
+        em.line(f"t = a_ + b_{' + ' + carry_in if carry_in else ''}")
+        em.line("res = t & 0xFFFFFFFF")
+        if 'c' in op.live:
+            em.line("c = t > 0xFFFFFFFF")
+        if 'v' in op.live:
+            em.line("v = ((a_ ^ res) & (b_ ^ res)) > 0x7FFFFFFF")
+        BlockCompiler._emit_nz(em, op)
+    
+    @staticmethod
+    def _emit_sub(em: _Emitter, op: _Op, a: str, b: str, carry_in: str = "") -> None:
+        """res = a - b (- !carry), con flags NZCV según liveness"""
+        em.line(f"a_ = {a}")
+        em.line(f"b_ = {b}")
+        em.line(f"t = a_ - b_{' - (not ' + carry_in + ')' if carry_in else ''}")
+        em.line("res = t & 0xFFFFFFFF")
+        if 'c' in op.live:
+            em.line("c = t >= 0")
+        if 'v' in op.live:
+            em.line("v = ((a_ ^ b_) & (a_ ^ res)) > 0x7FFFFFFF")
+        BlockCompiler._emit_nz(em, op)
+    
+    @staticmethod
+    def _emit_load(em: _Emitter, kind: str, rd: int, pc: int) -> None:
+        """Carga desde la dirección 'a' al registro local rd"""
+        # Un contador de timer leído a mitad de bloque estima el tiempo
+        # transcurrido a partir de _current_pc (ver ARM7TDMI.batch_cycles)
+        em.line(f"cpu._current_pc = {pc:#x}")
+        if kind == 'word':
+            em.line("value = mem.read_32(a)")
+            em.line("m = (a & 3) << 3")
+            em.line("if m:")
+            em.line("    value = ((value >> m) | (value << (32 - m))) & 0xFFFFFFFF")
+            em.line(f"r{rd} = value")
+        elif kind == 'byte':
+            em.line(f"r{rd} = mem.read_8(a)")
+        elif kind == 'half':
+            em.line(f"r{rd} = mem.read_16(a)")
+        elif kind == 'sbyte':
+            em.line("value = mem.read_8(a)")
+            em.line(f"r{rd} = value | 0xFFFFFF00 if value & 0x80 else value")
+        else:  # 'shalf'
+            em.line("value = mem.read_16(a)")
+            em.line(f"r{rd} = value | 0xFFFF0000 if value & 0x8000 else value")
+    
+    # ===== THUMB =====
+    
+    def _thumb_op(self, pc: int, instruction: int, handler) -> _Op:
+        """Analiza una instrucción THUMB"""
+        t = self.cpu.thumb_decoder
+        top = instruction >> 6
+        
+        if handler in t._format1_ops:
+            return self._thumb_shift_imm(pc, instruction, t._format1_ops.index(handler))
+        if handler == t._format2_add_sub:
+            return self._thumb_add_sub(pc, instruction)
+        if handler in t._format3_ops:
+            return self._thumb_immediate(pc, instruction, t._format3_ops.index(handler))
+        if handler in t._format4_ops:
+            return self._thumb_alu(pc, instruction, top & 0xF)
+        if handler == t._format5_hireg_bx:
+            return self._thumb_hireg(pc, instruction)
+        if handler == t._format6_pc_load:
+            return self._thumb_pc_load(pc, instruction)
+        if handler in (t._format7_load_store_reg, t._format8_load_store_signed):
+            return self._thumb_load_store_reg(pc, instruction, handler == t._format8_load_store_signed)
+        if handler in (t._format9_load_store_imm, t._format10_load_store_half,
+                       t._format11_sp_relative):
+            return self._thumb_load_store_imm(pc, instruction, handler)
+        if handler == t._format12_load_address:
+            return self._thumb_load_address(pc, instruction)
+        if handler == t._format13_sp_offset:
+            return self._thumb_sp_offset(pc, instruction)
+        if handler == t._format16_cond_branch:
+            return self._thumb_cond_branch(pc, instruction)
+        if handler == t._format18_branch:
+            return self._thumb_branch(pc, instruction)
+        if handler == t._format19_long_branch:
+            return self._thumb_long_branch(pc, instruction)
+        
+        return _Op(pc, instruction, 'fallback')
+    
+    def _thumb_shift_imm(self, pc: int, instruction: int, shift_type: int) -> _Op:
+        """Format 1: LSL/LSR/ASR Rd, Rs, #offset"""
+        op = _Op(pc, instruction, 'alu')
+        offset = (instruction >> 6) & 0x1F
+        rs = (instruction >> 3) & 0x7
+        rd = instruction & 0x7
+        op.reads = {rs}
+        op.writes = {rd}
+        op.flags_written = {'n', 'z'} if (shift_type == 0 and offset == 0) else {'n', 'z', 'c'}
+        
+        def emit(self, em, op, next_pc, cycles):
+            em.line(f"a_ = r{rs}")
+            if shift_type == 0:
+                if offset == 0:
+                    em.line("res = a_")
+                else:
+                    if 'c' in op.live:
+                        em.line(f"c = ((a_ >> {32 - offset}) & 1) != 0")
+                    em.line(f"res = (a_ << {offset}) & 0xFFFFFFFF")
+            elif shift_type == 1:
+                if offset == 0:
+                    if 'c' in op.live:
+                        em.line("c = a_ > 0x7FFFFFFF")
+                    em.line("res = 0")
+                else:
+                    if 'c' in op.live:
+                        em.line(f"c = ((a_ >> {offset - 1}) & 1) != 0")
+                    em.line(f"res = a_ >> {offset}")
+            else:
+                if offset == 0:
+                    if 'c' in op.live:
+                        em.line("c = a_ > 0x7FFFFFFF")
+                    em.line("res = 0xFFFFFFFF if a_ > 0x7FFFFFFF else 0")
+                else:
+                    if 'c' in op.live:
+                        em.line(f"c = ((a_ >> {offset - 1}) & 1) != 0")
+                    mask = (0xFFFFFFFF << (32 - offset)) & 0xFFFFFFFF
+                    em.line(f"res = (a_ >> {offset}) | {mask:#x} if a_ > 0x7FFFFFFF else a_ >> {offset}")
+            em.line(f"r{rd} = res")
+            self._emit_nz(em, op)
+        
+        op.emit = emit
+        return op
+    
+    def _thumb_add_sub(self, pc: int, instruction: int) -> _Op:
+        """Format 2: ADD/SUB Rd, Rs, Rn/#imm3"""
+        op = _Op(pc, instruction, 'alu')
+        imm_flag = bool(instruction & (1 << 10))
+        sub_flag = bool(instruction & (1 << 9))
+        rn_or_imm = (instruction >> 6) & 0x7
+        rs = (instruction >> 3) & 0x7
+        rd = instruction & 0x7
+        op.reads = {rs} if imm_flag else {rs, rn_or_imm}
+        op.writes = {rd}
+        op.flags_written = set(ALL_FLAGS)
+        operand = str(rn_or_imm) if imm_flag else f"r{rn_or_imm}"
+        
+        def emit(self, em, op, next_pc, cycles):
+            if sub_flag:
+                self._emit_sub(em, op, f"r{rs}", operand)
+            else:
+                self._emit_add(em, op, f"r{rs}", operand)
+            em.line(f"r{rd} = res")
+        
+        op.emit = emit
+        return op
+    
+    def _thumb_immediate(self, pc: int, instruction: int, opcode: int) -> _Op:
+        """Format 3: MOV/CMP/ADD/SUB Rd, #imm8"""
+        op = _Op(pc, instruction, 'alu')
+        rd = (instruction >> 8) & 0x7
+        imm = instruction & 0xFF
+        
+        if opcode == 0:
+            op.writes = {rd}
+            op.flags_written = {'n', 'z'}
+        else:
+            op.reads = {rd}
+            op.writes = {rd} if opcode != 1 else set()
+            op.flags_written = set(ALL_FLAGS)
+        
+        def emit(self, em, op, next_pc, cycles):
+            if opcode == 0:  # MOV
+                em.line(f"r{rd} = {imm}")
+                if 'n' in op.live:
+                    em.line("n = False")
+                if 'z' in op.live:
+                    em.line(f"z = {imm == 0}")
+                return
+            if opcode == 2:
+                self._emit_add(em, op, f"r{rd}", str(imm))
+            else:
+                self._emit_sub(em, op, f"r{rd}", str(imm))
+            if opcode != 1:
+                em.line(f"r{rd} = res")
+        
+        op.emit = emit
+        return op
+    
+    # Format 4 soportados: (expresión, escribe Rd, flags, tipo)
+    _THUMB_ALU = {
+        0x0: ("r{d} & r{s}", True, 'nz'),          # AND
+        0x1: ("r{d} ^ r{s}", True, 'nz'),          # EOR
+        0x5: (None, True, 'adc'),                  # ADC
+        0x6: (None, True, 'sbc'),                  # SBC
+        0x8: ("r{d} & r{s}", False, 'nz'),         # TST
+        0x9: (None, True, 'neg'),                  # NEG
+        0xA: (None, False, 'cmp'),                 # CMP
+        0xB: (None, False, 'cmn'),                 # CMN
+        0xC: ("r{d} | r{s}", True, 'nz'),          # ORR
+        0xD: ("(r{d} * r{s}) & 0xFFFFFFFF", True, 'nz'),  # MUL
+        0xE: ("r{d} & ~r{s} & 0xFFFFFFFF", True, 'nz'),   # BIC
+        0xF: ("~r{s} & 0xFFFFFFFF", True, 'nz'),   # MVN
+    }
+    
+    def _thumb_alu(self, pc: int, instruction: int, alu_op: int) -> _Op:
+        """Format 4: operaciones ALU (los shifts por registro usan fallback)"""
+        if alu_op not in self._THUMB_ALU:
+            return _Op(pc, instruction, 'fallback')
+        
+        op = _Op(pc, instruction, 'alu')
+        rs = (instruction >> 3) & 0x7
+        rd = instruction & 0x7
+        expr, writes_rd, kind = self._THUMB_ALU[alu_op]
+        
+        op.reads = {rs} if alu_op in (0x9, 0xF) else {rs, rd}
+        op.writes = {rd} if writes_rd else set()
+        op.flags_written = {'n', 'z'} if kind == 'nz' else set(ALL_FLAGS)
+        if kind in ('adc', 'sbc'):
+            op.flags_read = {'c'}
+        op.cycles = 2 if alu_op == 0xD else 1
+        
+        def emit(self, em, op, next_pc, cycles):
+            if kind == 'nz':
+                em.line("res = " + expr.format(d=rd, s=rs))
+                self._emit_nz(em, op)
+            elif kind == 'adc':
+                self._emit_add(em, op, f"r{rd}", f"r{rs}", "c")
+            elif kind == 'sbc':
+                self._emit_sub(em, op, f"r{rd}", f"r{rs}", "c")
+            elif kind == 'neg':
+                self._emit_sub(em, op, "0", f"r{rs}")
+            elif kind == 'cmp':
+                self._emit_sub(em, op, f"r{rd}", f"r{rs}")
+            else:  # cmn
+                self._emit_add(em, op, f"r{rd}", f"r{rs}")
+            if writes_rd:
+                em.line(f"r{rd} = res")
+        
+        op.emit = emit
+        return op
+    
+    def _thumb_hireg(self, pc: int, instruction: int) -> _Op:
+        """Format 5: ADD/CMP/MOV con registros altos (BX y Rd=PC usan fallback)"""
+        opcode = (instruction >> 8) & 0x3
+        rs = ((instruction >> 3) & 0x7) + (8 if instruction & (1 << 6) else 0)
+        rd = (instruction & 0x7) + (8 if instruction & (1 << 7) else 0)
+        
+        if opcode == 0b11 or rd == 15:
+            return _Op(pc, instruction, 'fallback')
+        
+        op = _Op(pc, instruction, 'alu')
+        
+        # R15 leído durante la ejecución = instrucción + 2 (igual que el intérprete)
+        if rs == 15:
+            source = f"{(pc + 2) & 0xFFFFFFFF:#x}"
+        else:
+            source = f"r{rs}"
+            op.reads.add(rs)
+        
+        if opcode == 0b00:
+            op.reads.add(rd)
+            op.writes = {rd}
+        elif opcode == 0b01:
+            op.reads.add(rd)
+            op.flags_written = set(ALL_FLAGS)
+        else:
+            op.writes = {rd}
+        
+        def emit(self, em, op, next_pc, cycles):
+            if opcode == 0b00:
+                em.line(f"r{rd} = (r{rd} + {source}) & 0xFFFFFFFF")
+            elif opcode == 0b01:
+                self._emit_sub(em, op, f"r{rd}", source)
+            else:
+                em.line(f"r{rd} = {source}")
+        
+        op.emit = emit
+        return op
+    
+    def _thumb_pc_load(self, pc: int, instruction: int) -> _Op:
+        """Format 6: LDR Rd, [PC, #imm] (constante plegada si apunta a ROM)"""
+        op = _Op(pc, instruction, 'load')
+        rd = (instruction >> 8) & 0x7
+        address = (((pc + 2) & ~3) + ((instruction & 0xFF) << 2)) & 0xFFFFFFFF
+        op.writes = {rd}
+        op.cycles = 3
+        
+        # La ROM es inmutable: el literal se lee una sola vez al compilar
+        region = address >> 24
+        constant = None
+        if 0x08 <= region <= 0x0D and (address & 0x01FFFFFF) + 3 < len(self.memory.rom):
+            stall = self.memory.stall_cycles
+            constant = self.memory.read_32(address)
+            self.memory.stall_cycles = stall
+        
+        def emit(self, em, op, next_pc, cycles):
+            if constant is not None:
+                # El acceso a ROM sigue costando sus esperas (WAITCNT puede cambiar)
+                em.line(f"r{rd} = {constant:#x}")
+                em.line(f"mem.stall_cycles += mem.wait_n32[{region & 0xF:#x}]")
+            else:
+                em.line(f"r{rd} = mem.read_32({address:#x})")
+        
+        op.emit = emit
+        return op
+    
+    def _thumb_load_store_reg(self, pc: int, instruction: int, signed: bool) -> _Op:
+        """Formats 7 y 8: load/store con offset de registro"""
+        ro = (instruction >> 6) & 0x7
+        rb = (instruction >> 3) & 0x7
+        rd = instruction & 0x7
+        bit11 = bool(instruction & (1 << 11))
+        bit10 = bool(instruction & (1 << 10))
+        
+        if signed:
+            # STRH, LDRH, LDSB, LDSH
+            kind = [('store', 'half'), ('load', 'half'),
+                    ('load', 'sbyte'), ('load', 'shalf')][(bit10 << 1) | bit11]
+        else:
+            kind = ('load' if bit11 else 'store', 'byte' if bit10 else 'word')
+        
+        address = f"(r{rb} + r{ro}) & 0xFFFFFFFF"
+        return self._thumb_memory_op(pc, instruction, kind, address, {rb, ro}, rd)
+    
+    def _thumb_load_store_imm(self, pc: int, instruction: int, handler) -> _Op:
+        """Formats 9, 10 y 11: load/store con offset inmediato"""
+        t = self.cpu.thumb_decoder
+        load = bool(instruction & (1 << 11))
+        
+        if handler == t._format9_load_store_imm:
+            byte = bool(instruction & (1 << 12))
+            offset = (instruction >> 6) & 0x1F
+            if not byte:
+                offset <<= 2
+            rb = (instruction >> 3) & 0x7
+            rd = instruction & 0x7
+            width = 'byte' if byte else 'word'
+        elif handler == t._format10_load_store_half:
+            offset = ((instruction >> 6) & 0x1F) << 1
+            rb = (instruction >> 3) & 0x7
+            rd = instruction & 0x7
+            width = 'half'
+        else:
+            offset = (instruction & 0xFF) << 2
+            rb = 13
+            rd = (instruction >> 8) & 0x7
+            width = 'sp'
+        
+        address = f"(r{rb} + {offset}) & 0xFFFFFFFF"
+        kind = ('load' if load else 'store', width)
+        return self._thumb_memory_op(pc, instruction, kind, address, {rb}, rd)
+    
+    def _thumb_memory_op(self, pc: int, instruction: int, kind, address: str,
+                         base_regs: Set[int], rd: int) -> _Op:
+        """Construye una _Op de load/store THUMB"""
+        direction, width = kind
+        op = _Op(pc, instruction, direction)
+        op.reads = set(base_regs)
+        
+        if direction == 'load':
+            op.writes = {rd}
+            op.cycles = 3
+        else:
+            op.reads.add(rd)
+            op.cycles = 2
+        
+        def emit(self, em, op, next_pc, cycles):
+            em.line(f"a = {address}")
+            if direction == 'load':
+                # SP-relative es un LDR de word sin rotación
+                if width == 'sp':
+                    em.line(f"r{rd} = mem.read_32(a)")
+                else:
+                    self._emit_load(em, width, rd, op.pc)
+            else:
+                if width == 'byte':
+                    call = f"mem.write_8(a, r{rd} & 0xFF)"
+                elif width == 'half':
+                    call = f"mem.write_16(a, r{rd} & 0xFFFF)"
+                else:
+                    call = f"mem.write_32(a, r{rd})"
+                self._emit_store(em, op, next_pc, cycles, call)
+        
+        op.emit = emit
+        return op
+    
+    def _thumb_load_address(self, pc: int, instruction: int) -> _Op:
+        """Format 12: ADD Rd, PC/SP, #imm"""
+        op = _Op(pc, instruction, 'alu')
+        sp_flag = bool(instruction & (1 << 11))
+        rd = (instruction >> 8) & 0x7
+        offset = (instruction & 0xFF) << 2
+        op.writes = {rd}
+        
+        if sp_flag:
+            op.reads = {13}
+            expr = f"(r13 + {offset}) & 0xFFFFFFFF"
+        else:
+            expr = f"{(((pc + 2) & ~3) + offset) & 0xFFFFFFFF:#x}"
+        
+        def emit(self, em, op, next_pc, cycles):
+            em.line(f"r{rd} = {expr}")
+        
+        op.emit = emit
+        return op
+    
+    def _thumb_sp_offset(self, pc: int, instruction: int) -> _Op:
+        """Format 13: ADD SP, #±imm"""
+        op = _Op(pc, instruction, 'alu')
+        offset = (instruction & 0x7F) << 2
+        sign = '-' if instruction & (1 << 7) else '+'
+        op.reads = {13}
+        op.writes = {13}
+        
+        def emit(self, em, op, next_pc, cycles):
+            em.line(f"r13 = (r13 {sign} {offset}) & 0xFFFFFFFF")
+        
+        op.emit = emit
+        return op
+    
+    def _thumb_cond_branch(self, pc: int, instruction: int) -> _Op:
+        """Format 16: B{cond} (condición en línea con los flags locales)"""
+        op = _Op(pc, instruction, 'branch')
+        cond = (instruction >> 8) & 0xF
+        offset = instruction & 0xFF
+        if offset & 0x80:
+            offset -= 0x100
+        target = (pc + 4 + (offset << 1)) & 0xFFFFFFFF
+        op.flags_read = set(CONDITION_FLAGS[cond])
+        
+        def emit(self, em, op, next_pc, cycles):
+            em.line(f"if {CONDITION_EXPRESSIONS[cond]}:")
+            em.depth += 1
+            em.line(f"reg.pc = {target:#x}")
+            self._emit_exit(em, op, f"{cycles} + 3")
+            em.depth -= 1
+            em.line(f"regs[15] = {next_pc:#x}")
+            self._emit_exit(em, op, f"{cycles} + 1")
+        
+        # El coste real depende de si se toma el salto
+        op.cycles = 0
+        op.emit = emit
+        return op
+    
+    def _thumb_branch(self, pc: int, instruction: int) -> _Op:
+        """Format 18: B incondicional"""
+        op = _Op(pc, instruction, 'branch')
+        offset = instruction & 0x7FF
+        if offset & 0x400:
+            offset -= 0x800
+        target = (pc + 4 + (offset << 1)) & 0xFFFFFFFF
+        op.cycles = 3
+        
+        def emit(self, em, op, next_pc, cycles):
+            em.line(f"reg.pc = {target:#x}")
+            self._emit_exit(em, op, cycles)
+        
+        op.emit = emit
+        return op
+    
+    def _thumb_long_branch(self, pc: int, instruction: int) -> _Op:
+        """Format 19: BL (ambas mitades)"""
+        offset = instruction & 0x7FF
+        
+        if not instruction & (1 << 11):
+            op = _Op(pc, instruction, 'alu')
+            if offset & 0x400:
+                offset |= 0xFFFFF800
+            value = (pc + 4 + (offset << 12)) & 0xFFFFFFFF
+            op.writes = {14}
+            
+            def emit(self, em, op, next_pc, cycles):
+                em.line(f"r14 = {value:#x}")
+            
+            op.emit = emit
+            return op
+        
+        op = _Op(pc, instruction, 'branch')
+        op.reads = {14}
+        op.writes = {14}
+        op.cycles = 3
+        return_address = ((pc + 2) & 0xFFFFFFFF) | 1
+        
+        def emit(self, em, op, next_pc, cycles):
+            em.line(f"reg.pc = (r14 + {offset << 1}) & 0xFFFFFFFF")
+            em.line(f"r14 = {return_address:#x}")
+            self._dirty.add(14)
+            self._emit_exit(em, op, cycles)
+        
+        op.emit = emit
+        return op
+    
+    # ===== ARM =====
+    
+    def _arm_op(self, pc: int, instruction: int, handler) -> _Op:
+        """Analiza una instrucción ARM"""
+        a = self.cpu.arm_decoder
+        
+        if handler in a._data_processing_handlers:
+            return self._arm_data_processing(pc, instruction)
+        if handler == a._execute_single_transfer:
+            return self._arm_single_transfer(pc, instruction)
+        if handler == a._execute_branch:
+            return self._arm_branch(pc, instruction)
+        
+        return _Op(pc, instruction, 'fallback')
+    
+    def _arm_operand2(self, pc: int, instruction: int, op: _Op, need_carry: bool):
+        """
+        Genera las líneas del segundo operando (shift por inmediato)
+        
+        Returns:
+            (líneas, expresión del operando, expresión del carry o None),
+            o None si el operando no está soportado
+        """
+        if instruction & (1 << 25):
+            imm = instruction & 0xFF
+            rotate = ((instruction >> 8) & 0xF) * 2
+            if rotate == 0:
+                return [], str(imm), None
+            value = ((imm >> rotate) | (imm << (32 - rotate))) & 0xFFFFFFFF
+            return [], f"{value:#x}", str(bool(value >> 31))
+        
+        if instruction & (1 << 4):
+            return None  # Shift por registro
+        
+        rm = instruction & 0xF
+        if rm == 15:
+            return None
+        op.reads.add(rm)
+        
+        shift_type = (instruction >> 5) & 0x3
+        amount = (instruction >> 7) & 0x1F
+        lines = []
+        carry = None
+        
+        if shift_type == 0:
+            if amount == 0:
+                return [], f"r{rm}", None
+            lines.append(f"op2 = (r{rm} << {amount}) & 0xFFFFFFFF")
+            if need_carry:
+                lines.insert(0, f"sc = ((r{rm} >> {32 - amount}) & 1) != 0")
+                carry = "sc"
+        elif shift_type == 1:
+            if amount == 0:
+                lines.append("op2 = 0")
+                if need_carry:
+                    lines.insert(0, f"sc = r{rm} > 0x7FFFFFFF")
+                    carry = "sc"
+            else:
+                lines.append(f"op2 = r{rm} >> {amount}")
+                if need_carry:
+                    lines.insert(0, f"sc = ((r{rm} >> {amount - 1}) & 1) != 0")
+                    carry = "sc"
+        elif shift_type == 2:
+            amount = amount or 32
+            if amount == 32:
+                lines.append(f"op2 = 0xFFFFFFFF if r{rm} > 0x7FFFFFFF else 0")
+                if need_carry:
+                    lines.insert(0, f"sc = r{rm} > 0x7FFFFFFF")
+                    carry = "sc"
+            else:
+                mask = (0xFFFFFFFF << (32 - amount)) & 0xFFFFFFFF
+                lines.append(f"op2 = (r{rm} >> {amount}) | {mask:#x} if r{rm} > 0x7FFFFFFF else r{rm} >> {amount}")
+                if need_carry:
+                    lines.insert(0, f"sc = ((r{rm} >> {amount - 1}) & 1) != 0")
+                    carry = "sc"
+        else:
+            if amount == 0:
+                # RRX
+                op.flags_read.add('c')
+                lines.append(f"op2 = (r{rm} >> 1) | (c << 31)")
+                if need_carry:
+                    lines.insert(0, f"sc = (r{rm} & 1) != 0")
+                    carry = "sc"
+            else:
+                lines.append(f"op2 = ((r{rm} >> {amount}) | (r{rm} << {32 - amount})) & 0xFFFFFFFF")
+                if need_carry:
+                    lines.insert(0, f"sc = ((r{rm} >> {amount - 1}) & 1) != 0")
+                    carry = "sc"
+        
+        return lines, "op2", carry
+    
+    def _arm_data_processing(self, pc: int, instruction: int) -> _Op:
+        """Procesamiento de datos con operando inmediato o shift por inmediato"""
+        opcode = (instruction >> 21) & 0xF
+        s_bit = bool(instruction & (1 << 20))
+        rn = (instruction >> 16) & 0xF
+        rd = (instruction >> 12) & 0xF
+        
+        writes_rd = opcode not in (0x8, 0x9, 0xA, 0xB)
+        if writes_rd and rd == 15:
+            return _Op(pc, instruction, 'fallback')
+        
+        op = _Op(pc, instruction, 'alu')
+        logical = opcode in (0x0, 0x1, 0x8, 0x9, 0xC, 0xD, 0xE, 0xF)
+        operand = self._arm_operand2(pc, instruction, op, s_bit and logical)
+        if operand is None:
+            return _Op(pc, instruction, 'fallback')
+        op2_lines, op2, shifter_carry = operand
+        
+        # Rn = PC se lee como instrucción + 8
+        if opcode in (0xD, 0xF):
+            rn_expr = None
+        elif rn == 15:
+            rn_expr = f"{(pc + 8) & 0xFFFFFFFF:#x}"
+        else:
+            rn_expr = f"r{rn}"
+            op.reads.add(rn)
+        
+        if writes_rd:
+            op.writes = {rd}
+        if opcode in (0x5, 0x6, 0x7):
+            op.flags_read.add('c')
+        if s_bit:
+            if logical:
+                op.flags_written = {'n', 'z', 'c'} if shifter_carry else {'n', 'z'}
+            else:
+                op.flags_written = set(ALL_FLAGS)
+        
+        def emit(self, em, op, next_pc, cycles):
+            for text in op2_lines:
+                em.line(text)
+            
+            if logical:
+                expr = {
+                    0x0: f"{rn_expr} & {op2}", 0x1: f"{rn_expr} ^ {op2}",
+                    0x8: f"{rn_expr} & {op2}", 0x9: f"{rn_expr} ^ {op2}",
+                    0xC: f"{rn_expr} | {op2}", 0xD: f"{op2}",
+                    0xE: f"{rn_expr} & ~{op2} & 0xFFFFFFFF",
+                    0xF: f"~{op2} & 0xFFFFFFFF",
+                }[opcode]
+                em.line(f"res = {expr}")
+                if s_bit:
+                    if shifter_carry and 'c' in op.live:
+                        em.line(f"c = {shifter_carry}")
+                    self._emit_nz(em, op)
+            else:
+                if opcode in (0x2, 0xA):
+                    self._emit_sub(em, op, rn_expr, op2)
+                elif opcode == 0x3:
+                    self._emit_sub(em, op, op2, rn_expr)
+                elif opcode in (0x4, 0xB):
+                    self._emit_add(em, op, rn_expr, op2)
+                elif opcode == 0x5:
+                    self._emit_add(em, op, rn_expr, op2, "c")
+                elif opcode == 0x6:
+                    self._emit_sub(em, op, rn_expr, op2, "c")
+                else:  # RSC
+                    self._emit_sub(em, op, op2, rn_expr, "c")
+            
+            if writes_rd:
+                em.line(f"r{rd} = res")
+        
+        op.emit = emit
+        return op
+    
+    def _arm_single_transfer(self, pc: int, instruction: int) -> _Op:
+        """LDR/STR/LDRB/STRB pre-indexado, offset inmediato, sin write-back"""
+        load = bool(instruction & (1 << 20))
+        byte = bool(instruction & (1 << 22))
+        write_back = bool(instruction & (1 << 21))
+        up = bool(instruction & (1 << 23))
+        pre_index = bool(instruction & (1 << 24))
+        register_offset = bool(instruction & (1 << 25))
+        rn = (instruction >> 16) & 0xF
+        rd = (instruction >> 12) & 0xF
+        
+        if register_offset or write_back or not pre_index or rn == 15 or rd == 15:
+            return _Op(pc, instruction, 'fallback')
+        
+        offset = instruction & 0xFFF
+        sign = '+' if up else '-'
+        op = _Op(pc, instruction, 'load' if load else 'store')
+        op.reads = {rn}
+        
+        if load:
+            op.writes = {rd}
+            op.cycles = 3
+        else:
+            op.reads.add(rd)
+            op.cycles = 2
+        
+        def emit(self, em, op, next_pc, cycles):
+            em.line(f"a = (r{rn} {sign} {offset}) & 0xFFFFFFFF")
+            if load:
+                self._emit_load(em, 'byte' if byte else 'word', rd, op.pc)
+            else:
+                if byte:
+                    call = f"mem.write_8(a, r{rd} & 0xFF)"
+                else:
+                    call = f"mem.write_32(a, r{rd})"
+                self._emit_store(em, op, next_pc, cycles, call)
+        
+        op.emit = emit
+        return op
+    
+    def _arm_branch(self, pc: int, instruction: int) -> _Op:
+        """B y BL"""
+        op = _Op(pc, instruction, 'branch')
+        link = bool(instruction & (1 << 24))
+        offset = instruction & 0x00FFFFFF
+        if offset & 0x800000:
+            offset -= 0x1000000
+        target = (pc + 8 + (offset << 2)) & 0xFFFFFFFF
+        op.cycles = 3
+        if link:
+            op.writes = {14}
+        
+        def emit(self, em, op, next_pc, cycles):
+            if link:
+                em.line(f"r14 = {(pc + 4) & 0xFFFFFFFF:#x}")
+                self._dirty.add(14)
+            em.line(f"reg.pc = {target:#x}")
+            self._emit_exit(em, op, cycles)
+        
+        op.emit = emit
+        return op
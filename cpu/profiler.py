@@ -0,0 +1,249 @@
+"""
+Profiler de ejecución del ARM7TDMI
+Cuenta instrucciones y ciclos por PC y por bloque básico
+"""
+import json
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+if TYPE_CHECKING:
+    from .arm7tdmi import ARM7TDMI
+
+# Nombre de cada región de memoria (bits 24-31 de la dirección)
+REGION_NAMES = {
+    0x00: 'BIOS',
+    0x02: 'EWRAM',
+    0x03: 'IWRAM',
+    0x08: 'ROM', 0x09: 'ROM', 0x0A: 'ROM', 0x0B: 'ROM', 0x0C: 'ROM', 0x0D: 'ROM',
+}
+
+
+def region_name(address: int) -> str:
+    return REGION_NAMES.get((address >> 24) & 0xFF, 'OTRA')
+
+
+class Profiler:
+    """
+    Profiler por conteo de la CPU
+    
+    attach() reemplaza step() y execute_block() en la instancia de la CPU
+    por versiones instrumentadas; detach() las quita y la CPU vuelve a sus
+    métodos de clase, así que desactivado no cuesta nada.
+    
+    Las instrucciones de un bloque se cuentan hasta la última ejecutada
+    (_current_pc), así que una salida temprana no cuenta el resto.
+    """
+    
+    def __init__(self, cpu: 'ARM7TDMI'):
+        self.cpu = cpu
+        
+        # PC -> [instrucciones, ciclos] (instrucciones sueltas via step)
+        self.pcs: Dict[int, List[int]] = {}
+        
+        # (PC, thumb) -> [bloque, ejecuciones, instrucciones, ciclos]
+        self.blocks: Dict[Tuple[int, bool], list] = {}
+        
+        self.attached = False
+    
+    def attach(self) -> None:
+        """Instala las versiones instrumentadas en la CPU"""
+        if self.attached:
+            return
+        self.cpu.step = self._profiled_step
+        self.cpu.execute_block = self._profiled_execute_block
+        self.attached = True
+    
+    def detach(self) -> None:
+        """Restaura los métodos originales de la CPU"""
+        if not self.attached:
+            return
+        del self.cpu.step
+        del self.cpu.execute_block
+        self.attached = False
+    
+    def clear(self) -> None:
+        self.pcs.clear()
+        self.blocks.clear()
+    
+    # ===== Instrumentación =====
+    
+    def _profiled_step(self) -> int:
+        cpu = self.cpu
+        if cpu.halted:
+            return type(cpu).step(cpu)
+        
+        pc = cpu.registers.pc
+        cycles = type(cpu).step(cpu)
+        
+        entry = self.pcs.get(pc)
+        if entry is None:
+            self.pcs[pc] = [1, cycles]
+        else:
+            entry[0] += 1
+            entry[1] += cycles
+        return cycles
+    
+    def _profiled_execute_block(self) -> int:
+        cpu = self.cpu
+        if cpu.halted:
+            return type(cpu).execute_block(cpu)
+        
+        reg = cpu.registers
+        thumb = reg.thumb_mode
+        block = cpu.block_cache.lookup(reg.pc, thumb)
+        
+        # Sin bloque cae en step(), que ya está instrumentado
+        cycles = type(cpu).execute_block(cpu)
+        if block is None:
+            return cycles
+        
+        executed = ((cpu._current_pc - block.pc) >> (1 if thumb else 2)) + 1
+        key = (block.pc, thumb)
+        entry = self.blocks.get(key)
+        if entry is None:
+            self.blocks[key] = [block, 1, executed, cycles]
+        else:
+            entry[0] = block
+            entry[1] += 1
+            entry[2] += executed
+            entry[3] += cycles
+        return cycles
+    
+    # ===== Resultados =====
+    
+    def total_cycles(self) -> int:
+        return (sum(entry[1] for entry in self.pcs.values()) +
+                sum(entry[3] for entry in self.blocks.values()))
+    
+    def by_region(self) -> Dict[str, List[int]]:
+        """Región -> [instrucciones, ciclos]"""
+        regions: Dict[str, List[int]] = {}
+        
+        for pc, (instructions, cycles) in self.pcs.items():
+            totals = regions.setdefault(region_name(pc), [0, 0])
+            totals[0] += instructions
+            totals[1] += cycles
+        
+        for (pc, _), (_, _, instructions, cycles) in self.blocks.items():
+            totals = regions.setdefault(region_name(pc), [0, 0])
+            totals[0] += instructions
+            totals[1] += cycles
+        
+        return regions
+    
+    def hot_blocks(self, count: int = 10) -> List[list]:
+        """Bloques con más ciclos: [pc, thumb, ejecuciones, instrucciones, ciclos]"""
+        rows = [[pc, thumb, executions, instructions, cycles]
+                for (pc, thumb), (_, executions, instructions, cycles) in self.blocks.items()]
+        rows.sort(key=lambda row: row[4], reverse=True)
+        return rows[:count]
+    
+    def hot_loops(self, count: int = 10) -> List[dict]:
+        """
+        Bucles con más ciclos
+        
+        Un bucle es un bloque que termina en un salto hacia atrás; su cuerpo
+        son los bloques perfilados entre el destino del salto y ese final.
+        """
+        cache = self.cpu.block_cache
+        loops = {}
+        
+        for (pc, thumb), (block, executions, _, _) in self.blocks.items():
+            size = 2 if thumb else 4
+            handler, instruction = block.entries[-1][:2]
+            end = block.pc + (len(block.entries) - 1) * size
+            if thumb:
+                target = cache._thumb_branch_target(handler, instruction, end)
+            else:
+                target = cache._arm_branch_target(handler, instruction, end)
+            if target is None or target > end:
+                continue
+            
+            # Varios bloques pueden terminar en el mismo salto (entrada al bucle)
+            loop = loops.get((target, end, thumb))
+            if loop is not None:
+                loop['iterations'] += executions
+                continue
+            
+            body = [entry for (other_pc, other_thumb), entry in self.blocks.items()
+                    if other_thumb == thumb and target <= other_pc <= end]
+            body.sort(key=lambda entry: entry[0].pc)
+            
+            loops[(target, end, thumb)] = {
+                'start': target,
+                'end': end,
+                'thumb': thumb,
+                'iterations': executions,
+                'instructions': sum(entry[2] for entry in body),
+                'cycles': sum(entry[3] for entry in body),
+                'blocks': [entry[0] for entry in body],
+            }
+        
+        rows = sorted(loops.values(), key=lambda loop: loop['cycles'], reverse=True)
+        return rows[:count]
+    
+    def disassemble_block(self, block) -> List[str]:
+        """Listado desensamblado del bloque"""
+        disassemble = self.cpu.disassembler.disassemble
+        width = 4 if block.thumb else 8
+        return [f"{pc:08X}: {opcode:0{width}X}  {disassemble(pc, opcode, block.thumb)}"
+                for pc, opcode in zip(block.pcs, block.opcodes)]
+    
+    def report(self, count: int = 10) -> str:
+        """Resumen legible: regiones, bloques y bucles más calientes"""
+        total = self.total_cycles() or 1
+        lines = ["=" * 60, "Profiler de CPU", "=" * 60]
+        
+        lines.append(f"{'Región':<8} {'Instr.':>12} {'Ciclos':>12} {'%':>6}")
+        regions = sorted(self.by_region().items(), key=lambda item: item[1][1], reverse=True)
+        for name, (instructions, cycles) in regions:
+            lines.append(f"{name:<8} {instructions:>12} {cycles:>12} {100 * cycles / total:>5.1f}%")
+        
+        lines.append("-" * 60)
+        lines.append(f"Top {count} bloques")
+        for pc, thumb, executions, instructions, cycles in self.hot_blocks(count):
+            mode = 'T' if thumb else 'A'
+            lines.append(f"{pc:08X} {mode} x{executions:<10} {cycles:>12} ciclos "
+                         f"{100 * cycles / total:>5.1f}%")
+        
+        lines.append("-" * 60)
+        lines.append(f"Top {count} bucles")
+        for loop in self.hot_loops(count):
+            mode = 'T' if loop['thumb'] else 'A'
+            lines.append(f"{loop['start']:08X}-{loop['end']:08X} {mode} "
+                         f"x{loop['iterations']} {loop['cycles']} ciclos "
+                         f"{100 * loop['cycles'] / total:.1f}%")
+            for block in loop['blocks']:
+                lines.extend("    " + line for line in self.disassemble_block(block))
+        
+        return "\n".join(lines)
+    
+    def to_dict(self) -> dict:
+        """Resultados serializables (direcciones en hexadecimal)"""
+        return {
+            'total_cycles': self.total_cycles(),
+            'regions': {name: {'instructions': instructions, 'cycles': cycles}
+                        for name, (instructions, cycles) in self.by_region().items()},
+            'pcs': {f"{pc:08X}": {'instructions': instructions, 'cycles': cycles}
+                    for pc, (instructions, cycles) in sorted(self.pcs.items())},
+            'blocks': {f"{pc:08X}{'T' if thumb else 'A'}": {
+                           'executions': executions,
+                           'instructions': instructions,
+                           'cycles': cycles,
+                       }
+                       for (pc, thumb), (_, executions, instructions, cycles)
+                       in sorted(self.blocks.items())},
+            'loops': [{
+                          'start': f"{loop['start']:08X}",
+                          'end': f"{loop['end']:08X}",
+                          'thumb': loop['thumb'],
+                          'iterations': loop['iterations'],
+                          'instructions': loop['instructions'],
+                          'cycles': loop['cycles'],
+                      }
+                      for loop in self.hot_loops()],
+        }
+    
+    def dump_json(self, filepath: str) -> None:
+        """Guarda los resultados para comparar entre versiones del emulador"""
+        with open(filepath, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
@@ -3,7 +3,7 @@ Registros del ARM7TDMI
 Implementa el sistema de registros bankeados y el CPSR/SPSR
 """
 from enum import IntEnum
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 
 
 class CPUMode(IntEnum):
@@ -57,6 +57,54 @@ class PSRFlags:
     CONTROL_MASK = I_MASK | F_MASK | T_MASK | MODE_MASK
 
 
+def _build_condition_table() -> List[bool]:
+    """
+    Precalcula el resultado de las 16 condiciones para los 16 valores de NZCV
+    
+    Índice: (cond << 4) | (N << 3) | (Z << 2) | (C << 1) | V
+    """
+    table = []
+    for cond in range(16):
+        for nzcv in range(16):
+            n = bool(nzcv & 8)
+            z = bool(nzcv & 4)
+            c = bool(nzcv & 2)
+            v = bool(nzcv & 1)
+            
+            conditions = {
+                0x0: z,                    # EQ - Equal
+                0x1: not z,                # NE - Not Equal
+                0x2: c,                    # CS/HS - Carry Set
+                0x3: not c,                # CC/LO - Carry Clear
+                0x4: n,                    # MI - Minus/Negative
+                0x5: not n,                # PL - Plus/Positive
+                0x6: v,                    # VS - Overflow Set
+                0x7: not v,                # VC - Overflow Clear
+                0x8: c and not z,          # HI - Unsigned Higher
+                0x9: not c or z,           # LS - Unsigned Lower or Same
+                0xA: n == v,               # GE - Signed Greater or Equal
+                0xB: n != v,               # LT - Signed Less Than
+                0xC: not z and (n == v),   # GT - Signed Greater Than
+                0xD: z or (n != v),        # LE - Signed Less or Equal
+                0xE: True,                 # AL - Always
+                0xF: True,                 # NV - Never (reserved, treat as always)
+            }
+            table.append(conditions[cond])
+    return table
+
+
+CONDITION_TABLE = _build_condition_table()
+
+
+def register_list(mask: int) -> Tuple[int, ...]:
+    """Índices de los registros presentes en una lista de LDM/STM/PUSH/POP"""
+    return tuple(i for i in range(16) if mask & (1 << i))
+
+
+# Listas de 8 bits (THUMB) precalculadas
+REGISTER_LISTS = [register_list(mask) for mask in range(256)]
+
+
 class CPURegisters:
     """
     Sistema de registros del ARM7TDMI
@@ -68,17 +116,19 @@ class CPURegisters:
     """
     
     def __init__(self):
-        # Registros no bankeados (R0-R7, compartidos por todos los modos)
-        self._regs_common = [0] * 8  # R0-R7
+        # Registros activos R0-R15 del modo actual
+        # Los bancos se intercambian solo al cambiar de modo, así que
+        # leer o escribir un registro es un simple acceso por índice
+        self._regs = [0] * 16
         
-        # Registros bankeados R8-R12 (User/System vs FIQ)
+        # Copias de R8-R12 del banco inactivo (User/System vs FIQ)
         self._r8_r12_usr = [0] * 5   # R8-R12 para User/System/IRQ/SVC/ABT/UND
         self._r8_r12_fiq = [0] * 5   # R8-R12 para FIQ
         
-        # Registros bankeados R13 (SP) y R14 (LR) por modo
+        # Copias de R13 (SP) y R14 (LR) por modo
+        # El valor del modo actual vive en _regs; System usa el banco de User
         self._r13_bank = {
             CPUMode.USER:       0,
-            CPUMode.SYSTEM:     0,  # Comparte con USER
             CPUMode.FIQ:        0,
             CPUMode.IRQ:        0,
             CPUMode.SUPERVISOR: 0,
@@ -88,7 +138,6 @@ class CPURegisters:
         
         self._r14_bank = {
             CPUMode.USER:       0,
-            CPUMode.SYSTEM:     0,  # Comparte con USER
             CPUMode.FIQ:        0,
             CPUMode.IRQ:        0,
             CPUMode.SUPERVISOR: 0,
@@ -96,11 +145,14 @@ class CPURegisters:
             CPUMode.UNDEFINED:  0,
         }
         
-        # R15 (PC) - compartido
-        self._r15 = 0
-        
         # Program Status Registers
+        # _cpsr guarda solo los bits de control; los flags de condición
+        # viven como atributos separados y se combinan al leer cpsr
         self._cpsr = CPUMode.SYSTEM | PSRFlags.I_MASK | PSRFlags.F_MASK
+        self.flag_n = False
+        self.flag_z = False
+        self.flag_c = False
+        self.flag_v = False
         
         self._spsr = {
             CPUMode.FIQ:        0,
@@ -112,9 +164,9 @@ class CPURegisters:
         
     def reset(self) -> None:
         """Reinicia todos los registros al estado inicial"""
-        # Limpiar registros comunes
-        for i in range(8):
-            self._regs_common[i] = 0
+        # Limpiar registros activos (la lista se reutiliza, no se reemplaza)
+        for i in range(16):
+            self._regs[i] = 0
             
         # Limpiar registros bankeados R8-R12
         for i in range(5):
@@ -131,16 +183,20 @@ class CPURegisters:
             self._spsr[mode] = 0
             
         # Estado inicial del GBA
-        self._r15 = 0x08000000  # PC apunta al inicio de la ROM
+        self._regs[15] = 0x08000000  # PC apunta al inicio de la ROM
         
         # CPSR: Modo System, IRQ y FIQ deshabilitados, modo ARM
         self._cpsr = CPUMode.SYSTEM | PSRFlags.I_MASK | PSRFlags.F_MASK
+        self.flag_n = False
+        self.flag_z = False
+        self.flag_c = False
+        self.flag_v = False
         
         # Configurar stack pointers iniciales (valores típicos del BIOS)
-        self._r13_bank[CPUMode.USER] = 0x03007F00
-        self._r13_bank[CPUMode.SYSTEM] = 0x03007F00
         self._r13_bank[CPUMode.IRQ] = 0x03007FA0
         self._r13_bank[CPUMode.SUPERVISOR] = 0x03007FE0
+        self._r13_bank[CPUMode.USER] = 0x03007F00
+        self._regs[13] = 0x03007F00  # System (activo) comparte con User
         
     @property
     def mode(self) -> int:
@@ -151,16 +207,46 @@ class CPURegisters:
     def mode(self, new_mode: int) -> None:
         """Cambia el modo de la CPU"""
         if CPUMode.is_valid(new_mode):
+            self._swap_banks(self._cpsr & PSRFlags.MODE_MASK, new_mode)
             self._cpsr = (self._cpsr & ~PSRFlags.MODE_MASK) | new_mode
         else:
             raise ValueError(f"Modo inválido: {new_mode:#x}")
     
     def _get_sp_lr_bank_key(self, mode: int) -> int:
         """Obtiene la clave del banco para SP/LR"""
-        # System y User comparten registros
-        if mode == CPUMode.SYSTEM:
-            return CPUMode.USER
-        return mode
+        # System (y cualquier modo inválido) comparte registros con User
+        if mode in self._r13_bank:
+            return mode
+        return CPUMode.USER
+    
+    def _swap_banks(self, old_mode: int, new_mode: int) -> None:
+        """
+        Intercambia los registros bankeados al pasar de un modo a otro
+        
+        Guarda R8-R14 activos en el banco del modo saliente y carga
+        los del modo entrante.
+        """
+        if old_mode == new_mode:
+            return
+        
+        regs = self._regs
+        
+        old_key = self._get_sp_lr_bank_key(old_mode)
+        new_key = self._get_sp_lr_bank_key(new_mode)
+        if old_key != new_key:
+            self._r13_bank[old_key] = regs[13]
+            self._r14_bank[old_key] = regs[14]
+            regs[13] = self._r13_bank[new_key]
+            regs[14] = self._r14_bank[new_key]
+        
+        old_fiq = old_mode == CPUMode.FIQ
+        if old_fiq != (new_mode == CPUMode.FIQ):
+            if old_fiq:
+                self._r8_r12_fiq[:] = regs[8:13]
+                regs[8:13] = self._r8_r12_usr
+            else:
+                self._r8_r12_usr[:] = regs[8:13]
+                regs[8:13] = self._r8_r12_fiq
     
     def get(self, reg: int) -> int:
         """
@@ -172,33 +258,7 @@ class CPURegisters:
         Returns:
             Valor del registro (32 bits)
         """
-        if reg < 0 or reg > 15:
-            raise ValueError(f"Registro inválido: {reg}")
-            
-        # R0-R7: Siempre los mismos
-        if reg < 8:
-            return self._regs_common[reg]
-            
-        # R8-R12: Bankeados solo en FIQ
-        elif reg < 13:
-            if self.mode == CPUMode.FIQ:
-                return self._r8_r12_fiq[reg - 8]
-            else:
-                return self._r8_r12_usr[reg - 8]
-                
-        # R13 (SP): Bankeado por modo
-        elif reg == 13:
-            key = self._get_sp_lr_bank_key(self.mode)
-            return self._r13_bank.get(key, self._r13_bank[CPUMode.USER])
-            
-        # R14 (LR): Bankeado por modo
-        elif reg == 14:
-            key = self._get_sp_lr_bank_key(self.mode)
-            return self._r14_bank.get(key, self._r14_bank[CPUMode.USER])
-            
-        # R15 (PC)
-        else:
-            return self._r15
+        return self._regs[reg]
     
     def set(self, reg: int, value: int) -> None:
         """
@@ -208,46 +268,21 @@ class CPURegisters:
             reg: Número de registro (0-15)
             value: Valor a escribir (se trunca a 32 bits)
         """
-        value &= 0xFFFFFFFF
-        
-        if reg < 0 or reg > 15:
-            raise ValueError(f"Registro inválido: {reg}")
-            
-        # R0-R7
-        if reg < 8:
-            self._regs_common[reg] = value
-            
-        # R8-R12
-        elif reg < 13:
-            if self.mode == CPUMode.FIQ:
-                self._r8_r12_fiq[reg - 8] = value
-            else:
-                self._r8_r12_usr[reg - 8] = value
-                
-        # R13 (SP)
-        elif reg == 13:
-            key = self._get_sp_lr_bank_key(self.mode)
-            self._r13_bank[key] = value
-            
-        # R14 (LR)
-        elif reg == 14:
-            key = self._get_sp_lr_bank_key(self.mode)
-            self._r14_bank[key] = value
-            
-        # R15 (PC)
-        else:
+        if reg == 15:
             # Alinear PC según modo ARM/Thumb
-            if self.thumb_mode:
-                self._r15 = value & ~1
+            if self._cpsr & PSRFlags.T_MASK:
+                self._regs[15] = value & 0xFFFFFFFE
             else:
-                self._r15 = value & ~3
+                self._regs[15] = value & 0xFFFFFFFC
+        else:
+            self._regs[reg] = value & 0xFFFFFFFF
     
     # ===== Propiedades de acceso rápido =====
     
     @property
     def pc(self) -> int:
         """Program Counter (R15)"""
-        return self._r15
+        return self._regs[15]
     
     @pc.setter
     def pc(self, value: int) -> None:
@@ -256,31 +291,41 @@ class CPURegisters:
     @property
     def sp(self) -> int:
         """Stack Pointer (R13)"""
-        return self.get(13)
+        return self._regs[13]
     
     @sp.setter
     def sp(self, value: int) -> None:
-        self.set(13, value)
+        self._regs[13] = value & 0xFFFFFFFF
     
     @property
     def lr(self) -> int:
         """Link Register (R14)"""
-        return self.get(14)
+        return self._regs[14]
     
     @lr.setter
     def lr(self, value: int) -> None:
-        self.set(14, value)
+        self._regs[14] = value & 0xFFFFFFFF
     
     # ===== CPSR/SPSR =====
     
     @property
     def cpsr(self) -> int:
-        """Current Program Status Register"""
-        return self._cpsr
+        """Current Program Status Register (flags materializados)"""
+        return (self._cpsr |
+                (PSRFlags.N_MASK if self.flag_n else 0) |
+                (PSRFlags.Z_MASK if self.flag_z else 0) |
+                (PSRFlags.C_MASK if self.flag_c else 0) |
+                (PSRFlags.V_MASK if self.flag_v else 0))
     
     @cpsr.setter
     def cpsr(self, value: int) -> None:
-        self._cpsr = value & 0xFFFFFFFF
+        value &= 0xFFFFFFFF
+        self._swap_banks(self._cpsr & PSRFlags.MODE_MASK, value & PSRFlags.MODE_MASK)
+        self._cpsr = value & ~PSRFlags.FLAGS_MASK
+        self.flag_n = bool(value & PSRFlags.N_MASK)
+        self.flag_z = bool(value & PSRFlags.Z_MASK)
+        self.flag_c = bool(value & PSRFlags.C_MASK)
+        self.flag_v = bool(value & PSRFlags.V_MASK)
     
     @property
     def spsr(self) -> int:
@@ -288,7 +333,7 @@ class CPURegisters:
         mode = self.mode
         if mode in self._spsr:
             return self._spsr[mode]
-        return self._cpsr  # User/System no tienen SPSR
+        return self.cpsr  # User/System no tienen SPSR
     
     @spsr.setter
     def spsr(self, value: int) -> None:
@@ -296,56 +341,6 @@ class CPURegisters:
         if mode in self._spsr:
             self._spsr[mode] = value & 0xFFFFFFFF
     
-    # ===== Flags de condición =====
-    
-    @property
-    def flag_n(self) -> bool:
-        """Flag Negative"""
-        return bool(self._cpsr & PSRFlags.N_MASK)
-    
-    @flag_n.setter
-    def flag_n(self, value: bool) -> None:
-        if value:
-            self._cpsr |= PSRFlags.N_MASK
-        else:
-            self._cpsr &= ~PSRFlags.N_MASK
-    
-    @property
-    def flag_z(self) -> bool:
-        """Flag Zero"""
-        return bool(self._cpsr & PSRFlags.Z_MASK)
-    
-    @flag_z.setter
-    def flag_z(self, value: bool) -> None:
-        if value:
-            self._cpsr |= PSRFlags.Z_MASK
-        else:
-            self._cpsr &= ~PSRFlags.Z_MASK
-    
-    @property
-    def flag_c(self) -> bool:
-        """Flag Carry"""
-        return bool(self._cpsr & PSRFlags.C_MASK)
-    
-    @flag_c.setter
-    def flag_c(self, value: bool) -> None:
-        if value:
-            self._cpsr |= PSRFlags.C_MASK
-        else:
-            self._cpsr &= ~PSRFlags.C_MASK
-    
-    @property
-    def flag_v(self) -> bool:
-        """Flag Overflow"""
-        return bool(self._cpsr & PSRFlags.V_MASK)
-    
-    @flag_v.setter
-    def flag_v(self, value: bool) -> None:
-        if value:
-            self._cpsr |= PSRFlags.V_MASK
-        else:
-            self._cpsr &= ~PSRFlags.V_MASK
-    
     # ===== Bits de control =====
     
     @property
@@ -394,7 +389,8 @@ class CPURegisters:
     
     def set_flags_nzcv(self, result: int, carry: bool, overflow: bool) -> None:
         """Establece todos los flags de condición"""
-        self.set_flags_nz(result)
+        self.flag_n = bool(result & 0x80000000)
+        self.flag_z = (result & 0xFFFFFFFF) == 0
         self.flag_c = carry
         self.flag_v = overflow
     
@@ -408,31 +404,8 @@ class CPURegisters:
         Returns:
             True si la condición se cumple
         """
-        n = self.flag_n
-        z = self.flag_z
-        c = self.flag_c
-        v = self.flag_v
-        
-        conditions = {
-            0x0: z,                    # EQ - Equal
-            0x1: not z,                # NE - Not Equal
-            0x2: c,                    # CS/HS - Carry Set
-            0x3: not c,                # CC/LO - Carry Clear
-            0x4: n,                    # MI - Minus/Negative
-            0x5: not n,                # PL - Plus/Positive
-            0x6: v,                    # VS - Overflow Set
-            0x7: not v,                # VC - Overflow Clear
-            0x8: c and not z,          # HI - Unsigned Higher
-            0x9: not c or z,           # LS - Unsigned Lower or Same
-            0xA: n == v,               # GE - Signed Greater or Equal
-            0xB: n != v,               # LT - Signed Less Than
-            0xC: not z and (n == v),   # GT - Signed Greater Than
-            0xD: z or (n != v),        # LE - Signed Less or Equal
-            0xE: True,                 # AL - Always
-            0xF: True,                 # NV - Never (reserved, treat as always)
-        }
-        
-        return conditions.get(cond, True)
+        nzcv = (self.flag_n << 3) | (self.flag_z << 2) | (self.flag_c << 1) | self.flag_v
+        return CONDITION_TABLE[(cond << 4) | nzcv]
     
     def switch_mode(self, new_mode: int, save_cpsr: bool = True) -> None:
         """
@@ -446,14 +419,15 @@ class CPURegisters:
             return
             
         if save_cpsr and CPUMode.has_spsr(new_mode):
-            self._spsr[new_mode] = self._cpsr
+            self._spsr[new_mode] = self.cpsr
             
         self.mode = new_mode
     
     def restore_cpsr_from_spsr(self) -> None:
         """Restaura CPSR desde SPSR (para retorno de excepciones)"""
-        if CPUMode.has_spsr(self.mode):
-            self._cpsr = self._spsr[self.mode]
+        mode = self.mode
+        if mode in self._spsr:
+            self.cpsr = self._spsr[mode]
     
     def __str__(self) -> str:
         """Representación legible de los registros"""
@@ -470,7 +444,7 @@ class CPURegisters:
         lines = []
         lines.append(f"Mode: {mode_names.get(self.mode, 'UNK')} | " +
                     f"{'THUMB' if self.thumb_mode else 'ARM'}")
-        lines.append(f"CPSR: {self._cpsr:08X} | " +
+        lines.append(f"CPSR: {self.cpsr:08X} | " +
                     f"N={int(self.flag_n)} Z={int(self.flag_z)} " +
                     f"C={int(self.flag_c)} V={int(self.flag_v)} | " +
                     f"I={int(self.irq_disabled)} F={int(self.fiq_disabled)}")
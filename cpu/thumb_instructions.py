@@ -2,7 +2,9 @@
 Instrucciones THUMB (16-bit) para el ARM7TDMI
 Implementa el set completo de instrucciones THUMB
 """
-from typing import TYPE_CHECKING, Tuple
+from typing import TYPE_CHECKING, Callable, List, Tuple
+
+from .registers import REGISTER_LISTS
 
 if TYPE_CHECKING:
     from .arm7tdmi import ARM7TDMI
@@ -20,6 +22,20 @@ class ThumbInstructions:
         self.cpu = cpu
         self.reg = cpu.registers
         self.mem = cpu.memory
+        
+        # Handlers especializados por operación
+        self._format1_ops = [self._format1_lsl, self._format1_lsr, self._format1_asr]
+        self._format3_ops = [self._format3_mov, self._format3_cmp,
+                             self._format3_add, self._format3_sub]
+        self._format4_ops = [
+            self._format4_and, self._format4_eor, self._format4_lsl, self._format4_lsr,
+            self._format4_asr, self._format4_adc, self._format4_sbc, self._format4_ror,
+            self._format4_tst, self._format4_neg, self._format4_cmp, self._format4_cmn,
+            self._format4_orr, self._format4_mul, self._format4_bic, self._format4_mvn,
+        ]
+        
+        # Tabla de despacho precalculada (10 bits superiores)
+        self._decode_table = self._build_decode_table()
     
     # ===== Utilidades =====
     
@@ -74,131 +90,152 @@ class ThumbInstructions:
         Returns:
             Ciclos consumidos
         """
-        # Decodificar según los bits superiores
+        return self._decode_table[instruction >> 6](instruction)
+    
+    def _build_decode_table(self) -> List[Callable[[int], int]]:
+        """
+        Construye la tabla de 1024 entradas indexada por los 10 bits superiores
         
+        Los formatos 1, 3 y 4 se resuelven a un handler por operación para
+        que el handler no tenga que volver a decodificar el opcode.
+        """
+        return [self._decode(index << 6) for index in range(1024)]
+    
+    def _decode(self, instruction: int) -> Callable[[int], int]:
+        """Resuelve el handler para una instrucción representativa"""
         # Format 1: Move shifted register (000xx)
         if (instruction >> 13) == 0b000:
             op = (instruction >> 11) & 0x3
             if op != 0b11:  # No es Format 2
-                return self._format1_shift(instruction)
+                return self._format1_ops[op]
             else:
-                return self._format2_add_sub(instruction)
+                return self._format2_add_sub
         
         # Format 3: Move/Compare/Add/Sub immediate (001xx)
         if (instruction >> 13) == 0b001:
-            return self._format3_immediate(instruction)
+            return self._format3_ops[(instruction >> 11) & 0x3]
         
         # Format 4: ALU operations (010000)
         if (instruction >> 10) == 0b010000:
-            return self._format4_alu(instruction)
+            return self._format4_ops[(instruction >> 6) & 0xF]
         
         # Format 5: Hi register / BX (010001)
         if (instruction >> 10) == 0b010001:
-            return self._format5_hireg_bx(instruction)
+            return self._format5_hireg_bx
         
         # Format 6: PC-relative load (01001)
         if (instruction >> 11) == 0b01001:
-            return self._format6_pc_load(instruction)
+            return self._format6_pc_load
         
         # Format 7: Load/Store register offset (0101xx0)
         if (instruction >> 12) == 0b0101 and not (instruction & (1 << 9)):
-            return self._format7_load_store_reg(instruction)
+            return self._format7_load_store_reg
         
         # Format 8: Load/Store sign-extended (0101xx1)
         if (instruction >> 12) == 0b0101 and (instruction & (1 << 9)):
-            return self._format8_load_store_signed(instruction)
+            return self._format8_load_store_signed
         
         # Format 9: Load/Store immediate offset (011xx)
         if (instruction >> 13) == 0b011:
-            return self._format9_load_store_imm(instruction)
+            return self._format9_load_store_imm
         
         # Format 10: Load/Store halfword (1000x)
         if (instruction >> 12) == 0b1000:
-            return self._format10_load_store_half(instruction)
+            return self._format10_load_store_half
         
         # Format 11: SP-relative load/store (1001x)
         if (instruction >> 12) == 0b1001:
-            return self._format11_sp_relative(instruction)
+            return self._format11_sp_relative
         
         # Format 12: Load address (1010x)
         if (instruction >> 12) == 0b1010:
-            return self._format12_load_address(instruction)
+            return self._format12_load_address
         
         # Format 13: Add offset to SP (10110000)
         if (instruction >> 8) == 0b10110000:
-            return self._format13_sp_offset(instruction)
+            return self._format13_sp_offset
         
         # Format 14: Push/Pop (1011x10x)
         if (instruction >> 12) == 0b1011 and ((instruction >> 9) & 0x3) == 0b10:
-            return self._format14_push_pop(instruction)
+            return self._format14_push_pop
         
         # Format 15: Multiple load/store (1100x)
         if (instruction >> 12) == 0b1100:
-            return self._format15_multiple(instruction)
+            return self._format15_multiple
         
         # Format 16: Conditional branch (1101xxxx) excepto 1101111x
         if (instruction >> 12) == 0b1101:
             cond = (instruction >> 8) & 0xF
             if cond < 0xE:
-                return self._format16_cond_branch(instruction)
+                return self._format16_cond_branch
             elif cond == 0xF:
-                return self._format17_swi(instruction)
+                return self._format17_swi
         
         # Format 18: Unconditional branch (11100)
         if (instruction >> 11) == 0b11100:
-            return self._format18_branch(instruction)
+            return self._format18_branch
         
         # Format 19: Long branch with link (1111x)
         if (instruction >> 12) == 0b1111:
-            return self._format19_long_branch(instruction)
+            return self._format19_long_branch
         
-        # Instrucción no reconocida
+        return self._undefined
+    
+    def _undefined(self, instruction: int) -> int:
+        """Instrucción no reconocida"""
+        self.cpu.undefined_instruction(instruction)
         return 1
     
     # ===== Format 1: Move Shifted Register =====
     
-    def _format1_shift(self, instruction: int) -> int:
-        """LSL, LSR, ASR con offset inmediato"""
-        op = (instruction >> 11) & 0x3
+    def _format1_lsl(self, instruction: int) -> int:
+        """LSL Rd, Rs, #offset"""
         offset = (instruction >> 6) & 0x1F
-        rs = (instruction >> 3) & 0x7
-        rd = instruction & 0x7
+        rs_value = self.reg.get((instruction >> 3) & 0x7)
         
-        rs_value = self.reg.get(rs)
-        carry = self.reg.flag_c
+        if offset == 0:
+            result = rs_value
+            carry = self.reg.flag_c
+        else:
+            carry = bool((rs_value >> (32 - offset)) & 1)
+            result = (rs_value << offset) & 0xFFFFFFFF
         
-        if op == 0b00:  # LSL
-            if offset == 0:
-                result = rs_value
-            else:
-                carry = bool((rs_value >> (32 - offset)) & 1)
-                result = (rs_value << offset) & 0xFFFFFFFF
-                
-        elif op == 0b01:  # LSR
-            if offset == 0:
-                offset = 32
-            if offset == 32:
-                carry = bool(rs_value >> 31)
-                result = 0
-            else:
-                carry = bool((rs_value >> (offset - 1)) & 1)
-                result = rs_value >> offset
-                
-        else:  # ASR (op == 0b10)
-            if offset == 0:
-                offset = 32
-            if offset >= 32:
-                carry = bool(rs_value >> 31)
-                result = 0xFFFFFFFF if carry else 0
-            else:
-                carry = bool((rs_value >> (offset - 1)) & 1)
-                result = rs_value >> offset
-                if rs_value & 0x80000000:
-                    result |= (0xFFFFFFFF << (32 - offset)) & 0xFFFFFFFF
+        self.reg.set(instruction & 0x7, result)
+        self._set_nzc(result, carry)
+        return 1
+    
+    def _format1_lsr(self, instruction: int) -> int:
+        """LSR Rd, Rs, #offset (offset 0 = 32)"""
+        offset = (instruction >> 6) & 0x1F
+        rs_value = self.reg.get((instruction >> 3) & 0x7)
         
-        self.reg.set(rd, result)
+        if offset == 0:
+            carry = bool(rs_value >> 31)
+            result = 0
+        else:
+            carry = bool((rs_value >> (offset - 1)) & 1)
+            result = rs_value >> offset
+        
+        self.reg.set(instruction & 0x7, result)
         self._set_nzc(result, carry)
+        return 1
+    
+    def _format1_asr(self, instruction: int) -> int:
+        """ASR Rd, Rs, #offset (offset 0 = 32)"""
+        offset = (instruction >> 6) & 0x1F
+        rs_value = self.reg.get((instruction >> 3) & 0x7)
+        
+        if offset == 0:
+            carry = bool(rs_value >> 31)
+            result = 0xFFFFFFFF if carry else 0
+        else:
+            carry = bool((rs_value >> (offset - 1)) & 1)
+            result = rs_value >> offset
+            if rs_value & 0x80000000:
+                result |= (0xFFFFFFFF << (32 - offset)) & 0xFFFFFFFF
         
+        self.reg.set(instruction & 0x7, result)
+        self._set_nzc(result, carry)
         return 1
     
     # ===== Format 2: Add/Subtract =====
@@ -226,177 +263,219 @@ class ThumbInstructions:
     
     # ===== Format 3: Move/Compare/Add/Sub Immediate =====
     
-    def _format3_immediate(self, instruction: int) -> int:
-        """MOV, CMP, ADD, SUB con inmediato de 8 bits"""
-        op = (instruction >> 11) & 0x3
+    def _format3_mov(self, instruction: int) -> int:
+        """MOV Rd, #imm"""
+        result = instruction & 0xFF
+        self.reg.set((instruction >> 8) & 0x7, result)
+        self._set_nz(result)
+        return 1
+    
+    def _format3_cmp(self, instruction: int) -> int:
+        """CMP Rd, #imm"""
+        rd_value = self.reg.get((instruction >> 8) & 0x7)
+        result, carry, overflow = self._alu_sub(rd_value, instruction & 0xFF)
+        self._set_nzcv(result, carry, overflow)
+        return 1
+    
+    def _format3_add(self, instruction: int) -> int:
+        """ADD Rd, #imm"""
         rd = (instruction >> 8) & 0x7
-        imm = instruction & 0xFF
-        
-        rd_value = self.reg.get(rd)
-        
-        if op == 0b00:  # MOV
-            result = imm
-            self.reg.set(rd, result)
-            self._set_nz(result)
-            
-        elif op == 0b01:  # CMP
-            result, carry, overflow = self._alu_sub(rd_value, imm)
-            self._set_nzcv(result, carry, overflow)
-            
-        elif op == 0b10:  # ADD
-            result, carry, overflow = self._alu_add(rd_value, imm)
-            self.reg.set(rd, result)
-            self._set_nzcv(result, carry, overflow)
-            
-        else:  # SUB
-            result, carry, overflow = self._alu_sub(rd_value, imm)
-            self.reg.set(rd, result)
-            self._set_nzcv(result, carry, overflow)
-        
+        result, carry, overflow = self._alu_add(self.reg.get(rd), instruction & 0xFF)
+        self.reg.set(rd, result)
+        self._set_nzcv(result, carry, overflow)
+        return 1
+    
+    def _format3_sub(self, instruction: int) -> int:
+        """SUB Rd, #imm"""
+        rd = (instruction >> 8) & 0x7
+        result, carry, overflow = self._alu_sub(self.reg.get(rd), instruction & 0xFF)
+        self.reg.set(rd, result)
+        self._set_nzcv(result, carry, overflow)
         return 1
     
     # ===== Format 4: ALU Operations =====
     
-    def _format4_alu(self, instruction: int) -> int:
-        """Operaciones ALU entre registros bajos"""
-        op = (instruction >> 6) & 0xF
-        rs = (instruction >> 3) & 0x7
+    def _format4_and(self, instruction: int) -> int:
+        """AND Rd, Rs"""
+        rd = instruction & 0x7
+        result = self.reg.get(rd) & self.reg.get((instruction >> 3) & 0x7)
+        self._set_nz(result)
+        self.reg.set(rd, result)
+        return 1
+    
+    def _format4_eor(self, instruction: int) -> int:
+        """EOR Rd, Rs"""
+        rd = instruction & 0x7
+        result = self.reg.get(rd) ^ self.reg.get((instruction >> 3) & 0x7)
+        self._set_nz(result)
+        self.reg.set(rd, result)
+        return 1
+    
+    def _format4_lsl(self, instruction: int) -> int:
+        """LSL Rd, Rs"""
         rd = instruction & 0x7
-        
         rd_value = self.reg.get(rd)
-        rs_value = self.reg.get(rs)
+        shift = self.reg.get((instruction >> 3) & 0x7) & 0xFF
+        
+        if shift == 0:
+            carry = self.reg.flag_c
+            result = rd_value
+        elif shift < 32:
+            carry = bool((rd_value >> (32 - shift)) & 1)
+            result = (rd_value << shift) & 0xFFFFFFFF
+        elif shift == 32:
+            carry = bool(rd_value & 1)
+            result = 0
+        else:
+            carry = False
+            result = 0
+        self._set_nzc(result, carry)
+        self.reg.set(rd, result)
+        return 2
+    
+    def _format4_lsr(self, instruction: int) -> int:
+        """LSR Rd, Rs"""
+        rd = instruction & 0x7
+        rd_value = self.reg.get(rd)
+        shift = self.reg.get((instruction >> 3) & 0x7) & 0xFF
+        
+        if shift == 0:
+            carry = self.reg.flag_c
+            result = rd_value
+        elif shift < 32:
+            carry = bool((rd_value >> (shift - 1)) & 1)
+            result = rd_value >> shift
+        elif shift == 32:
+            carry = bool(rd_value >> 31)
+            result = 0
+        else:
+            carry = False
+            result = 0
+        self._set_nzc(result, carry)
+        self.reg.set(rd, result)
+        return 2
+    
+    def _format4_asr(self, instruction: int) -> int:
+        """ASR Rd, Rs"""
+        rd = instruction & 0x7
+        rd_value = self.reg.get(rd)
+        shift = self.reg.get((instruction >> 3) & 0x7) & 0xFF
+        sign = rd_value >> 31
+        
+        if shift == 0:
+            carry = self.reg.flag_c
+            result = rd_value
+        elif shift < 32:
+            carry = bool((rd_value >> (shift - 1)) & 1)
+            result = rd_value >> shift
+            if sign:
+                result |= (0xFFFFFFFF << (32 - shift)) & 0xFFFFFFFF
+        else:
+            carry = bool(sign)
+            result = 0xFFFFFFFF if sign else 0
+        self._set_nzc(result, carry)
+        self.reg.set(rd, result)
+        return 2
+    
+    def _format4_adc(self, instruction: int) -> int:
+        """ADC Rd, Rs"""
+        rd = instruction & 0x7
+        result, carry, overflow = self._alu_add(self.reg.get(rd),
+                                                self.reg.get((instruction >> 3) & 0x7),
+                                                self.reg.flag_c)
+        self._set_nzcv(result, carry, overflow)
+        self.reg.set(rd, result)
+        return 1
+    
+    def _format4_sbc(self, instruction: int) -> int:
+        """SBC Rd, Rs"""
+        rd = instruction & 0x7
+        result, carry, overflow = self._alu_sub(self.reg.get(rd),
+                                                self.reg.get((instruction >> 3) & 0x7),
+                                                self.reg.flag_c)
+        self._set_nzcv(result, carry, overflow)
+        self.reg.set(rd, result)
+        return 1
+    
+    def _format4_ror(self, instruction: int) -> int:
+        """ROR Rd, Rs"""
+        rd = instruction & 0x7
+        rd_value = self.reg.get(rd)
+        shift = self.reg.get((instruction >> 3) & 0x7) & 0xFF
         
         carry = self.reg.flag_c
-        overflow = self.reg.flag_v
-        cycles = 1
-        
-        if op == 0x0:  # AND
-            result = rd_value & rs_value
-            self._set_nz(result)
-            self.reg.set(rd, result)
-            
-        elif op == 0x1:  # EOR
-            result = rd_value ^ rs_value
-            self._set_nz(result)
-            self.reg.set(rd, result)
-            
-        elif op == 0x2:  # LSL
-            shift = rs_value & 0xFF
-            if shift == 0:
-                result = rd_value
-            elif shift < 32:
-                carry = bool((rd_value >> (32 - shift)) & 1)
-                result = (rd_value << shift) & 0xFFFFFFFF
-            elif shift == 32:
-                carry = bool(rd_value & 1)
-                result = 0
-            else:
-                carry = False
-                result = 0
-            self._set_nzc(result, carry)
-            self.reg.set(rd, result)
-            cycles = 2
-            
-        elif op == 0x3:  # LSR
-            shift = rs_value & 0xFF
+        if shift == 0:
+            result = rd_value
+        else:
+            shift &= 31
             if shift == 0:
-                result = rd_value
-            elif shift < 32:
-                carry = bool((rd_value >> (shift - 1)) & 1)
-                result = rd_value >> shift
-            elif shift == 32:
                 carry = bool(rd_value >> 31)
-                result = 0
-            else:
-                carry = False
-                result = 0
-            self._set_nzc(result, carry)
-            self.reg.set(rd, result)
-            cycles = 2
-            
-        elif op == 0x4:  # ASR
-            shift = rs_value & 0xFF
-            sign = rd_value >> 31
-            if shift == 0:
                 result = rd_value
-            elif shift < 32:
-                carry = bool((rd_value >> (shift - 1)) & 1)
-                result = rd_value >> shift
-                if sign:
-                    result |= (0xFFFFFFFF << (32 - shift)) & 0xFFFFFFFF
             else:
-                carry = bool(sign)
-                result = 0xFFFFFFFF if sign else 0
-            self._set_nzc(result, carry)
-            self.reg.set(rd, result)
-            cycles = 2
-            
-        elif op == 0x5:  # ADC
-            result, carry, overflow = self._alu_add(rd_value, rs_value, self.reg.flag_c)
-            self._set_nzcv(result, carry, overflow)
-            self.reg.set(rd, result)
-            
-        elif op == 0x6:  # SBC
-            result, carry, overflow = self._alu_sub(rd_value, rs_value, self.reg.flag_c)
-            self._set_nzcv(result, carry, overflow)
-            self.reg.set(rd, result)
-            
-        elif op == 0x7:  # ROR
-            shift = rs_value & 0xFF
-            if shift == 0:
-                result = rd_value
-            else:
-                shift &= 31
-                if shift == 0:
-                    carry = bool(rd_value >> 31)
-                    result = rd_value
-                else:
-                    carry = bool((rd_value >> (shift - 1)) & 1)
-                    result = ((rd_value >> shift) | (rd_value << (32 - shift))) & 0xFFFFFFFF
-            self._set_nzc(result, carry)
-            self.reg.set(rd, result)
-            cycles = 2
-            
-        elif op == 0x8:  # TST
-            result = rd_value & rs_value
-            self._set_nz(result)
-            
-        elif op == 0x9:  # NEG
-            result, carry, overflow = self._alu_sub(0, rs_value)
-            self._set_nzcv(result, carry, overflow)
-            self.reg.set(rd, result)
-            
-        elif op == 0xA:  # CMP
-            result, carry, overflow = self._alu_sub(rd_value, rs_value)
-            self._set_nzcv(result, carry, overflow)
-            
-        elif op == 0xB:  # CMN
-            result, carry, overflow = self._alu_add(rd_value, rs_value)
-            self._set_nzcv(result, carry, overflow)
-            
-        elif op == 0xC:  # ORR
-            result = rd_value | rs_value
-            self._set_nz(result)
-            self.reg.set(rd, result)
-            
-        elif op == 0xD:  # MUL
-            result = (rd_value * rs_value) & 0xFFFFFFFF
-            self._set_nz(result)
-            # C flag is destroyed (unpredictable)
-            self.reg.set(rd, result)
-            cycles = 2  # Variable en realidad
-            
-        elif op == 0xE:  # BIC
-            result = rd_value & ~rs_value
-            self._set_nz(result)
-            self.reg.set(rd, result)
-            
-        else:  # MVN (0xF)
-            result = ~rs_value & 0xFFFFFFFF
-            self._set_nz(result)
-            self.reg.set(rd, result)
-        
-        return cycles
+                carry = bool((rd_value >> (shift - 1)) & 1)
+                result = ((rd_value >> shift) | (rd_value << (32 - shift))) & 0xFFFFFFFF
+        self._set_nzc(result, carry)
+        self.reg.set(rd, result)
+        return 2
+    
+    def _format4_tst(self, instruction: int) -> int:
+        """TST Rd, Rs"""
+        result = self.reg.get(instruction & 0x7) & self.reg.get((instruction >> 3) & 0x7)
+        self._set_nz(result)
+        return 1
+    
+    def _format4_neg(self, instruction: int) -> int:
+        """NEG Rd, Rs"""
+        result, carry, overflow = self._alu_sub(0, self.reg.get((instruction >> 3) & 0x7))
+        self._set_nzcv(result, carry, overflow)
+        self.reg.set(instruction & 0x7, result)
+        return 1
+    
+    def _format4_cmp(self, instruction: int) -> int:
+        """CMP Rd, Rs"""
+        result, carry, overflow = self._alu_sub(self.reg.get(instruction & 0x7),
+                                                self.reg.get((instruction >> 3) & 0x7))
+        self._set_nzcv(result, carry, overflow)
+        return 1
+    
+    def _format4_cmn(self, instruction: int) -> int:
+        """CMN Rd, Rs"""
+        result, carry, overflow = self._alu_add(self.reg.get(instruction & 0x7),
+                                                self.reg.get((instruction >> 3) & 0x7))
+        self._set_nzcv(result, carry, overflow)
+        return 1
+    
+    def _format4_orr(self, instruction: int) -> int:
+        """ORR Rd, Rs"""
+        rd = instruction & 0x7
+        result = self.reg.get(rd) | self.reg.get((instruction >> 3) & 0x7)
+        self._set_nz(result)
+        self.reg.set(rd, result)
+        return 1
+    
+    def _format4_mul(self, instruction: int) -> int:
+        """MUL Rd, Rs"""
+        rd = instruction & 0x7
+        result = (self.reg.get(rd) * self.reg.get((instruction >> 3) & 0x7)) & 0xFFFFFFFF
+        self._set_nz(result)
+        # C flag is destroyed (unpredictable)
+        self.reg.set(rd, result)
+        return 2  # Variable en realidad
+    
+    def _format4_bic(self, instruction: int) -> int:
+        """BIC Rd, Rs"""
+        rd = instruction & 0x7
+        result = self.reg.get(rd) & ~self.reg.get((instruction >> 3) & 0x7)
+        self._set_nz(result)
+        self.reg.set(rd, result)
+        return 1
+    
+    def _format4_mvn(self, instruction: int) -> int:
+        """MVN Rd, Rs"""
+        result = ~self.reg.get((instruction >> 3) & 0x7) & 0xFFFFFFFF
+        self._set_nz(result)
+        self.reg.set(instruction & 0x7, result)
+        return 1
     
     # ===== Format 5: Hi Register / BX =====
     
@@ -647,47 +726,38 @@ class ThumbInstructions:
         """PUSH y POP"""
         load = bool(instruction & (1 << 11))
         pc_lr = bool(instruction & (1 << 8))
-        rlist = instruction & 0xFF
+        registers = REGISTER_LISTS[instruction & 0xFF]
         
-        # Contar registros
-        count = bin(rlist).count('1') + int(pc_lr)
-        
-        cycles = 2
+        count = len(registers) + pc_lr
+        regs = self.reg._regs
+        cycles = 2 + len(registers)
         
         if load:  # POP
-            address = self.reg.sp
-            
-            for i in range(8):
-                if rlist & (1 << i):
-                    value = self.mem.read_32(address)
-                    self.reg.set(i, value)
-                    address += 4
-                    cycles += 1
+            address = regs[13]
+            values = self.mem.read_block_32(address, count)
+            for i, value in zip(registers, values):
+                regs[i] = value
             
             if pc_lr:  # Pop PC
-                value = self.mem.read_32(address)
+                value = values[-1]
                 # En THUMB, bit 0 se usa para cambio de modo
                 self.reg.thumb_mode = bool(value & 1)
                 self.reg.pc = value & ~1
                 self.cpu.flush_pipeline()
-                address += 4
                 cycles += 2
             
-            self.reg.sp = address
+            regs[13] = (address + count * 4) & 0xFFFFFFFF
             
         else:  # PUSH
-            address = self.reg.sp - count * 4
-            self.reg.sp = address
-            
-            for i in range(8):
-                if rlist & (1 << i):
-                    self.mem.write_32(address, self.reg.get(i))
-                    address += 4
-                    cycles += 1
+            address = (regs[13] - count * 4) & 0xFFFFFFFF
+            regs[13] = address
             
+            values = [regs[i] for i in registers]
             if pc_lr:  # Push LR
-                self.mem.write_32(address, self.reg.lr)
+                values.append(regs[14])
                 cycles += 1
+            
+            self.mem.write_block_32(address, values)
         
         return cycles
     
@@ -698,29 +768,25 @@ class ThumbInstructions:
         load = bool(instruction & (1 << 11))
         rb = (instruction >> 8) & 0x7
         rlist = instruction & 0xFF
+        registers = REGISTER_LISTS[rlist]
         
-        address = self.reg.get(rb)
-        cycles = 2
+        regs = self.reg._regs
+        address = regs[rb]
         
         if load:
-            for i in range(8):
-                if rlist & (1 << i):
-                    value = self.mem.read_32(address)
-                    self.reg.set(i, value)
-                    address += 4
-                    cycles += 1
+            values = self.mem.read_block_32(address, len(registers))
+            for i, value in zip(registers, values):
+                regs[i] = value
         else:
-            for i in range(8):
-                if rlist & (1 << i):
-                    self.mem.write_32(address, self.reg.get(i))
-                    address += 4
-                    cycles += 1
+            self.mem.write_block_32(address, [regs[i] for i in registers])
+        
+        address += len(registers) * 4
         
         # Writeback siempre ocurre (excepto si Rb está en la lista en LDMIA)
         if not (load and (rlist & (1 << rb))):
             self.reg.set(rb, address)
         
-        return cycles
+        return 2 + len(registers)
     
     # ===== Format 16: Conditional Branch =====
 
@@ -755,9 +821,7 @@ class ThumbInstructions:
     
     def _format17_swi(self, instruction: int) -> int:
         """SWI"""
-        # comment = instruction & 0xFF  # Número del SWI
-        self.cpu.trigger_swi()
-        return 3
+        return self.cpu.handle_swi(instruction & 0xFF)
     
     # ===== Format 18: Unconditional Branch =====
 
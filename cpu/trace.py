@@ -0,0 +1,108 @@
+"""
+Trace de ejecución del ARM7TDMI
+Buffer circular con las últimas instrucciones ejecutadas
+"""
+from array import array
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from .registers import PSRFlags
+
+if TYPE_CHECKING:
+    from .disassembler import Disassembler
+
+# Registros guardados por defecto (bloques o instrucciones sueltas)
+TRACE_SIZE = 4096
+
+
+class TraceBuffer:
+    """
+    Buffer circular preasignado del trace de ejecución
+    
+    Cada registro es un bloque ejecutado (referencia al bloque, cuántas de
+    sus instrucciones corrieron y CPSR de entrada) o una instrucción suelta
+    de step() (PC y opcode). Registrar cuesta tres asignaciones sin crear
+    objetos; los PCs y opcodes de los bloques se expanden solo al volcar,
+    a partir de los arrays precalculados del propio bloque.
+    """
+    
+    def __init__(self, size: int = TRACE_SIZE):
+        self.size = size
+        self.blocks: List[Optional[object]] = [None] * size
+        # Bloques: instrucciones ejecutadas; sueltas: PC
+        self.counts = array('I', bytes(4 * size))
+        # Sueltas: opcode (los bloques guardan los suyos)
+        self.opcodes = array('I', bytes(4 * size))
+        self.cpsrs = array('I', bytes(4 * size))
+        
+        # Próxima posición a escribir y total de registros
+        self.position = 0
+        self.total = 0
+    
+    def clear(self) -> None:
+        self.blocks = [None] * self.size
+        self.position = 0
+        self.total = 0
+    
+    def record(self, pc: int, opcode: int, cpsr: int) -> None:
+        """Registra una instrucción suelta"""
+        position = self.position
+        self.blocks[position] = None
+        self.counts[position] = pc
+        self.opcodes[position] = opcode
+        self.cpsrs[position] = cpsr
+        self.position = (position + 1) % self.size
+        self.total += 1
+    
+    def record_block(self, block, count: int, cpsr: int) -> None:
+        """Registra las primeras `count` instrucciones de un bloque"""
+        position = self.position
+        self.blocks[position] = block
+        self.counts[position] = count
+        self.cpsrs[position] = cpsr
+        self.position = (position + 1) % self.size
+        self.total += 1
+    
+    def set_last_count(self, count: int) -> None:
+        """Corrige cuántas instrucciones corrieron del último bloque registrado"""
+        self.counts[(self.position - 1) % self.size] = count
+    
+    def entries(self) -> List[Tuple[int, int, int]]:
+        """(PC, opcode, CPSR) registrados, del más antiguo al más reciente"""
+        size = self.size
+        records = min(self.total, size)
+        start = (self.position - records) % size
+        
+        entries = []
+        for i in range(records):
+            index = (start + i) % size
+            block = self.blocks[index]
+            cpsr = self.cpsrs[index]
+            if block is None:
+                entries.append((self.counts[index], self.opcodes[index], cpsr))
+            else:
+                count = self.counts[index]
+                entries.extend(zip(block.pcs[:count], block.opcodes[:count],
+                                   [cpsr] * count))
+        return entries
+    
+    def dump(self, count: int = 0, disassembler: Optional['Disassembler'] = None) -> str:
+        """
+        Listado de las últimas `count` instrucciones (todas si es 0)
+        
+        Con un desensamblador se añade el texto de cada instrucción.
+        """
+        entries = self.entries()
+        if count:
+            entries = entries[-count:]
+        
+        lines = []
+        for pc, opcode, cpsr in entries:
+            thumb = bool(cpsr & PSRFlags.T_MASK)
+            if thumb:
+                line = f"{pc:08X}: {opcode:04X}      CPSR={cpsr:08X}"
+            else:
+                line = f"{pc:08X}: {opcode:08X}  CPSR={cpsr:08X}"
+            if disassembler is not None:
+                line += f"  {disassembler.disassemble(pc, opcode, thumb)}"
+            lines.append(line)
+        return "\n".join(lines)
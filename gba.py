@@ -1,10 +1,15 @@
 """Clase principal del emulador GBA"""
+import mmap
+import os
+from typing import Optional
+
 from memory.memory_bus import MemoryBus
 from cpu.arm7tdmi import ARM7TDMI
 from ppu.ppu import PPU
 from apu.apu import APU
 from hw.timers import TimerController
 from hw.dma import DMAController
+from hw.scheduler import Scheduler
 
 
 class GBA:
@@ -15,15 +20,26 @@ class GBA:
     SCREEN_WIDTH = 240
     SCREEN_HEIGHT = 160
     
-    def __init__(self):
+    def __init__(self, bios_hle: Optional[bool] = None):
+        """
+        Args:
+            bios_hle: True/False fuerza o desactiva la emulación de alto
+                nivel de los SWIs; None la usa solo sin imagen de BIOS
+        """
         # Componentes principales
         self.memory = MemoryBus()
-        self.cpu = ARM7TDMI(self.memory)
+        self.cpu = ARM7TDMI(self.memory, bios_hle)
         self.ppu = PPU(self.memory)
         self.apu = APU(self.memory)
         self.timers = TimerController(self.memory)
         self.dma = DMAController(self.memory)
         
+        # Planificador de eventos: PPU, timers y APU avanzan por eventos
+        self.scheduler = Scheduler()
+        self.ppu.attach_scheduler(self.scheduler)
+        self.timers.attach_scheduler(self.scheduler)
+        self.apu.attach_scheduler(self.scheduler)
+        
         # Conectar componentes
         self.memory.cpu = self.cpu
         self.memory.ppu = self.ppu
@@ -55,12 +71,14 @@ class GBA:
     
     def load_rom(self, filepath: str) -> bool:
         try:
+            # La ROM se mapea en memoria (solo lectura) en vez de leerla:
+            # el bus la usa en su sitio y las páginas las comparte el SO
+            # entre instancias que carguen el mismo archivo
             with open(filepath, 'rb') as f:
-                data = f.read()
-            
-            if len(data) < 0xC0:
-                print("Error: ROM demasiado pequeña")
-                return False
+                if os.fstat(f.fileno()).st_size < 0xC0:
+                    print("Error: ROM demasiado pequeña")
+                    return False
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
             
             title = data[0xA0:0xAC].decode('ascii', errors='ignore').strip('\x00')
             game_code = data[0xAC:0xB0].decode('ascii', errors='ignore')
@@ -78,6 +96,7 @@ class GBA:
     def reset(self) -> None:
         self.total_cycles = 0
         self.frame_count = 0
+        self.scheduler.reset()
         self.cpu.reset()
         self.ppu.reset()
         self.apu.reset()
@@ -89,19 +108,50 @@ class GBA:
         # Ejecutar DMA si hay alguno activo
         dma_cycles = self.dma.step()
         if dma_cycles > 0:
-            self.ppu.step(dma_cycles)
-            self.apu.step(dma_cycles)
-            self.timers.step(dma_cycles)
+            self.scheduler.advance(dma_cycles)
             self.total_cycles += dma_cycles
             return dma_cycles
         
-        # Ejecutar CPU
-        cycles = self.cpu.step()
+        # En HALT no hay nada que ejecutar hasta el próximo evento
+        if self.cpu.halted:
+            cycles = self.cpu.run_cycles(self.scheduler.cycles_until_next())
+        else:
+            # Ejecutar CPU (un lote de un único bloque básico)
+            cycles = self.cpu.run_cycles(1)
+        
+        # Disparar los eventos de hardware vencidos
+        self.scheduler.advance(cycles)
+        
+        self.total_cycles += cycles
+        return cycles
+    
+    def run_cycles(self, cycles: int) -> int:
+        """
+        Ejecuta al menos `cycles` ciclos, o hasta completar un frame
+        
+        La CPU corre libre hasta el próximo evento del planificador
+        (H-Blank, fin de línea, overflow de timer, sample de audio) y
+        entonces se disparan los eventos vencidos.
+        
+        Returns:
+            Ciclos ejecutados
+        """
+        executed = 0
+        
+        while executed < cycles:
+            executed += self._run_slice(min(cycles - executed, self.scheduler.cycles_until_next()))
+            if self.ppu.frame_ready:
+                break
+        
+        return executed
+    
+    def _run_slice(self, budget: int) -> int:
+        """Ejecuta DMA o un lote de CPU y dispara los eventos vencidos"""
+        cycles = self.dma.step()
+        if cycles == 0:
+            cycles = self.cpu.run_cycles(budget)
         
-        # Actualizar otros componentes
-        self.ppu.step(cycles)
-        self.apu.step(cycles)
-        self.timers.step(cycles)
+        self.scheduler.advance(cycles)
         
         self.total_cycles += cycles
         return cycles
@@ -110,7 +160,7 @@ class GBA:
         self.ppu.frame_ready = False
         
         while not self.ppu.frame_ready:
-            self.step()
+            self._run_slice(self.scheduler.cycles_until_next())
         
         self.frame_count += 1
     
@@ -118,16 +118,12 @@ class EmulatorApp:
         Returns:
             True si el frame está completo
         """
-        cycles_this_batch = 0
-        target_cycles = self.CYCLES_PER_BATCH
+        if not self.gba.ppu.frame_ready:
+            self.gba.run_cycles(self.CYCLES_PER_BATCH)
         
-        while cycles_this_batch < target_cycles:
-            if self.gba.ppu.frame_ready:
-                self.gba.ppu.frame_ready = False
-                return True
-            
-            cycles = self.gba.step()
-            cycles_this_batch += cycles
+        if self.gba.ppu.frame_ready:
+            self.gba.ppu.frame_ready = False
+            return True
         
         return False
     
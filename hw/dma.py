@@ -195,6 +195,9 @@ class DMAController:
         source_delta = self._get_address_delta(channel.source_control, unit_size)
         dest_delta = self._get_address_delta(channel.dest_control, unit_size)
         
+        # Las esperas de los accesos del DMA se cuentan aquí, no en la CPU
+        stall = self.memory.stall_cycles
+        
         # Realizar transferencias
         for _ in range(channel.internal_count):
             if channel.transfer_32bit:
@@ -212,6 +215,9 @@ class DMAController:
             if channel.dest_control != 3:  # No increment+reload
                 channel.internal_dest = (channel.internal_dest + dest_delta) & channel.dest_mask
         
+        cycles += self.memory.stall_cycles - stall
+        self.memory.stall_cycles = stall
+        
         # Finalizar transferencia
         channel.running = False
         
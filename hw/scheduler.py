@@ -0,0 +1,89 @@
+"""
+Planificador de eventos del GBA
+Línea de tiempo de eventos por ciclo absoluto (min-heap)
+"""
+import heapq
+from typing import Callable, Dict, List
+
+# Ciclos devueltos cuando no hay ningún evento pendiente
+IDLE_HORIZON = 1 << 20
+
+
+class Scheduler:
+    """
+    Planificador central de eventos de hardware
+    
+    Cada componente programa sus eventos (fin de H-Draw, fin de línea,
+    overflow de timer, sample de audio...) con un nombre único; volver a
+    programar un nombre reemplaza el evento anterior. La CPU corre libre
+    hasta el próximo evento y luego advance() dispara los que vencieron.
+    
+    Los callbacks reciben el retraso en ciclos con el que se ejecutan,
+    para reprogramarse sin acumular deriva.
+    """
+    
+    def __init__(self):
+        self.timestamp = 0
+        
+        # Heap de [cuándo, secuencia, nombre, callback, activo]
+        self._events: List[list] = []
+        self._pending: Dict[str, list] = {}
+        self._sequence = 0
+    
+    def reset(self) -> None:
+        """Descarta todos los eventos y vuelve al ciclo 0"""
+        self.timestamp = 0
+        self._events.clear()
+        self._pending.clear()
+        self._sequence = 0
+    
+    def schedule(self, name: str, delay: int, callback: Callable[[int], None]) -> None:
+        """
+        Programa un evento `delay` ciclos después del instante actual
+        
+        Args:
+            name: Identificador del evento (reemplaza uno pendiente)
+            delay: Ciclos hasta el evento (puede ser <= 0)
+            callback: Función llamada con el retraso en ciclos
+        """
+        self.cancel(name)
+        
+        self._sequence += 1
+        event = [self.timestamp + delay, self._sequence, name, callback, True]
+        self._pending[name] = event
+        heapq.heappush(self._events, event)
+    
+    def cancel(self, name: str) -> None:
+        """Cancela un evento pendiente (si existe)"""
+        event = self._pending.pop(name, None)
+        if event is not None:
+            event[4] = False
+    
+    def is_scheduled(self, name: str) -> bool:
+        return name in self._pending
+    
+    def cycles_until_next(self) -> int:
+        """Ciclos hasta el próximo evento (al menos 1)"""
+        events = self._events
+        
+        # Descartar eventos cancelados del frente
+        while events and not events[0][4]:
+            heapq.heappop(events)
+        
+        if not events:
+            return IDLE_HORIZON
+        
+        return max(events[0][0] - self.timestamp, 1)
+    
+    def advance(self, cycles: int) -> None:
+        """Avanza el tiempo y dispara, en orden, los eventos vencidos"""
+        self.timestamp += cycles
+        timestamp = self.timestamp
+        events = self._events
+        
+        while events and events[0][0] <= timestamp:
+            when, _, name, callback, active = heapq.heappop(events)
+            if not active:
+                continue
+            del self._pending[name]
+            callback(timestamp - when)
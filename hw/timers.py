@@ -6,6 +6,7 @@ from typing import TYPE_CHECKING, Optional, Callable
 
 if TYPE_CHECKING:
     from memory.memory_bus import MemoryBus
+    from hw.scheduler import Scheduler
 
 
 class Timer:
@@ -88,16 +89,31 @@ class Timer:
         if not self.running or self.cascade:
             return 0
         
-        overflows = 0
+        prescaler = self.prescaler
         self.prescaler_counter += cycles
+        if self.prescaler_counter < prescaler:
+            return 0
         
-        # Procesar ticks según prescaler
-        while self.prescaler_counter >= self.prescaler:
-            self.prescaler_counter -= self.prescaler
-            overflows += self._tick()
+        # Avanzar todos los ticks de una vez en lugar de uno por uno
+        ticks = self.prescaler_counter // prescaler
+        self.prescaler_counter -= ticks * prescaler
+        
+        counter = self.counter + ticks
+        overflows = 0
+        while counter > 0xFFFF:
+            counter = counter - 0x10000 + self.reload
+            overflows += 1
+            if self.on_overflow:
+                self.counter = self.reload
+                self.on_overflow(self.timer_id)
+        self.counter = counter
         
         return overflows
     
+    def cycles_until_overflow(self) -> int:
+        """Ciclos hasta el próximo overflow (solo timers que cuentan ciclos)"""
+        return (0x10000 - self.counter) * self.prescaler - self.prescaler_counter
+    
     def cascade_tick(self) -> int:
         """
         Llamado cuando el timer anterior hace overflow (modo cascade)
@@ -144,11 +160,23 @@ class TimerController:
         # Configurar callbacks de overflow
         for timer in self.timers:
             timer.on_overflow = self._on_timer_overflow
+        
+        # Planificador de eventos (None: avanzar con step())
+        self.scheduler: Optional['Scheduler'] = None
+        self._synced_at = 0
+        
+        # Los overflows de un sync desde el bus (a mitad de instrucción)
+        # solo marcan IF; la CPU atiende la IRQ al terminar el bloque
+        self._defer_irq = False
     
     def reset(self) -> None:
         """Reinicia todos los timers"""
         for timer in self.timers:
             timer.reset()
+        
+        if self.scheduler is not None:
+            self._synced_at = self.scheduler.timestamp
+            self._reschedule()
     
     def step(self, cycles: int) -> None:
         """Avanza todos los timers"""
@@ -169,12 +197,81 @@ class TimerController:
                 # Modo normal: cuenta ciclos
                 cascade_overflows = timer.step(cycles)
     
+    def cycles_until_overflow(self) -> Optional[int]:
+        """
+        Ciclos hasta el próximo overflow de cualquier timer
+        
+        Los timers en cascade desbordan junto con su predecesor, así que
+        basta con los que cuentan ciclos.
+        
+        Returns:
+            Ciclos, o None si ningún timer está corriendo
+        """
+        nearest = None
+        for timer in self.timers:
+            if timer.running and not timer.cascade:
+                cycles = timer.cycles_until_overflow()
+                if nearest is None or cycles < nearest:
+                    nearest = cycles
+        return nearest
+    
+    # ===== Eventos del planificador =====
+    
+    def attach_scheduler(self, scheduler: 'Scheduler') -> None:
+        """Pasa a avanzar por eventos (próximo overflow)"""
+        self.scheduler = scheduler
+        self._synced_at = scheduler.timestamp
+        self._reschedule()
+    
+    def _now(self) -> int:
+        """
+        Instante actual: timestamp del planificador más lo que la CPU lleva
+        ejecutado del lote en curso (el planificador avanza al terminarlo)
+        """
+        cpu = self.memory.cpu
+        if cpu is None:
+            return self.scheduler.timestamp
+        return self.scheduler.timestamp + cpu.batch_cycles()
+    
+    def sync(self, defer_irq: bool = False) -> None:
+        """
+        Pone los contadores al día con el planificador
+        
+        Args:
+            defer_irq: True al sincronizar por un acceso de la CPU a un
+                registro, para no entrar en modo IRQ a mitad de instrucción
+        """
+        if self.scheduler is None:
+            return
+        now = self._now()
+        elapsed = now - self._synced_at
+        if elapsed > 0:
+            self._synced_at = now
+            self._defer_irq = defer_irq
+            self.step(elapsed)
+            self._defer_irq = False
+    
+    def _reschedule(self) -> None:
+        """Programa el evento del próximo overflow"""
+        cycles = self.cycles_until_overflow()
+        if cycles is None:
+            self.scheduler.cancel('timers')
+        else:
+            # Contado desde el último sync, que puede ser a mitad de lote
+            delay = cycles + self._synced_at - self.scheduler.timestamp
+            self.scheduler.schedule('timers', delay, self._on_overflow_event)
+    
+    def _on_overflow_event(self, late: int) -> None:
+        """Evento: algún timer hace overflow"""
+        self.sync()
+        self._reschedule()
+    
     def _on_timer_overflow(self, timer_id: int) -> None:
         """Callback cuando un timer hace overflow"""
         # Generar interrupción si está habilitada
         if self.timers[timer_id].irq_enabled:
             irq_bit = 0x08 << timer_id  # Timer 0=bit3, Timer 1=bit4, etc.
-            self.memory.request_interrupt(irq_bit)
+            self.memory.request_interrupt(irq_bit, self._defer_irq)
         
         # Notificar al APU si es timer 0 o 1
         if timer_id in (0, 1) and self.memory.apu:
@@ -185,6 +282,7 @@ class TimerController:
     def read_counter(self, timer_id: int) -> int:
         """Lee el contador de un timer"""
         if 0 <= timer_id < 4:
+            self.sync(defer_irq=True)
             return self.timers[timer_id].read_counter()
         return 0
     
@@ -202,10 +300,14 @@ class TimerController:
     def write_control(self, timer_id: int, value: int) -> None:
         """Escribe el control de un timer"""
         if 0 <= timer_id < 4:
+            self.sync(defer_irq=True)
             self.timers[timer_id].write_control(value)
+            if self.scheduler is not None:
+                self._reschedule()
     
     def get_counter(self, timer_id: int) -> int:
         """Obtiene el valor actual del contador"""
         if 0 <= timer_id < 4:
+            self.sync(defer_irq=True)
             return self.timers[timer_id].counter
         return 0
\ No newline at end of file
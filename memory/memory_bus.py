@@ -5,6 +5,7 @@ import numpy as np
 from typing import Optional, TYPE_CHECKING, Callable
 from .regions import MemoryRegion as MR
 from .io_registers import IORegister, IO_REGISTER_INFO, InterruptFlags
+from .save_manager import SaveType, detect_save_type
 from typing import TYPE_CHECKING, Optional
 from memory.io_registers import IORegister
 
@@ -14,6 +15,9 @@ if TYPE_CHECKING:
     from hw.dma import DMAController
     from hw.timers import TimerController
 
+# Páginas de código para invalidar la caché de bloques (256 bytes)
+CODE_PAGE_SHIFT = 8
+
 
 class MemoryBus:
     """
@@ -30,18 +34,27 @@ class MemoryBus:
         self.vram = np.zeros(0x18000, dtype=np.uint8)      # 96 KB
         self.oam = np.zeros(0x400, dtype=np.uint8)         # 1 KB
         self.rom = np.zeros(0, dtype=np.uint8)             # Variable
+        
+        # Guardado detectado en la ROM (ver _detect_save_type)
+        self.save_type = SaveType.NONE
+        self.save_library: Optional[str] = None
         self.sram = np.zeros(0x10000, dtype=np.uint8)      # 64 KB
         
         # ===== Registros de I/O =====
         self.io_registers = np.zeros(0x400, dtype=np.uint8)
         
         # ===== Estado interno =====
-        self.bios_readable = True
+        self._bios_readable = True
         self.last_bios_read = 0
+        self.bios_loaded = False  # Imagen de BIOS real cargada
         
         # Valor de "open bus" (última lectura del bus)
         self.open_bus_value = 0
         
+        # Se activa al leer un registro que cambia con cada ciclo (contador
+        # de timer); impide tratar el bucle que lo lee como bucle de espera
+        self.volatile_read = False
+        
         # ===== Wait State Control =====
         self.waitcnt = 0
         self.sram_wait = 4
@@ -53,6 +66,22 @@ class MemoryBus:
         self.ws2_seq = 8
         self.prefetch_enabled = False
         
+        # Ciclos de espera (extra sobre 1) por región (bits 24-27) y ancho,
+        # para accesos no secuenciales (N) y secuenciales (S)
+        self.wait_n16 = [0] * 16
+        self.wait_s16 = [0] * 16
+        self.wait_n32 = [0] * 16
+        self.wait_s32 = [0] * 16
+        
+        # Esperas de fetch secuencial de código (incluye el prefetch del cartucho)
+        self.fetch_wait_16 = [0] * 16
+        self.fetch_wait_32 = [0] * 16
+        
+        # Esperas acumuladas por los accesos; las descuenta quien los hizo
+        self.stall_cycles = 0
+        
+        self._build_wait_tables()
+        
         # ===== Referencias a componentes =====
         self.cpu = None
         self.ppu = None
@@ -60,12 +89,47 @@ class MemoryBus:
         self.dma = None
         self.timers = None
         
+        # Caché de bloques de la CPU (se registra ella misma)
+        self.block_cache = None
+        
+        # Un byte por página de EWRAM/IWRAM: distinto de 0 si la página
+        # contiene código cacheado. Las escrituras solo avisan a la caché
+        # cuando caen en una de estas páginas (la ROM es inmutable)
+        self.ewram_code_pages = bytearray(MR.EWRAM_SIZE >> CODE_PAGE_SHIFT)
+        self.iwram_code_pages = bytearray(MR.IWRAM_SIZE >> CODE_PAGE_SHIFT)
+        
+        # Vistas de 32 bits de la RAM para transferencias múltiples (LDM/STM)
+        self.ewram_words = self.ewram.view('<u4')
+        self.iwram_words = self.iwram.view('<u4')
+        
+        # Vistas sin copia de 8/16/32 bits (little-endian) sobre los mismos
+        # buffers: indexar un memoryview da un int de Python directamente,
+        # mucho más barato que un escalar de NumPy. Los arrays de NumPy se
+        # mantienen para las operaciones en bloque (PPU, DMA, HLE).
+        self._bios8 = memoryview(self.bios)
+        self._sram8 = memoryview(self.sram)
+        self._ewram8, self._ewram16, self._ewram32 = self._typed_views(self.ewram)
+        self._iwram8, self._iwram16, self._iwram32 = self._typed_views(self.iwram)
+        self._palette8, self._palette16, self._palette32 = self._typed_views(self.palette_ram)
+        self._vram8, self._vram16, self._vram32 = self._typed_views(self.vram)
+        self._oam8, self._oam16, self._oam32 = self._typed_views(self.oam)
+        self._io8, self._io16, self._io32 = self._typed_views(self.io_registers)
+        
+        # Vistas tipadas de la ROM (ver _build_rom_views)
+        self._build_rom_views()
+        
+        # Handlers de acceso por región (ver _build_page_tables)
+        self._build_page_tables()
+        
         # ===== Input =====
         self.key_state = 0x03FF  # Todos los botones sueltos (activo bajo)
         
-        # ===== Callbacks para escrituras especiales =====
-        self._io_write_handlers: dict = {}
-        self._io_read_handlers: dict = {}
+        # ===== Handlers de registros de I/O (ver _setup_io_handlers) =====
+        self._io_read_table: list = []
+        self._io_write8_table: list = []
+        self._io_write16_table: list = []
+        self._io_write32_table: list = []
+        self._io_write_masks: list = []
         
         self._setup_io_handlers()
 
@@ -75,13 +139,21 @@ class MemoryBus:
         self.dma: Optional['DMAController'] = None
     
     def _setup_io_handlers(self) -> None:
-        """Configura handlers para registros especiales"""
-        # Handlers de escritura
-        self._io_write_handlers = {
+        """
+        Construye las tablas de dispatch de I/O (una entrada por byte)
+        
+        Cada entrada apunta al handler del registro que contiene ese byte,
+        así un acceso es un índice en una lista en vez de buscar en dicts.
+        Los handlers de 16 bits reciben siempre la halfword completa, ya
+        combinada con el valor anterior y con la máscara de escritura de
+        IO_REGISTER_INFO aplicada; los de 32 bits (FIFOs de sonido) reciben
+        los bytes escritos y cuántos son, así una halfword o un byte suelto
+        solo mete en el FIFO lo que se escribió.
+        """
+        # Handlers de escritura (registros de 16 bits)
+        write_handlers = {
             IORegister.DISPSTAT: self._write_dispstat,
-            IORegister.IF: self._write_if,
             IORegister.WAITCNT: self._write_waitcnt,
-            IORegister.HALTCNT: self._write_haltcnt,
             IORegister.DMA0CNT_H: lambda v: self._write_dma_control(0, v),
             IORegister.DMA1CNT_H: lambda v: self._write_dma_control(1, v),
             IORegister.DMA2CNT_H: lambda v: self._write_dma_control(2, v),
@@ -90,12 +162,21 @@ class MemoryBus:
             IORegister.TM1CNT_H: lambda v: self._write_timer_control(1, v),
             IORegister.TM2CNT_H: lambda v: self._write_timer_control(2, v),
             IORegister.TM3CNT_H: lambda v: self._write_timer_control(3, v),
+        }
+        
+        # Handlers de escritura (registros de 8 bits)
+        byte_write_handlers = {
+            IORegister.HALTCNT: self._write_haltcnt,
+        }
+        
+        # Handlers de escritura (registros de 32 bits)
+        word_write_handlers = {
             IORegister.FIFO_A: self._write_fifo_a,
             IORegister.FIFO_B: self._write_fifo_b,
         }
         
-        # Handlers de lectura
-        self._io_read_handlers = {
+        # Handlers de lectura (devuelven la halfword completa)
+        read_handlers = {
             IORegister.KEYINPUT: self._read_keyinput,
             IORegister.VCOUNT: self._read_vcount,
             IORegister.DISPSTAT: self._read_dispstat,
@@ -104,6 +185,54 @@ class MemoryBus:
             IORegister.TM2CNT_L: lambda: self._read_timer_counter(2),
             IORegister.TM3CNT_L: lambda: self._read_timer_counter(3),
         }
+        
+        size = len(self.io_registers)
+        self._io_read_table = [None] * size
+        self._io_write8_table = [None] * size
+        self._io_write16_table = [None] * size
+        self._io_write32_table = [None] * size
+        
+        for reg, handler in read_handlers.items():
+            self._io_read_table[reg] = self._io_read_table[reg + 1] = handler
+        
+        for reg, handler in write_handlers.items():
+            for addr in (reg, reg + 1):
+                self._io_write8_table[addr] = handler
+                self._io_write16_table[addr] = handler
+        
+        for reg, handler in byte_write_handlers.items():
+            shift = (reg & 1) * 8
+            wrapper = lambda v, handler=handler, shift=shift: handler((v >> shift) & 0xFF)
+            # Un byte suelto solo dispara su propio registro; una halfword
+            # que lo incluye también
+            self._io_write8_table[reg] = wrapper
+            self._io_write16_table[reg & ~1] = self._io_write16_table[reg | 1] = wrapper
+        
+        for reg, handler in word_write_handlers.items():
+            for addr in range(reg, reg + 4):
+                shift = (addr & 1) * 8
+                self._io_write8_table[addr] = (
+                    lambda v, handler=handler, shift=shift: handler((v >> shift) & 0xFF, 1))
+                self._io_write16_table[addr] = lambda v, handler=handler: handler(v, 2)
+                self._io_write32_table[addr] = handler
+        
+        # Máscara de escritura de la halfword que contiene cada byte; los
+        # registros sin información aceptan todos los bits
+        halfword_masks = {}
+        for reg, info in IO_REGISTER_INFO.items():
+            mask = info.write_mask if info.writable else 0
+            base = reg & ~1
+            if info.size == 1:
+                current = halfword_masks.get(base, 0xFFFF)
+                shift = (reg & 1) * 8
+                halfword_masks[base] = (current & ~(0xFF << shift)) | ((mask & 0xFF) << shift)
+            else:
+                for offset in range(0, info.size, 2):
+                    halfword_masks[base + offset] = (mask >> (offset * 8)) & 0xFFFF
+        
+        self._io_write_masks = [0xFFFF] * size
+        for base, mask in halfword_masks.items():
+            self._io_write_masks[base] = self._io_write_masks[base + 1] = mask
     
     # ===== Carga de datos =====
     
@@ -111,17 +240,47 @@ class MemoryBus:
         """Carga el BIOS del GBA"""
         size = min(len(data), 0x4000)
         self.bios[:size] = np.frombuffer(data[:size], dtype=np.uint8)
+        self.bios_loaded = True
+        if self.block_cache is not None:
+            self.block_cache.clear()
         print(f"BIOS cargado: {size} bytes")
         
-    def load_rom(self, data: bytes) -> None:
-        """Carga una ROM de GBA"""
-        self.rom = np.frombuffer(data, dtype=np.uint8).copy()
+    def load_rom(self, data) -> None:
+        """
+        Carga una ROM de GBA
+        
+        `data` es cualquier objeto con protocolo buffer (bytes, bytearray,
+        mmap); la ROM se usa en su sitio, sin copiarla. Con un buffer de
+        solo lectura (bytes, mmap de solo lectura) el array también lo es.
+        """
+        self.rom = np.frombuffer(data, dtype=np.uint8)
+        self._build_rom_views()
+        if self.block_cache is not None:
+            self.block_cache.clear()
         size_mb = len(self.rom) / 1024 / 1024
         print(f"ROM cargada: {len(self.rom)} bytes ({size_mb:.2f} MB)")
         
         # Detectar tipo de guardado
         self._detect_save_type()
     
+    @staticmethod
+    def _typed_views(data: np.ndarray) -> tuple:
+        """Vistas de 8, 16 y 32 bits (little-endian) sobre un array de bytes"""
+        return (memoryview(data),
+                memoryview(data[:len(data) & ~1].view('<u2')),
+                memoryview(data[:len(data) & ~3].view('<u4')))
+    
+    def _build_rom_views(self) -> None:
+        """
+        Vistas de 8, 16 y 32 bits (little-endian) sobre el buffer de la ROM
+        
+        Son memoryviews sin copia: indexarlas devuelve directamente un int,
+        así que leer de ROM es un único acceso en vez de armar la halfword
+        o la word byte a byte. Un tamaño no múltiplo de 2/4 deja los últimos
+        bytes fuera de las vistas anchas (se leen por el camino lento).
+        """
+        self.rom_bytes, self.rom_halfwords, self.rom_words = self._typed_views(self.rom)
+    
     def load_save(self, data: bytes) -> None:
         """Carga datos de guardado"""
         size = min(len(data), len(self.sram))
@@ -134,280 +293,483 @@ class MemoryBus:
     
     def _detect_save_type(self) -> None:
         """Detecta el tipo de guardado buscando strings en la ROM"""
-        rom_str = bytes(self.rom).decode('ascii', errors='ignore')
-        
-        if 'EEPROM_V' in rom_str:
-            print("  Tipo de guardado: EEPROM")
-        elif 'SRAM_V' in rom_str:
-            print("  Tipo de guardado: SRAM")
-        elif 'FLASH_V' in rom_str or 'FLASH512_V' in rom_str:
-            print("  Tipo de guardado: Flash 64KB")
-        elif 'FLASH1M_V' in rom_str:
-            print("  Tipo de guardado: Flash 128KB")
-        else:
+        self.save_type, self.save_library = detect_save_type(self.rom)
+        
+        if self.save_type == SaveType.NONE:
             print("  Tipo de guardado: No detectado (asumiendo SRAM)")
+            return
+        
+        names = {
+            SaveType.EEPROM_8K: "EEPROM",
+            SaveType.SRAM: "SRAM",
+            SaveType.FLASH_64K: "Flash 64KB",
+            SaveType.FLASH_128K: "Flash 128KB",
+        }
+        print(f"  Tipo de guardado: {names[self.save_type]} ({self.save_library})")
     
     # ===== Acceso a memoria =====
     
     def read_8(self, address: int) -> int:
         """Lee un byte"""
         address &= 0xFFFFFFFF
-        region = (address >> 24) & 0xFF
-        
-        # BIOS
-        if region == 0x00:
-            if address < 0x4000:
-                if self.bios_readable:
-                    value = int(self.bios[address])
-                    self.last_bios_read = value
-                    return value
-                return (self.last_bios_read >> ((address & 3) * 8)) & 0xFF
-            return 0
-        
-        # EWRAM
-        elif region == 0x02:
-            return int(self.ewram[address & 0x3FFFF])
-        
-        # IWRAM
-        elif region == 0x03:
-            return int(self.iwram[address & 0x7FFF])
-        
-        # I/O
-        elif region == 0x04:
-            return self._read_io(address & 0x3FF)
-        
-        # Palette
-        elif region == 0x05:
-            return int(self.palette_ram[address & 0x3FF])
-        
-        # VRAM
-        elif region == 0x06:
-            addr = address & 0x1FFFF
-            if addr >= 0x18000:
-                addr -= 0x8000
-            return int(self.vram[addr])
-        
-        # OAM
-        elif region == 0x07:
-            return int(self.oam[address & 0x3FF])
-        
-        # ROM
-        elif 0x08 <= region <= 0x0D:
-            rom_addr = address & 0x01FFFFFF
-            if rom_addr < len(self.rom):
-                return int(self.rom[rom_addr])
-            return (rom_addr >> 1) & 0xFF  # Open bus para ROM no mapeada
-        
-        # SRAM
-        elif region == 0x0E or region == 0x0F:
-            return int(self.sram[address & 0xFFFF])
-        
-        return 0
+        region = address >> 24
+        self.stall_cycles += self.wait_n16[region & 0xF]
+        return self._read8[region](address)
     
     def read_16(self, address: int) -> int:
         """Lee una halfword (16 bits)"""
-        address &= ~1
-        region = (address >> 24) & 0xFF
-        
-        # Acceso rápido para regiones comunes
-        if region == 0x02:  # EWRAM
-            addr = address & 0x3FFFF
-            return int(self.ewram[addr]) | (int(self.ewram[addr + 1]) << 8)
-        
-        elif region == 0x03:  # IWRAM
-            addr = address & 0x7FFF
-            return int(self.iwram[addr]) | (int(self.iwram[addr + 1]) << 8)
-        
-        elif region == 0x06:  # VRAM
-            addr = address & 0x1FFFF
-            if addr >= 0x18000:
-                addr -= 0x8000
-            return int(self.vram[addr]) | (int(self.vram[addr + 1]) << 8)
-        
-        elif 0x08 <= region <= 0x0D:  # ROM
-            rom_addr = address & 0x01FFFFFF
-            if rom_addr + 1 < len(self.rom):
-                return int(self.rom[rom_addr]) | (int(self.rom[rom_addr + 1]) << 8)
-        
-        # Fallback
-        return self.read_8(address) | (self.read_8(address + 1) << 8)
+        address &= 0xFFFFFFFE
+        region = address >> 24
+        self.stall_cycles += self.wait_n16[region & 0xF]
+        return self._read16[region](address)
     
     def read_32(self, address: int) -> int:
         """Lee una word (32 bits)"""
-        address &= ~3
-        region = (address >> 24) & 0xFF
-        
-        # Acceso rápido para regiones comunes
-        if region == 0x02:  # EWRAM
-            addr = address & 0x3FFFF
-            return (int(self.ewram[addr]) | 
-                   (int(self.ewram[addr + 1]) << 8) |
-                   (int(self.ewram[addr + 2]) << 16) |
-                   (int(self.ewram[addr + 3]) << 24))
-        
-        elif region == 0x03:  # IWRAM
-            addr = address & 0x7FFF
-            return (int(self.iwram[addr]) | 
-                   (int(self.iwram[addr + 1]) << 8) |
-                   (int(self.iwram[addr + 2]) << 16) |
-                   (int(self.iwram[addr + 3]) << 24))
-        
-        elif 0x08 <= region <= 0x0D:  # ROM
-            rom_addr = address & 0x01FFFFFF
-            if rom_addr + 3 < len(self.rom):
-                return (int(self.rom[rom_addr]) | 
-                       (int(self.rom[rom_addr + 1]) << 8) |
-                       (int(self.rom[rom_addr + 2]) << 16) |
-                       (int(self.rom[rom_addr + 3]) << 24))
-        
-        # Fallback
-        return (self.read_8(address) | 
-               (self.read_8(address + 1) << 8) |
-               (self.read_8(address + 2) << 16) |
-               (self.read_8(address + 3) << 24))
+        address &= 0xFFFFFFFC
+        region = address >> 24
+        self.stall_cycles += self.wait_n32[region & 0xF]
+        return self._read32[region](address)
     
     def write_8(self, address: int, value: int) -> None:
         """Escribe un byte"""
-        value &= 0xFF
         address &= 0xFFFFFFFF
-        region = (address >> 24) & 0xFF
-        
-        # EWRAM
-        if region == 0x02:
-            self.ewram[address & 0x3FFFF] = value
-        
-        # IWRAM
-        elif region == 0x03:
-            self.iwram[address & 0x7FFF] = value
-        
-        # I/O
-        elif region == 0x04:
-            self._write_io(address & 0x3FF, value)
-        
-        # Palette (escritura de 8 bits escribe el mismo byte dos veces)
-        elif region == 0x05:
-            addr = address & 0x3FE
-            self.palette_ram[addr] = value
-            self.palette_ram[addr + 1] = value
-        
-        # VRAM (comportamiento especial para 8 bits)
-        elif region == 0x06:
-            addr = address & 0x1FFFE
-            if addr >= 0x18000:
-                addr -= 0x8000
-            # Solo BG VRAM acepta escrituras de 8 bits
-            if addr < 0x10000:
-                self.vram[addr] = value
-                self.vram[addr + 1] = value
-        
-        # OAM no acepta escrituras de 8 bits
-        
-        # SRAM
-        elif region == 0x0E or region == 0x0F:
-            self.sram[address & 0xFFFF] = value
+        region = address >> 24
+        self.stall_cycles += self.wait_n16[region & 0xF]
+        self._write8[region](address, value & 0xFF)
     
     def write_16(self, address: int, value: int) -> None:
         """Escribe una halfword (16 bits)"""
-        value &= 0xFFFF
-        address &= ~1
-        region = (address >> 24) & 0xFF
-        
-        if region == 0x02:  # EWRAM
-            addr = address & 0x3FFFF
-            self.ewram[addr] = value & 0xFF
-            self.ewram[addr + 1] = (value >> 8) & 0xFF
-        
-        elif region == 0x03:  # IWRAM
-            addr = address & 0x7FFF
-            self.iwram[addr] = value & 0xFF
-            self.iwram[addr + 1] = (value >> 8) & 0xFF
-        
-        elif region == 0x04:  # I/O
-            addr = address & 0x3FF
-            # Caso especial para IF - escribir 1 limpia el bit
-            if addr == IORegister.IF:
-                # IMPORTANTE: convertir a int de Python para evitar overflow de numpy
-                current = int(self.io_registers[IORegister.IF]) | (int(self.io_registers[IORegister.IF + 1]) << 8)
-                new_value = current & (~value & 0xFFFF)
-                self.io_registers[IORegister.IF] = new_value & 0xFF
-                self.io_registers[IORegister.IF + 1] = (new_value >> 8) & 0xFF
-                return
-            
-            self._write_io(addr, value & 0xFF)
-            self._write_io(addr + 1, (value >> 8) & 0xFF)
-        
-        elif region == 0x05:  # Palette
-            addr = address & 0x3FF
-            self.palette_ram[addr] = value & 0xFF
-            self.palette_ram[addr + 1] = (value >> 8) & 0xFF
-        
-        elif region == 0x06:  # VRAM
-            addr = address & 0x1FFFF
-            if addr >= 0x18000:
-                addr -= 0x8000
-            self.vram[addr] = value & 0xFF
-            self.vram[addr + 1] = (value >> 8) & 0xFF
-        
-        elif region == 0x07:  # OAM
-            addr = address & 0x3FF
-            self.oam[addr] = value & 0xFF
-            self.oam[addr + 1] = (value >> 8) & 0xFF
-        
-        elif region == 0x0E or region == 0x0F:  # SRAM
-            addr = address & 0xFFFF
-            self.sram[addr] = value & 0xFF
+        address &= 0xFFFFFFFE
+        region = address >> 24
+        self.stall_cycles += self.wait_n16[region & 0xF]
+        self._write16[region](address, value & 0xFFFF)
     
     def write_32(self, address: int, value: int) -> None:
         """Escribe una word (32 bits)"""
-        value &= 0xFFFFFFFF
-        address &= ~3
-        
-        self.write_16(address, value & 0xFFFF)
-        self.write_16(address + 2, (value >> 16) & 0xFFFF)
+        address &= 0xFFFFFFFC
+        region = address >> 24
+        self.stall_cycles += self.wait_n32[region & 0xF]
+        self._write32[region](address, value & 0xFFFFFFFF)
+    
+    # ===== Tablas de páginas =====
+    
+    def _build_page_tables(self) -> None:
+        """
+        Instala los handlers de cada región (bits 24-31 de la dirección)
+        
+        read_*/write_* solo cuentan las esperas y llaman al handler de la
+        región: un índice y una llamada en vez de la cadena de if/elif. Los
+        handlers reciben la dirección ya alineada y no cuentan esperas.
+        Las regiones sin camino rápido para 16/32 bits los componen con
+        los handlers de 8/16 bits de la misma región.
+        """
+        self._read8 = [self._read_unmapped] * 256
+        self._read16 = [self._read_unmapped] * 256
+        self._read32 = [self._read_unmapped] * 256
+        self._write8 = [self._write_ignored] * 256
+        self._write16 = [self._write_ignored] * 256
+        self._write32 = [self._write_ignored] * 256
+        
+        self._install(0x02, self._read8_ewram, self._read16_ewram, self._read32_ewram,
+                      self._write8_ewram, self._write16_ewram, self._write32_ewram)
+        self._install(0x03, self._read8_iwram, self._read16_iwram, self._read32_iwram,
+                      self._write8_iwram, self._write16_iwram, self._write32_iwram)
+        self._install(0x04, self._read8_io, self._read16_io, self._read32_io,
+                      self._write8_io, self._write16_io, self._write32_io)
+        self._install(0x05, self._read8_palette, self._read16_palette, self._read32_palette,
+                      self._write8_palette, self._write16_palette, self._write32_palette)
+        self._install(0x06, self._read8_vram, self._read16_vram, self._read32_vram,
+                      self._write8_vram, self._write16_vram, self._write32_vram)
+        self._install(0x07, self._read8_oam, self._read16_oam, self._read32_oam,
+                      self._write_ignored, self._write16_oam, self._write32_oam)
+        for region in range(0x08, 0x0E):
+            self._install(region, self._read8_rom, self._read16_rom, self._read32_rom,
+                          self._write_ignored, self._write_ignored, self._write_ignored)
+        for region in (0x0E, 0x0F):
+            self._install(region, self._read8_sram, self._read16_bytes, self._read32_bytes,
+                          self._write8_sram, self._write16_sram, self._write32_halves)
+        
+        self._install_bios_handlers()
+    
+    def _install(self, region: int, read8, read16, read32, write8, write16, write32) -> None:
+        self._read8[region] = read8
+        self._read16[region] = read16
+        self._read32[region] = read32
+        self._write8[region] = write8
+        self._write16[region] = write16
+        self._write32[region] = write32
+    
+    def _install_bios_handlers(self) -> None:
+        """Lectura del BIOS según esté protegido o no"""
+        if self._bios_readable:
+            self._read8[0x00] = self._read8_bios
+        else:
+            self._read8[0x00] = self._read8_bios_protected
+        self._read16[0x00] = self._read16_bytes
+        self._read32[0x00] = self._read32_bytes
+    
+    @property
+    def bios_readable(self) -> bool:
+        return self._bios_readable
     
-    # ===== I/O Handlers =====
+    @bios_readable.setter
+    def bios_readable(self, value: bool) -> None:
+        self._bios_readable = value
+        if hasattr(self, '_read8'):
+            self._install_bios_handlers()
     
-    def _read_io(self, address: int) -> int:
-        """Lee un registro de I/O"""
-        # Verificar si hay handler para este registro o su base (para registros de 16 bits)
-        base_addr = address & ~1
+    # ===== Handlers genéricos =====
+    
+    def _read_unmapped(self, address: int) -> int:
+        return 0
+    
+    def _write_ignored(self, address: int, value: int) -> None:
+        pass
+    
+    def _read16_bytes(self, address: int) -> int:
+        read = self._read8[address >> 24]
+        return read(address) | (read(address + 1) << 8)
+    
+    def _read32_bytes(self, address: int) -> int:
+        read = self._read8[address >> 24]
+        return (read(address) |
+               (read(address + 1) << 8) |
+               (read(address + 2) << 16) |
+               (read(address + 3) << 24))
+    
+    def _write32_halves(self, address: int, value: int) -> None:
+        write = self._write16[address >> 24]
+        write(address, value & 0xFFFF)
+        write(address + 2, value >> 16)
+    
+    # ===== BIOS =====
+    
+    def _read8_bios(self, address: int) -> int:
+        if address < 0x4000:
+            value = self._bios8[address]
+            self.last_bios_read = value
+            return value
+        return 0
+    
+    def _read8_bios_protected(self, address: int) -> int:
+        if address < 0x4000:
+            return (self.last_bios_read >> ((address & 3) * 8)) & 0xFF
+        return 0
+    
+    # ===== EWRAM =====
+    
+    def _read8_ewram(self, address: int) -> int:
+        return self._ewram8[address & 0x3FFFF]
+    
+    def _read16_ewram(self, address: int) -> int:
+        return self._ewram16[(address & 0x3FFFF) >> 1]
+    
+    def _read32_ewram(self, address: int) -> int:
+        return self._ewram32[(address & 0x3FFFF) >> 2]
+    
+    def _write8_ewram(self, address: int, value: int) -> None:
+        addr = address & 0x3FFFF
+        self._ewram8[addr] = value
+        if self.ewram_code_pages[addr >> CODE_PAGE_SHIFT]:
+            self.block_cache.invalidate(address)
+    
+    def _write16_ewram(self, address: int, value: int) -> None:
+        addr = address & 0x3FFFF
+        self._ewram16[addr >> 1] = value
+        if self.ewram_code_pages[addr >> CODE_PAGE_SHIFT]:
+            self.block_cache.invalidate(address)
+    
+    def _write32_ewram(self, address: int, value: int) -> None:
+        addr = address & 0x3FFFF
+        self._ewram32[addr >> 2] = value
+        if self.ewram_code_pages[addr >> CODE_PAGE_SHIFT]:
+            self.block_cache.invalidate(address)
+    
+    # ===== IWRAM =====
+    
+    def _read8_iwram(self, address: int) -> int:
+        return self._iwram8[address & 0x7FFF]
+    
+    def _read16_iwram(self, address: int) -> int:
+        return self._iwram16[(address & 0x7FFF) >> 1]
+    
+    def _read32_iwram(self, address: int) -> int:
+        return self._iwram32[(address & 0x7FFF) >> 2]
+    
+    def _write8_iwram(self, address: int, value: int) -> None:
+        addr = address & 0x7FFF
+        self._iwram8[addr] = value
+        if self.iwram_code_pages[addr >> CODE_PAGE_SHIFT]:
+            self.block_cache.invalidate(address)
+    
+    def _write16_iwram(self, address: int, value: int) -> None:
+        addr = address & 0x7FFF
+        self._iwram16[addr >> 1] = value
+        if self.iwram_code_pages[addr >> CODE_PAGE_SHIFT]:
+            self.block_cache.invalidate(address)
+    
+    def _write32_iwram(self, address: int, value: int) -> None:
+        addr = address & 0x7FFF
+        self._iwram32[addr >> 2] = value
+        if self.iwram_code_pages[addr >> CODE_PAGE_SHIFT]:
+            self.block_cache.invalidate(address)
+    
+    # ===== I/O =====
+    
+    def _read8_io(self, address: int) -> int:
+        addr = address & 0x3FF
+        handler = self._io_read_table[addr]
+        if handler is None:
+            return self._io8[addr]
+        return (handler() >> ((addr & 1) * 8)) & 0xFF
+    
+    def _read16_io(self, address: int) -> int:
+        addr = address & 0x3FF
+        handler = self._io_read_table[addr]
+        if handler is None:
+            return self._io16[addr >> 1]
+        return handler() & 0xFFFF
+    
+    def _read32_io(self, address: int) -> int:
+        return self._read16_io(address) | (self._read16_io(address + 2) << 16)
+    
+    def _write8_io(self, address: int, value: int) -> None:
+        addr = address & 0x3FF
+        shift = (addr & 1) * 8
+        if addr & ~1 == IORegister.IF:
+            self._write_if(value << shift)
+            return
         
-        if base_addr in self._io_read_handlers:
-            val16 = self._io_read_handlers[base_addr]()
-            if address & 1:  # Byte alto
-                return (val16 >> 8) & 0xFF
-            else:  # Byte bajo
-                return val16 & 0xFF
+        index = addr >> 1
+        mask = self._io_write_masks[addr] & (0xFF << shift)
+        value = (self._io16[index] & ~mask) | ((value << shift) & mask)
+        self._io16[index] = value
         
-        # Handler específico para este byte
-        if address in self._io_read_handlers:
-            return self._io_read_handlers[address]() & 0xFF
+        handler = self._io_write8_table[addr]
+        if handler is not None:
+            handler(value)
+    
+    def _write16_io(self, address: int, value: int) -> None:
+        addr = address & 0x3FF
+        if addr == IORegister.IF:
+            self._write_if(value)
+            return
         
-        # Lectura normal del array
-        if address < len(self.io_registers):
-            return int(self.io_registers[address])
+        index = addr >> 1
+        mask = self._io_write_masks[addr]
+        value = (self._io16[index] & ~mask) | (value & mask)
+        self._io16[index] = value
+        
+        handler = self._io_write16_table[addr]
+        if handler is not None:
+            handler(value)
+    
+    def _write32_io(self, address: int, value: int) -> None:
+        addr = address & 0x3FF
+        handler = self._io_write32_table[addr]
+        if handler is None:
+            self._write16_io(addr, value & 0xFFFF)
+            self._write16_io(addr + 2, value >> 16)
+            return
         
-        return 0
+        self._io32[addr >> 2] = value
+        handler(value)
     
-    def _write_io(self, address: int, value: int) -> None:
-        """Escribe un registro de I/O"""
-        if address >= len(self.io_registers):
-            return
+    # ===== Palette =====
+    
+    def _read8_palette(self, address: int) -> int:
+        return self._palette8[address & 0x3FF]
+    
+    def _read16_palette(self, address: int) -> int:
+        return self._palette16[(address & 0x3FF) >> 1]
+    
+    def _read32_palette(self, address: int) -> int:
+        return self._palette32[(address & 0x3FF) >> 2]
+    
+    def _write8_palette(self, address: int, value: int) -> None:
+        # Escritura de 8 bits escribe el mismo byte dos veces
+        self._palette16[(address & 0x3FF) >> 1] = value * 0x0101
+    
+    def _write16_palette(self, address: int, value: int) -> None:
+        self._palette16[(address & 0x3FF) >> 1] = value
+    
+    def _write32_palette(self, address: int, value: int) -> None:
+        self._palette32[(address & 0x3FF) >> 2] = value
+    
+    # ===== VRAM (0x06018000-0x0601FFFF refleja 0x06010000-0x06017FFF) =====
+    
+    def _read8_vram(self, address: int) -> int:
+        addr = address & 0x1FFFF
+        if addr >= 0x18000:
+            addr -= 0x8000
+        return self._vram8[addr]
+    
+    def _read16_vram(self, address: int) -> int:
+        addr = address & 0x1FFFF
+        if addr >= 0x18000:
+            addr -= 0x8000
+        return self._vram16[addr >> 1]
+    
+    def _read32_vram(self, address: int) -> int:
+        addr = address & 0x1FFFF
+        if addr >= 0x18000:
+            addr -= 0x8000
+        return self._vram32[addr >> 2]
+    
+    def _write8_vram(self, address: int, value: int) -> None:
+        addr = address & 0x1FFFF
+        if addr >= 0x18000:
+            addr -= 0x8000
+        # Solo BG VRAM acepta escrituras de 8 bits (el byte se duplica)
+        if addr < 0x10000:
+            self._vram16[addr >> 1] = value * 0x0101
+    
+    def _write16_vram(self, address: int, value: int) -> None:
+        addr = address & 0x1FFFF
+        if addr >= 0x18000:
+            addr -= 0x8000
+        self._vram16[addr >> 1] = value
+    
+    def _write32_vram(self, address: int, value: int) -> None:
+        addr = address & 0x1FFFF
+        if addr >= 0x18000:
+            addr -= 0x8000
+        self._vram32[addr >> 2] = value
+    
+    # ===== OAM (no acepta escrituras de 8 bits) =====
+    
+    def _read8_oam(self, address: int) -> int:
+        return self._oam8[address & 0x3FF]
+    
+    def _read16_oam(self, address: int) -> int:
+        return self._oam16[(address & 0x3FF) >> 1]
+    
+    def _read32_oam(self, address: int) -> int:
+        return self._oam32[(address & 0x3FF) >> 2]
+    
+    def _write16_oam(self, address: int, value: int) -> None:
+        self._oam16[(address & 0x3FF) >> 1] = value
+    
+    def _write32_oam(self, address: int, value: int) -> None:
+        self._oam32[(address & 0x3FF) >> 2] = value
+    
+    # ===== ROM =====
+    
+    def _read8_rom(self, address: int) -> int:
+        rom_addr = address & 0x01FFFFFF
+        try:
+            return self.rom_bytes[rom_addr]
+        except IndexError:
+            return (rom_addr >> 1) & 0xFF  # Open bus para ROM no mapeada
+    
+    def _read16_rom(self, address: int) -> int:
+        try:
+            return self.rom_halfwords[(address & 0x01FFFFFF) >> 1]
+        except IndexError:
+            return self._read16_bytes(address)
+    
+    def _read32_rom(self, address: int) -> int:
+        try:
+            return self.rom_words[(address & 0x01FFFFFF) >> 2]
+        except IndexError:
+            return self._read32_bytes(address)
+    
+    # ===== SRAM (bus de 8 bits) =====
+    
+    def _read8_sram(self, address: int) -> int:
+        return self._sram8[address & 0xFFFF]
+    
+    def _write8_sram(self, address: int, value: int) -> None:
+        self._sram8[address & 0xFFFF] = value
+    
+    def _write16_sram(self, address: int, value: int) -> None:
+        self._sram8[address & 0xFFFF] = value & 0xFF
+    
+    def read_block_32(self, address: int, count: int) -> list:
+        """
+        Lee `count` words consecutivas (LDM, POP)
         
-        # Caso especial para IF - escribir 1 limpia el bit
-        if address == IORegister.IF or address == IORegister.IF + 1:
-            current = int(self.io_registers[address])  # Convertir a int Python
-            self.io_registers[address] = current & (~value & 0xFF)
+        Si el rango cae entero en IWRAM/EWRAM se lee de una vez desde la
+        vista de 32 bits; si no, word a word por el bus.
+        """
+        address &= ~3
+        region = (address >> 24) & 0xFF
+        stall = self.stall_cycles
+        if count:
+            stall += self.wait_n32[region & 0xF] + (count - 1) * self.wait_s32[region & 0xF]
+        
+        if region == 0x03:
+            index = (address & 0x7FFF) >> 2
+            if index + count <= len(self._iwram32):
+                self.stall_cycles = stall
+                return self._iwram32[index:index + count].tolist()
+        elif region == 0x02:
+            index = (address & 0x3FFFF) >> 2
+            if index + count <= len(self._ewram32):
+                self.stall_cycles = stall
+                return self._ewram32[index:index + count].tolist()
+        elif 0x08 <= region <= 0x0D:
+            index = (address & 0x01FFFFFF) >> 2
+            if index + count <= len(self.rom_words):
+                self.stall_cycles = stall
+                return self.rom_words[index:index + count].tolist()
+        
+        read_32 = self.read_32
+        values = [read_32(address + i * 4) for i in range(count)]
+        self.stall_cycles = stall
+        return values
+    
+    def write_block_32(self, address: int, values: list) -> None:
+        """
+        Escribe words consecutivas (STM, PUSH)
+        
+        Si el rango cae entero en IWRAM/EWRAM se escribe de una vez en la
+        vista de 32 bits, invalidando código solo si toca páginas marcadas.
+        """
+        address &= ~3
+        region = (address >> 24) & 0xFF
+        count = len(values)
+        stall = self.stall_cycles
+        if count:
+            stall += self.wait_n32[region & 0xF] + (count - 1) * self.wait_s32[region & 0xF]
+        
+        if region == 0x03:
+            addr = address & 0x7FFF
+            words, pages = self.iwram_words, self.iwram_code_pages
+        elif region == 0x02:
+            addr = address & 0x3FFFF
+            words, pages = self.ewram_words, self.ewram_code_pages
+        else:
+            words = None
+        
+        if words is not None and (addr >> 2) + count <= len(words):
+            words[addr >> 2:(addr >> 2) + count] = values
+            if any(pages[addr >> CODE_PAGE_SHIFT:((addr + count * 4 - 1) >> CODE_PAGE_SHIFT) + 1]):
+                self.invalidate_code(address, count * 4)
+            self.stall_cycles = stall
             return
         
-        # Guardar valor normalmente
-        self.io_registers[address] = value
+        write_32 = self.write_32
+        for i, value in enumerate(values):
+            write_32(address + i * 4, value)
+        self.stall_cycles = stall
+    
+    def invalidate_code(self, address: int, length: int) -> None:
+        """Invalida el código cacheado en un rango escrito sin pasar por write_*"""
+        region = (address >> 24) & 0xFF
+        if region == 0x02:
+            pages, mask = self.ewram_code_pages, 0x3FFFF
+        elif region == 0x03:
+            pages, mask = self.iwram_code_pages, 0x7FFF
+        else:
+            return
         
-        # Handler especial
-        base_addr = address & ~1
-        if base_addr in self._io_write_handlers and base_addr != IORegister.IF:
-            val16 = int(self.io_registers[base_addr]) | (int(self.io_registers[base_addr + 1]) << 8)
-            self._io_write_handlers[base_addr](val16)
+        base = address & ~mask
+        start = (address & mask) >> CODE_PAGE_SHIFT
+        end = ((address & mask) + length - 1) >> CODE_PAGE_SHIFT
+        for page in range(start, min(end, len(pages) - 1) + 1):
+            if pages[page]:
+                self.block_cache.invalidate(base | (page << CODE_PAGE_SHIFT))
     
     # ===== Handlers específicos =====
     
@@ -429,6 +791,7 @@ class MemoryBus:
     
     def _read_timer_counter(self, timer_id: int) -> int:
         """Lee el contador actual de un timer"""
+        self.volatile_read = True
         if self.timers:
             return self.timers.get_counter(timer_id)
         base = 0x100 + timer_id * 4
@@ -442,10 +805,7 @@ class MemoryBus:
     def _write_if(self, value: int) -> None:
         """Escribe IF (acknowledge interrupts)"""
         # Escribir 1 limpia el bit
-        current = self.io_registers[IORegister.IF] | (self.io_registers[IORegister.IF + 1] << 8)
-        new_value = current & ~value
-        self.io_registers[IORegister.IF] = new_value & 0xFF
-        self.io_registers[IORegister.IF + 1] = (new_value >> 8) & 0xFF
+        self._io16[IORegister.IF >> 1] &= ~value & 0xFFFF
     
     def _write_waitcnt(self, value: int) -> None:
         """Actualiza configuración de wait states"""
@@ -475,6 +835,52 @@ class MemoryBus:
         
         # Prefetch
         self.prefetch_enabled = bool(value & (1 << 14))
+        
+        self._build_wait_tables()
+    
+    def _build_wait_tables(self) -> None:
+        """
+        Recalcula las esperas por región a partir de WAITCNT
+        
+        Los accesos de 32 bits a buses de 16 bits son dos accesos (N+S o
+        S+S). Con el prefetch del cartucho activo, los fetch secuenciales
+        de código en ROM salen del buffer sin esperas (modelo simple: el
+        buffer siempre llega a llenarse).
+        """
+        n16 = [0] * 16
+        s16 = [0] * 16
+        
+        # EWRAM: bus de 16 bits con 2 esperas
+        n16[0x2] = s16[0x2] = 2
+        
+        # Game Pak: WS0 (0x08-0x09), WS1 (0x0A-0x0B), WS2 (0x0C-0x0D)
+        for region, nonseq, seq in ((0x8, self.ws0_nonseq, self.ws0_seq),
+                                    (0xA, self.ws1_nonseq, self.ws1_seq),
+                                    (0xC, self.ws2_nonseq, self.ws2_seq)):
+            n16[region] = n16[region + 1] = nonseq
+            s16[region] = s16[region + 1] = seq
+        
+        # SRAM: bus de 8 bits
+        n16[0xE] = s16[0xE] = n16[0xF] = s16[0xF] = self.sram_wait
+        
+        # 32 bits: dos accesos en buses de 16 bits (EWRAM, paleta, VRAM, ROM)
+        n32 = list(n16)
+        s32 = list(s16)
+        for region in (0x2, 0x5, 0x6, 0x8, 0x9, 0xA, 0xB, 0xC, 0xD):
+            n32[region] = n16[region] + s16[region] + 1
+            s32[region] = 2 * s16[region] + 1
+        
+        self.wait_n16[:] = n16
+        self.wait_s16[:] = s16
+        self.wait_n32[:] = n32
+        self.wait_s32[:] = s32
+        
+        self.fetch_wait_16[:] = s16
+        self.fetch_wait_32[:] = s32
+        if self.prefetch_enabled:
+            for region in range(0x8, 0xE):
+                self.fetch_wait_16[region] = 0
+                self.fetch_wait_32[region] = 0
     
     def _write_haltcnt(self, value: int) -> None:
         """Escribe HALTCNT (halt/stop)"""
@@ -488,42 +894,55 @@ class MemoryBus:
         """Escribe control de DMA"""
         if self.dma:
             self.dma.write_control(channel, value)
+            # Un DMA inmediato debe ejecutarse antes de seguir con la CPU
+            if self.cpu:
+                self.cpu.request_exit()
     
     def _write_timer_control(self, timer_id: int, value: int) -> None:
         """Escribe control de timer"""
         if self.timers:
             self.timers.write_control(timer_id, value)
+            # El próximo overflow puede caer antes del fin del lote actual
+            if self.cpu:
+                self.cpu.request_exit()
     
-    def _write_fifo_a(self, value: int) -> None:
-        """Escribe al FIFO de sonido A"""
+    def _write_fifo_a(self, value: int, count: int = 4) -> None:
+        """Escribe `count` bytes al FIFO de sonido A"""
         if self.apu:
-            self.apu.write_fifo_a(value)
+            self.apu.write_fifo_a(value, count)
     
-    def _write_fifo_b(self, value: int) -> None:
-        """Escribe al FIFO de sonido B"""
+    def _write_fifo_b(self, value: int, count: int = 4) -> None:
+        """Escribe `count` bytes al FIFO de sonido B"""
         if self.apu:
-            self.apu.write_fifo_b(value)
+            self.apu.write_fifo_b(value, count)
     
     # ===== Interrupts =====
     
-    def request_interrupt(self, flag: int) -> None:
-        """Solicita una interrupción"""
-        current = self.io_registers[IORegister.IF] | (self.io_registers[IORegister.IF + 1] << 8)
-        new_value = current | flag
-        self.io_registers[IORegister.IF] = new_value & 0xFF
-        self.io_registers[IORegister.IF + 1] = (new_value >> 8) & 0xFF
+    def request_interrupt(self, flag: int, defer: bool = False) -> None:
+        """
+        Solicita una interrupción
         
-        self._check_interrupts()
+        Con defer=True (pedida a mitad de una instrucción) solo se marca en
+        IF y la CPU la atiende al terminar el bloque en curso.
+        """
+        self._io16[IORegister.IF >> 1] |= flag
+        
+        if defer and self.cpu:
+            self.cpu.defer_interrupt()
+        else:
+            self.check_interrupts()
     
-    def _check_interrupts(self) -> None:
+    def check_interrupts(self) -> None:
         """Verifica si hay interrupciones pendientes"""
-        ime = self.io_registers[IORegister.IME] & 1
-        ie = self.io_registers[IORegister.IE] | (self.io_registers[IORegister.IE + 1] << 8)
-        if_reg = self.io_registers[IORegister.IF] | (self.io_registers[IORegister.IF + 1] << 8)
+        io16 = self._io16
+        ime = io16[IORegister.IME >> 1] & 1
         
-        if ime and (ie & if_reg):
-            if self.cpu:
+        if (io16[IORegister.IE >> 1] & io16[IORegister.IF >> 1]) and self.cpu:
+            if ime:
                 self.cpu.trigger_irq()
+            else:
+                # Sin IME no se atiende la IRQ, pero igual despierta de HALT
+                self.cpu.wake()
     
     # ===== Input =====
     
@@ -2,8 +2,10 @@
 Gestor de guardado para diferentes tipos de memoria
 """
 import os
+import re
+import zlib
 from enum import Enum
-from typing import Optional
+from typing import Dict, Optional, Tuple
 import numpy as np
 
 
@@ -17,6 +19,60 @@ class SaveType(Enum):
     EEPROM_8K = 5    # 8KB
 
 
+# Nombre de cada librería de guardado del SDK, en orden de prioridad. En
+# la ROM aparece como "<nombre>_Vnnn" y alineado a 4 bytes
+SAVE_LIBRARIES = (
+    (b'EEPROM', SaveType.EEPROM_8K),
+    (b'SRAM_F', SaveType.SRAM),
+    (b'SRAM', SaveType.SRAM),
+    (b'FLASH1M', SaveType.FLASH_128K),
+    (b'FLASH512', SaveType.FLASH_64K),
+    (b'FLASH', SaveType.FLASH_64K),
+)
+
+_LIBRARY_VERSION = re.compile(rb'_V\d\d\d')
+
+# (tamaño, CRC32) de la ROM -> resultado de detect_save_type
+_detect_cache: Dict[Tuple[int, int], Tuple[SaveType, Optional[str]]] = {}
+
+
+def detect_save_type(rom) -> Tuple[SaveType, Optional[str]]:
+    """
+    Detecta el tipo de guardado buscando el string de la librería
+    
+    `rom` es cualquier buffer (bytes, mmap, array de NumPy). Se recorre una
+    sola vez buscando el sufijo común "_Vnnn" y solo se comprueba el nombre
+    delante de cada aparición, descartando las no alineadas. Devuelve el
+    tipo y el string exacto (p. ej. "FLASH1M_V103"), o (NONE, None).
+    El resultado se cachea por tamaño y CRC32 de la ROM.
+    """
+    with memoryview(rom) as view:
+        key = (view.nbytes, zlib.crc32(view))
+        cached = _detect_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        best = len(SAVE_LIBRARIES)
+        library = None
+        for match in _LIBRARY_VERSION.finditer(view):
+            end = match.start()
+            for priority, (name, _) in enumerate(SAVE_LIBRARIES[:best]):
+                start = end - len(name)
+                if start >= 0 and not start & 3 and view[start:end] == name:
+                    best = priority
+                    library = bytes(view[start:match.end()]).decode('ascii')
+                    break
+            if best == 0:
+                break
+    
+    if library is None:
+        result = (SaveType.NONE, None)
+    else:
+        result = (SAVE_LIBRARIES[best][1], library)
+    _detect_cache[key] = result
+    return result
+
+
 class SaveManager:
     """
     Gestor de guardado de partidas
@@ -27,6 +83,7 @@ class SaveManager:
         self.rom_path = rom_path
         self.save_path = self._get_save_path()
         self.save_type = SaveType.SRAM
+        self.library: Optional[str] = None  # Ej: "FLASH1M_V103"
         self.data = np.zeros(0x10000, dtype=np.uint8)  # 64KB max
         
         # Estado de Flash
@@ -47,20 +104,14 @@ class SaveManager:
     
     def detect_type(self, rom_data: bytes) -> SaveType:
         """Detecta el tipo de guardado analizando la ROM"""
-        rom_str = rom_data.decode('ascii', errors='ignore')
+        save_type, self.library = detect_save_type(rom_data)
         
-        if 'EEPROM_V' in rom_str:
-            # Detectar tamaño por el código del juego u otros factores
-            self.save_type = SaveType.EEPROM_8K
-        elif 'SRAM_V' in rom_str or 'SRAM_F_V' in rom_str:
-            self.save_type = SaveType.SRAM
-        elif 'FLASH1M_V' in rom_str:
-            self.save_type = SaveType.FLASH_128K
+        if save_type == SaveType.NONE:
+            save_type = SaveType.SRAM
+        elif save_type == SaveType.FLASH_128K:
             self.data = np.zeros(0x20000, dtype=np.uint8)
-        elif 'FLASH_V' in rom_str or 'FLASH512_V' in rom_str:
-            self.save_type = SaveType.FLASH_64K
-        else:
-            self.save_type = SaveType.SRAM
+        # EEPROM: el tamaño real dependería del código del juego
+        self.save_type = save_type
         
         return self.save_type
     
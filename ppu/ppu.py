@@ -8,6 +8,7 @@ from .sprites import SpriteRenderer
 
 if TYPE_CHECKING:
     from memory.memory_bus import MemoryBus
+    from hw.scheduler import Scheduler
 
 # Constantes de timing
 SCREEN_WIDTH = 240
@@ -53,6 +54,9 @@ class PPU:
         self._bg2_internal_y = 0
         self._bg3_internal_x = 0
         self._bg3_internal_y = 0
+        
+        # Planificador de eventos (None: avanzar con step())
+        self.scheduler: Optional['Scheduler'] = None
     
     def reset(self) -> None:
         """Reinicia la PPU"""
@@ -66,6 +70,9 @@ class PPU:
         self._bg2_internal_y = 0
         self._bg3_internal_x = 0
         self._bg3_internal_y = 0
+        
+        if self.scheduler is not None:
+            self._schedule_events()
     
     @property
     def dispstat(self) -> int:
@@ -105,6 +112,31 @@ class PPU:
             self.cycle_counter -= CYCLES_PER_LINE
             self._end_scanline()
     
+    # ===== Eventos del planificador =====
+    
+    def attach_scheduler(self, scheduler: 'Scheduler') -> None:
+        """Pasa a avanzar por eventos (fin de H-Draw y fin de línea)"""
+        self.scheduler = scheduler
+        self._schedule_events()
+    
+    def _schedule_events(self) -> None:
+        """Programa el próximo evento según la posición en la línea"""
+        if self.cycle_counter < HDRAW_CYCLES:
+            self.scheduler.schedule('ppu_hblank', HDRAW_CYCLES - self.cycle_counter, self._on_hblank)
+        else:
+            self.scheduler.schedule('ppu_line', CYCLES_PER_LINE - self.cycle_counter, self._on_line_end)
+    
+    def _on_hblank(self, late: int) -> None:
+        """Evento: fin de H-Draw"""
+        self.cycle_counter = HDRAW_CYCLES + late
+        self.scheduler.schedule('ppu_line', HBLANK_CYCLES - late, self._on_line_end)
+    
+    def _on_line_end(self, late: int) -> None:
+        """Evento: fin de scanline"""
+        self.cycle_counter = late
+        self._end_scanline()
+        self.scheduler.schedule('ppu_hblank', HDRAW_CYCLES - late, self._on_hblank)
+    
     def _end_scanline(self) -> None:
         """Procesa el final de una scanline"""
         # Si estamos en V-Draw, renderizar la línea
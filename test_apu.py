@@ -148,6 +148,33 @@ def test_fifo():
     
     print("\n=== Test de FIFO completado ===")
 
+def test_fifo_io_writes():
+    """Prueba que escrituras de 8, 16 y 32 bits a los FIFOs lleguen a la APU"""
+    print("\n=== Test de Escrituras a FIFO ===\n")
+    
+    mem = MemoryBus()
+    apu = APU(mem)
+    mem.apu = apu
+    
+    # 32 bits: 4 samples
+    mem.write_32(0x040000A0, 0x04030201)
+    assert list(apu.dma_a.fifo) == [1, 2, 3, 4]
+    
+    # 16 bits (parte baja y alta): 2 samples cada una
+    mem.write_16(0x040000A0, 0x0605)
+    mem.write_16(0x040000A2, 0xFF07)
+    assert list(apu.dma_a.fifo) == [1, 2, 3, 4, 5, 6, 7, -1]
+    print("✓ Escrituras de 32 y 16 bits a FIFO A")
+    
+    # 8 bits: 1 sample, en cualquier byte del registro
+    for addr, value in enumerate((0x10, 0x20, 0x30, 0x80), 0x040000A4):
+        mem.write_8(addr, value)
+    assert list(apu.dma_b.fifo) == [0x10, 0x20, 0x30, -128]
+    assert len(apu.dma_a.fifo) == 8
+    print("✓ Escrituras de 8 bits a FIFO B")
+    
+    print("\n=== Test de Escrituras a FIFO completado ===")
+
 def test_apu_integration():
     """Prueba integración de la APU"""
     print("\n=== Test de Integración APU ===\n")
@@ -309,6 +336,7 @@ if __name__ == "__main__":
     test_wave_channel()
     test_noise_channel()
     test_fifo()
+    test_fifo_io_writes()
     test_envelope()
     test_sweep()
     test_length_counter()
@@ -145,7 +145,103 @@ def test_conditional():
     
     print("\n✓ Condicionales funcionan correctamente")
 
+def test_decode_table():
+    """Prueba la tabla de decodificación ARM"""
+    mem = MemoryBus()
+    cpu = ARM7TDMI(mem)
+    arm = cpu.arm_decoder
+    
+    print("\n=== Test de Tabla de Decodificación ===\n")
+    
+    def handler(instruction):
+        index = ((instruction >> 16) & 0xFF0) | ((instruction >> 4) & 0xF)
+        return arm._decode_table[index]
+    
+    assert len(arm._decode_table) == 4096
+    assert handler(0xE3A00042) == arm._execute_dp_immediate     # MOV R0, #0x42
+    assert handler(0xE0802001) == arm._execute_dp_lsl_imm       # ADD R2, R0, R1
+    assert handler(0xE1A00251) == arm._execute_dp_asr_reg       # MOV R0, R1, ASR R2
+    assert handler(0xE1A00061) == arm._execute_dp_ror_imm       # MOV R0, R1, RRX
+    assert handler(0xE0010392) == arm._execute_multiply         # MUL R1, R2, R3
+    assert handler(0xE0843291) == arm._execute_multiply_long    # UMULL R3, R4, R1, R2
+    assert handler(0xE1020091) == arm._execute_swap             # SWP R0, R1, [R2]
+    assert handler(0xE12FFF11) == arm._execute_bx               # BX R1
+    assert handler(0xE10F0000) == arm._execute_psr_transfer     # MRS R0, CPSR
+    assert handler(0xE1D100B2) == arm._execute_halfword_transfer  # LDRH R0, [R1, #2]
+    assert handler(0xE5910000) == arm._execute_single_transfer  # LDR R0, [R1]
+    assert handler(0xE8BD000F) == arm._execute_block_transfer   # LDMIA SP!, {R0-R3}
+    assert handler(0xEA000001) == arm._execute_branch           # B
+    assert handler(0xEF000005) == arm._execute_swi              # SWI 5
+    assert handler(0xE6000010) == arm._execute_undefined        # Indefinida
+    
+    print("✓ Tabla de decodificación resuelve todos los tipos")
+    
+    # Inmediatos rotados precalculados
+    from cpu.arm_instructions import IMMEDIATE_VALUES, IMMEDIATE_CARRIES
+    assert IMMEDIATE_VALUES[0x042] == 0x42 and IMMEDIATE_CARRIES[0x042] is None
+    assert IMMEDIATE_VALUES[0x4FF] == 0xFF000000 and IMMEDIATE_CARRIES[0x4FF] is True
+    assert IMMEDIATE_VALUES[0xF02] == 0x8 and IMMEDIATE_CARRIES[0xF02] is False
+    print("✓ Tabla de inmediatos rotados")
+
+def test_block_transfer():
+    """Prueba LDM/STM en RAM (transferencia en bloque) y fuera de ella"""
+    mem = MemoryBus()
+    
+    rom_data = bytearray(256)
+    struct.pack_into('<I', rom_data, 0, 0xE92D400F)   # STMDB SP!, {R0-R3, LR}
+    struct.pack_into('<I', rom_data, 4, 0xE89D01F0)   # LDMIA SP, {R4-R8}
+    struct.pack_into('<I', rom_data, 8, 0xE889000F)   # STMIA R9, {R0-R3}
+    struct.pack_into('<I', rom_data, 12, 0xE9B90C00)  # LDMIB R9!, {R10, R11}
+    struct.pack_into('<I', rom_data, 16, 0xE88C0003)  # STMIA R12, {R0, R1}
+    mem.load_rom(bytes(rom_data))
+    
+    cpu = ARM7TDMI(mem)
+    cpu.reset()
+    reg = cpu.registers
+    
+    for i in range(4):
+        reg.set(i, 0x11111111 * (i + 1))
+    reg.lr = 0x08000100
+    reg.sp = 0x03007F00
+    reg.set(9, 0x06000000)    # VRAM: camino word a word
+    reg.set(12, 0x03000000)   # IWRAM con código cacheado
+    
+    print("\n=== Test de LDM/STM ===\n")
+    
+    cpu.step()
+    assert reg.sp == 0x03007F00 - 20
+    assert [mem.read_32(reg.sp + i * 4) for i in range(5)] == [
+        0x11111111, 0x22222222, 0x33333333, 0x44444444, 0x08000100]
+    
+    cpu.step()
+    assert [reg.get(i) for i in range(4, 9)] == [
+        0x11111111, 0x22222222, 0x33333333, 0x44444444, 0x08000100]
+    print("✓ STMDB/LDMIA sobre la pila en IWRAM")
+    
+    cpu.step()
+    cpu.step()
+    assert mem.read_32(0x0600000C) == 0x44444444
+    assert (reg.get(10), reg.get(11), reg.get(9)) == (0x22222222, 0x33333333, 0x06000008)
+    print("✓ STMIA/LDMIB en VRAM con writeback")
+    
+    # Un STM sobre código cacheado invalida el bloque
+    mem.write_32(0x03000000, 0xE3A00005)  # MOV R0, #5
+    mem.write_32(0x03000004, 0xEAFFFFFE)  # B .
+    reg.pc = 0x03000000
+    cpu.execute_block()
+    assert mem.iwram_code_pages[0]
+    
+    reg.pc = 0x08000010
+    cpu.step()
+    assert not mem.iwram_code_pages[0]
+    assert mem.read_32(0x03000000) == 5
+    print("✓ STM sobre código en IWRAM invalida la caché")
+    
+    print("\n=== Test de LDM/STM completado ===")
+
 if __name__ == "__main__":
     test_arm_instructions()
     test_branch()
-    test_conditional()
\ No newline at end of file
+    test_conditional()
+    test_decode_table()
+    test_block_transfer()
@@ -1,7 +1,13 @@
 # test_cpu.py
+import contextlib
+import io
+import json
+import random
+import struct
 from memory.memory_bus import MemoryBus
 from cpu.arm7tdmi import ARM7TDMI
 from cpu.registers import CPUMode
+from cpu.jit import JIT_THRESHOLD
 
 def test_registers():
     """Prueba el sistema de registros"""
@@ -29,8 +35,26 @@ def test_registers():
     cpu.registers.cpsr = 0x40000000  # Z=1
     assert cpu.registers.check_condition(0x0) == True   # EQ
     assert cpu.registers.check_condition(0x1) == False  # NE
+    cpu.registers.cpsr = 0x90000000  # N=1 V=1
+    assert cpu.registers.check_condition(0xC) == True   # GT
+    assert cpu.registers.check_condition(0xD) == False  # LE
+    assert cpu.registers.check_condition(0x8) == False  # HI
+    assert cpu.registers.check_condition(0xF) == True   # NV (como AL)
     print("✓ Condiciones funcionan")
     
+    # CPSR se materializa a partir de los flags separados
+    cpu.registers.cpsr = 0xA000001F  # N=1 C=1, modo System
+    assert cpu.registers.flag_n and cpu.registers.flag_c
+    assert not cpu.registers.flag_z and not cpu.registers.flag_v
+    cpu.registers.flag_v = True
+    assert cpu.registers.cpsr == 0xB000001F
+    cpu.registers.switch_mode(CPUMode.SUPERVISOR)
+    assert cpu.registers.spsr == 0xB000001F
+    cpu.registers.flag_n = False
+    cpu.registers.restore_cpsr_from_spsr()
+    assert cpu.registers.flag_n and cpu.registers.mode == CPUMode.SYSTEM
+    print("✓ CPSR/SPSR con flags separados")
+    
     # Test cambio de modo
     print(f"\nModo inicial: {cpu.registers.mode:#x}")
     cpu.registers.switch_mode(CPUMode.IRQ)
@@ -52,6 +76,22 @@ def test_registers():
     cpu.registers.mode = CPUMode.IRQ
     assert cpu.registers.sp == 0x03007FA0
     print("✓ Bancos de registros funcionan")
+
+    # R8-R12 solo se bankean en FIQ; los cambios vía CPSR/SPSR también intercambian
+    cpu.registers.mode = CPUMode.SYSTEM
+    cpu.registers.set(8, 0x88888888)
+    cpu.registers.switch_mode(CPUMode.FIQ)
+    assert cpu.registers.get(8) == 0
+    cpu.registers.set(8, 0xF1F1F1F1)
+    cpu.registers.sp = 0x03007E00
+    cpu.registers.restore_cpsr_from_spsr()  # Vuelve a System
+    assert cpu.registers.mode == CPUMode.SYSTEM
+    assert cpu.registers.get(8) == 0x88888888
+    assert cpu.registers.sp == 0x03007F00
+    cpu.registers.cpsr = (cpu.registers.cpsr & ~0x1F) | CPUMode.FIQ
+    assert cpu.registers.get(8) == 0xF1F1F1F1
+    assert cpu.registers.sp == 0x03007E00
+    print("✓ Bancos FIQ e intercambio por CPSR/SPSR")
     
     # Mostrar estado
     cpu.registers.mode = CPUMode.SYSTEM
@@ -59,5 +99,579 @@ def test_registers():
     
     print("\n=== Todas las pruebas pasaron! ===")
 
+def test_block_cache():
+    """Prueba la caché de bloques básicos"""
+    mem = MemoryBus()
+    
+    rom_data = bytearray(256)
+    struct.pack_into('<H', rom_data, 0, 0x2001)  # MOV R0, #1
+    struct.pack_into('<H', rom_data, 2, 0x3002)  # ADD R0, #2
+    struct.pack_into('<H', rom_data, 4, 0x1C41)  # ADD R1, R0, #1
+    struct.pack_into('<H', rom_data, 6, 0xE7FE)  # B . (fin de bloque)
+    mem.load_rom(bytes(rom_data))
+    
+    cpu = ARM7TDMI(mem)
+    cpu.reset()
+    cpu.registers.thumb_mode = True
+    
+    print("\n=== Test de Caché de Bloques ===\n")
+    
+    cycles = cpu.execute_block()
+    assert cpu.registers.get(0) == 3
+    assert cpu.registers.get(1) == 4
+    assert cpu.registers.pc == 0x08000006  # B . vuelve a sí mismo
+    # 4 fetch desde ROM con WAITCNT por defecto: N (4 esperas) + 3 S (2 cada uno)
+    assert cycles == 1 + 1 + 1 + 3 + 4 + 3 * 2
+    assert len(cpu.block_cache) == 1
+    print("✓ Bloque THUMB ejecutado completo")
+    
+    # Código en IWRAM: escribirlo debe invalidar el bloque
+    mem.write_16(0x03000000, 0x2005)  # MOV R0, #5
+    mem.write_16(0x03000002, 0xE7FE)  # B .
+    cpu.registers.pc = 0x03000000
+    cpu.execute_block()
+    assert cpu.registers.get(0) == 5
+    
+    assert mem.iwram_code_pages[0] and not mem.iwram_code_pages[1]
+    mem.write_16(0x03000100, 0x1234)  # Página de datos: no invalida
+    assert len(cpu.block_cache) == 2
+    
+    mem.write_16(0x03000000, 0x2007)  # MOV R0, #7
+    assert not mem.iwram_code_pages[0]
+    cpu.registers.pc = 0x03000000
+    cpu.execute_block()
+    assert cpu.registers.get(0) == 7
+    print("✓ Escritura en IWRAM invalida el bloque")
+    
+    # El mirror de IWRAM marca la misma página
+    mem.write_16(0x03008000, 0x2009)  # MOV R0, #9
+    cpu.registers.pc = 0x03000000
+    cpu.execute_block()
+    assert cpu.registers.get(0) == 9
+    
+    # Las escrituras en bloque (BIOS HLE) también invalidan
+    assert mem.iwram_code_pages[0]
+    mem.invalidate_code(0x030000F0, 0x20)
+    assert not mem.iwram_code_pages[0]
+    assert len(cpu.block_cache) == 1
+    print("✓ Bitmap de páginas con código en RAM")
+
+def _random_thumb_block(rng):
+    """Genera un bloque THUMB aleatorio que termina en un salto condicional"""
+    code = []
+    for _ in range(24):
+        kind = rng.randrange(9)
+        rd = rng.randrange(7)
+        rs = rng.randrange(8)
+        if kind == 0:    # Format 1
+            code.append((rng.randrange(3) << 11) | (rng.randrange(32) << 6) | (rs << 3) | rd)
+        elif kind == 1:  # Format 2
+            code.append(0x1800 | (rng.randrange(4) << 9) | (rng.randrange(8) << 6) | (rs << 3) | rd)
+        elif kind == 2:  # Format 3
+            code.append(0x2000 | (rng.randrange(4) << 11) | (rd << 8) | rng.randrange(256))
+        elif kind == 3:  # Format 4 (incluye shifts por registro → fallback)
+            code.append(0x4000 | (rng.randrange(16) << 6) | (rs << 3) | rd)
+        elif kind == 4:  # Format 5 con Rd bajo y Rs alto (incluye PC)
+            code.append(0x4400 | (rng.randrange(3) << 8) | (1 << 6) | (rs << 3) | rd)
+        elif kind == 5:  # Format 9 relativo a R7
+            load = rng.randrange(2)
+            code.append(0x6000 | (rng.randrange(2) << 12) | (load << 11) |
+                        (rng.randrange(32) << 6) | (7 << 3) | (rd if load else rs))
+        elif kind == 6:  # Format 10 relativo a R7
+            code.append(0x8000 | (rng.randrange(2) << 11) | (rng.randrange(32) << 6) | (7 << 3) | rd)
+        elif kind == 7:  # Format 11
+            code.append(0x9000 | (rng.randrange(2) << 11) | (rd << 8) | rng.randrange(256))
+        else:            # Format 12/13
+            if rng.randrange(2):
+                code.append(0xA000 | (rng.randrange(2) << 11) | (rd << 8) | rng.randrange(256))
+            else:
+                code.append(0xB000 | (rng.randrange(2) << 7) | rng.randrange(128))
+    code.append(0xD000 | (rng.randrange(14) << 8) | rng.randrange(256))
+    return code
+
+
+def _random_arm_block(rng):
+    """Genera un bloque ARM aleatorio que termina en un salto condicional"""
+    code = []
+    for _ in range(24):
+        cond = rng.choice([0xE, 0xE, rng.randrange(15)])
+        rd = rng.randrange(7)
+        if rng.randrange(4) == 0:
+            load = rng.randrange(2)
+            code.append((cond << 28) | (1 << 26) | (1 << 24) | (rng.randrange(2) << 23) |
+                        (rng.randrange(2) << 22) | (load << 20) | (7 << 16) |
+                        ((rd if load else rng.randrange(8)) << 12) | (0x400 + rng.randrange(0x400)))
+            continue
+        opcode = rng.randrange(16)
+        s_bit = 1 if 0x8 <= opcode <= 0xB else rng.randrange(2)
+        rn = rng.choice([rng.randrange(8), 15])
+        choice = rng.randrange(3)
+        if choice == 0:
+            operand = (1 << 25) | (rng.randrange(16) << 8) | rng.randrange(256)
+        elif choice == 1:
+            operand = (rng.randrange(32) << 7) | (rng.randrange(4) << 5) | rng.randrange(8)
+        else:  # Shift por registro → fallback
+            operand = (rng.randrange(8) << 8) | (rng.randrange(4) << 5) | (1 << 4) | rng.randrange(8)
+        code.append((cond << 28) | (opcode << 21) | (s_bit << 20) | (rn << 16) | (rd << 12) | operand)
+    code.append((rng.randrange(15) << 28) | (0xA << 24) | rng.randrange(0x1000000))
+    return code
+
+
+def _run_block(code, thumb, seed, compiled):
+    """Ejecuta el bloque en IWRAM con el intérprete o con el JIT"""
+    mem = MemoryBus()
+    cpu = ARM7TDMI(mem)
+    cpu.reset()
+    reg = cpu.registers
+    reg.switch_mode(CPUMode.SYSTEM)
+    reg.thumb_mode = thumb
+    
+    size = 2 if thumb else 4
+    for i, word in enumerate(code):
+        if thumb:
+            mem.write_16(0x03000000 + i * 2, word)
+        else:
+            mem.write_32(0x03000000 + i * 4, word)
+    
+    rng = random.Random(seed)
+    for i in range(7):
+        reg.set(i, rng.choice([0, 1, 0x7FFFFFFF, 0x80000000, 0xFFFFFFFF, rng.getrandbits(32)]))
+    reg.set(7, 0x03001000)
+    reg.set(13, 0x03004000)
+    reg.set(14, rng.getrandbits(32))
+    reg.flag_n, reg.flag_z, reg.flag_c, reg.flag_v = (rng.randrange(2) == 1 for _ in range(4))
+    for offset in range(0, 0x2000, 4):
+        mem.write_32(0x03001000 + offset, rng.getrandbits(32))
+    reg.pc = 0x03000000
+    
+    if compiled:
+        block = cpu.block_cache.lookup(0x03000000, thumb)
+        block.compiled = cpu.jit.compile(block)
+        assert block.compiled
+    else:
+        cpu.jit = None
+    
+    cycles = cpu.execute_block()
+    state = [reg.get(i) for i in range(16)]
+    state += [reg.flag_n, reg.flag_z, reg.flag_c, reg.flag_v, cycles]
+    return state, bytes(mem.iwram)
+
+def test_jit():
+    """Compara el JIT con el intérprete en bloques aleatorios"""
+    print("\n=== Test de JIT ===\n")
+    
+    rng = random.Random(1234)
+    for thumb in (True, False):
+        for seed in range(40):
+            code = _random_thumb_block(rng) if thumb else _random_arm_block(rng)
+            expected = _run_block(code, thumb, seed, compiled=False)
+            actual = _run_block(code, thumb, seed, compiled=True)
+            assert actual[0] == expected[0], (thumb, seed, actual[0], expected[0])
+            assert actual[1] == expected[1], (thumb, seed)
+        print(f"✓ JIT {'THUMB' if thumb else 'ARM'} equivale al intérprete")
+    
+    # Un bloque caliente se compila solo
+    mem = MemoryBus()
+    cpu = ARM7TDMI(mem)
+    cpu.reset()
+    cpu.registers.thumb_mode = True
+    mem.write_16(0x03000000, 0x3001)  # ADD R0, #1
+    mem.write_16(0x03000002, 0xE7FD)  # B -6 (vuelve al ADD)
+    cpu.registers.pc = 0x03000000
+    for _ in range(100):
+        cpu.execute_block()
+    assert cpu.registers.get(0) == 100
+    assert cpu.block_cache.lookup(0x03000000, True).compiled
+    print("✓ Bloque caliente compilado")
+
+def test_bios_hle():
+    """Prueba la emulación de alto nivel de SWIs del BIOS"""
+    print("\n=== Test de BIOS HLE ===\n")
+    
+    mem = MemoryBus()
+    rom_data = bytearray(0x400)
+    mem.load_rom(rom_data)  # Sin copia: el test parchea la ROM en su sitio
+    cpu = ARM7TDMI(mem)
+    cpu.reset()
+    cpu.registers.thumb_mode = True
+    reg = cpu.registers
+    
+    def swi(number, *args):
+        for i, value in enumerate(args):
+            reg.set(i, value & 0xFFFFFFFF)
+        mem.rom[0] = number
+        mem.rom[1] = 0xDF  # SWI (THUMB)
+        reg.pc = 0x08000000
+        cpu.step()
+        assert reg.pc == 0x08000002  # No vectoriza al BIOS
+    
+    # Aritmética
+    swi(0x06, -7, 2)
+    assert (reg.get(0), reg.get(1), reg.get(3)) == (0xFFFFFFFD, 0xFFFFFFFF, 3)
+    swi(0x07, 2, 7)
+    assert reg.get(0) == 3 and reg.get(1) == 1
+    swi(0x08, 0x10000)
+    assert reg.get(0) == 0x100
+    swi(0x0A, 0, 0x4000)
+    assert reg.get(0) == 0x4000
+    print("✓ Div, DivArm, Sqrt y ArcTan2")
+    
+    # CpuSet: relleno de 32 bits y copia de 16 bits
+    mem.write_32(0x02000000, 0x11223344)
+    swi(0x0B, 0x02000000, 0x02000100, (1 << 26) | (1 << 24) | 4)
+    assert all(mem.read_32(0x02000100 + i * 4) == 0x11223344 for i in range(4))
+    assert mem.read_32(0x02000110) == 0
+    swi(0x0B, 0x02000100, 0x03000000, 3)
+    assert mem.read_16(0x03000004) == 0x3344 and mem.read_16(0x03000006) == 0
+    
+    # CpuFastSet: la cantidad se redondea a 8 words
+    swi(0x0C, 0x02000100, 0x06000000, 2)
+    assert mem.read_32(0x0600000C) == 0x11223344
+    assert mem.read_32(0x06000010) == 0
+    print("✓ CpuSet y CpuFastSet")
+    
+    # Descompresión desde IWRAM
+    def uncompress(number, data):
+        for i, byte in enumerate(data):
+            mem.iwram[0x100 + i] = byte
+        mem.ewram[0x1000:0x1100] = 0
+        swi(number, 0x03000100, 0x02001000)
+        size = data[1] | (data[2] << 8)
+        return bytes(mem.ewram[0x1000:0x1000 + size])
+    
+    lz77 = bytes([0x10, 12, 0, 0, 0x10, ord('A'), ord('B'), ord('C'), 0x60, 0x02])
+    assert uncompress(0x11, lz77) == b"ABC" * 4
+    rle = bytes([0x30, 8, 0, 0, 0x82, ord('X'), 0x02, ord('A'), ord('B'), ord('C')])
+    assert uncompress(0x14, rle) == b"XXXXXABC"
+    huffman = bytes([0x28, 4, 0, 0, 0x01, 0xC0, ord('A'), ord('B'), 0x00, 0x00, 0x00, 0x60])
+    assert uncompress(0x13, huffman) == b"ABBA"
+    huffman4 = bytes([0x24, 4, 0, 0, 0x01, 0xC0, 0x01, 0x02, 0x00, 0x00, 0x00, 0x63])
+    assert uncompress(0x13, huffman4) == bytes([0x21, 0x12, 0x11, 0x22])
+    print("✓ LZ77, RL y Huffman")
+    
+    # ObjAffineSet: escala 1, ángulo 90° (0x4000)
+    mem.write_16(0x02000200, 0x0100)
+    mem.write_16(0x02000202, 0x0100)
+    mem.write_16(0x02000204, 0x4000)
+    swi(0x0F, 0x02000200, 0x02000300, 1, 2)
+    params = [mem.read_16(0x02000300 + i * 2) for i in range(4)]
+    assert params == [0x0000, 0xFF00, 0x0100, 0x0000]
+    print("✓ ObjAffineSet")
+    
+    # Sin HLE se vectoriza al BIOS
+    cpu.bios_hle = None
+    mem.rom[0], mem.rom[1] = 0x06, 0xDF
+    reg.pc = 0x08000000
+    cpu.step()
+    assert reg.pc == 0x08 and reg.mode == CPUMode.SUPERVISOR
+    assert ARM7TDMI(MemoryBus(), bios_hle=False).bios_hle is None
+    print("✓ Sin HLE el SWI entra al BIOS")
+    
+    # Con una imagen de BIOS cargada la HLE se aparta, salvo que se fuerce
+    for forced in (None, True):
+        mem = MemoryBus()
+        mem.load_rom(rom_data)
+        mem.load_bios(bytes([0x01]) * 0x4000)
+        cpu = ARM7TDMI(mem, bios_hle=forced)
+        cpu.reset()
+        reg = cpu.registers
+        reg.thumb_mode = True
+        reg.pc = 0x08000000
+        cpu.step()
+        if forced:
+            assert reg.pc == 0x08000002
+        else:
+            assert reg.pc == 0x08 and reg.mode == CPUMode.SUPERVISOR
+    print("✓ HLE automática solo sin BIOS, o forzada")
+    
+    print("\n=== Test de BIOS HLE completado ===")
+
+def test_irq_return():
+    """Prueba que una IRQ vuelve a la instrucción interrumpida"""
+    print("\n=== Test de Retorno de IRQ ===\n")
+    
+    mem = MemoryBus()
+    rom = bytearray(0x200)
+    struct.pack_into('<II', rom, 0x000, 0xE2800001, 0xEAFFFFFE)  # ADD R0, R0, #1; B .
+    struct.pack_into('<HH', rom, 0x100, 0x3001, 0xE7FE)          # ADD R0, #1; B .
+    mem.load_rom(bytes(rom))
+    # Handler del usuario: BX LR (el dispatcher del BIOS vuelve con SUBS PC, LR, #4)
+    mem.write_32(0x03000000, 0xE12FFF1E)
+    mem.write_32(0x03FFFFFC, 0x03000000)
+    
+    cpu = ARM7TDMI(mem)
+    reg = cpu.registers
+    
+    for start, thumb in ((0x08000000, False), (0x08000100, True)):
+        cpu.reset()
+        reg.thumb_mode = thumb
+        reg.pc = start
+        reg.irq_disabled = False
+        size = 2 if thumb else 4
+        
+        cpu.step()  # ADD con efecto visible justo antes de la IRQ
+        assert reg.get(0) == 1
+        cpu.trigger_irq()
+        assert reg.mode == CPUMode.IRQ
+        assert reg.lr == start + size + 4
+        
+        for _ in range(20):
+            cpu.step()
+            if reg.mode != CPUMode.IRQ:
+                break
+        
+        assert reg.pc == start + size
+        assert reg.thumb_mode == thumb
+        assert reg.get(0) == 1, "la IRQ volvió antes y repitió el ADD"
+        mode = 'THUMB' if thumb else 'ARM'
+        print(f"✓ {mode}: LR_irq = {start + size + 4:08X}, vuelve a {reg.pc:08X}")
+    
+    print("\n=== Test de Retorno de IRQ completado ===")
+
+def _early_exit_cpu():
+    """CPU con un bloque ARM de 9 instrucciones que sale en la cuarta (HALTCNT)"""
+    mem = MemoryBus()
+    rom = bytearray(0x100)
+    code = [
+        0xE3A01301,  # MOV  R1, #0x04000000
+        0xE2811C03,  # ADD  R1, R1, #0x300
+        0xE3A02000,  # MOV  R2, #0
+        0xE5C12001,  # STRB R2, [R1, #1]     (HALTCNT: sale del bloque)
+    ] + [0xE1A00000] * 4 + [0xEAFFFFFE]  # NOPs que no llegan a ejecutarse; B .
+    for i, word in enumerate(code):
+        struct.pack_into('<I', rom, i * 4, word)
+    mem.load_rom(bytes(rom))
+    
+    cpu = ARM7TDMI(mem)
+    mem.cpu = cpu
+    cpu.reset()
+    return mem, cpu
+
+def test_early_exit_cycles():
+    """Prueba que un bloque que sale antes solo paga el fetch de lo ejecutado"""
+    print("\n=== Test de Salida Temprana de Bloque ===\n")
+    
+    mem, cpu = _early_exit_cpu()
+    
+    # 5 ciclos de instrucciones + fetch N de la primera + S de las otras 3
+    expected = 5 + mem.wait_n32[0x8] + 3 * mem.fetch_wait_32[0x8]
+    for _ in range(JIT_THRESHOLD + 2):
+        cpu.reset()
+        cycles = cpu.execute_block()
+        assert cpu.halted
+        assert cycles == expected, cycles
+    
+    block = cpu.block_cache.lookup(0x08000000, False)
+    assert block.compiled and len(block.entries) == 9
+    print(f"✓ {cycles} ciclos por 4 de 9 instrucciones (intérprete y JIT)")
+    
+    print("\n=== Test de Salida Temprana de Bloque completado ===")
+
+def test_profiler():
+    """Prueba el profiler de ejecución"""
+    print("\n=== Test de Profiler ===\n")
+    
+    mem = MemoryBus()
+    rom_data = bytearray(256)
+    struct.pack_into('<H', rom_data, 0, 0x2000)  # MOV R0, #0
+    struct.pack_into('<H', rom_data, 2, 0x3001)  # loop: ADD R0, #1
+    struct.pack_into('<H', rom_data, 4, 0x2810)  # CMP R0, #16
+    struct.pack_into('<H', rom_data, 6, 0xD1FC)  # BNE loop
+    struct.pack_into('<H', rom_data, 8, 0xE7FE)  # B .
+    mem.load_rom(bytes(rom_data))
+    
+    cpu = ARM7TDMI(mem)
+    cpu.reset()
+    cpu.registers.thumb_mode = True
+    cpu.idle_skip = False
+    
+    # Desactivado: la CPU usa sus métodos de clase
+    assert 'execute_block' not in vars(cpu)
+    
+    profiler = cpu.enable_profiler()
+    assert 'execute_block' in vars(cpu)
+    for _ in range(20):
+        cpu.execute_block()
+    cpu.disable_profiler()
+    assert 'execute_block' not in vars(cpu)
+    assert cpu.registers.get(0) == 16
+    print("✓ attach/detach del profiler")
+    
+    # Bloques: entrada (1 vez), cuerpo del bucle (15 + 1 vez) y B .
+    assert profiler.blocks[(0x08000000, True)][1] == 1
+    assert profiler.blocks[(0x08000002, True)][1] == 15
+    assert profiler.total_cycles() == cpu.cycles
+    regions = profiler.by_region()
+    assert list(regions) == ['ROM']
+    assert regions['ROM'][1] == cpu.cycles
+    print("✓ Conteo por bloque y por región")
+    
+    loops = profiler.hot_loops()
+    assert loops[0]['start'] == 0x08000002 and loops[0]['end'] == 0x08000006
+    assert loops[0]['iterations'] == 16  # BNE ejecutado 16 veces
+    report = profiler.report()
+    assert '08000002-08000006' in report
+    print(report)
+    
+    data = json.loads(json.dumps(profiler.to_dict()))
+    assert data['blocks']['08000002T']['executions'] == 15
+    assert data['total_cycles'] == cpu.cycles
+    print("✓ Reporte y exportación JSON")
+    
+    # Un bloque que sale antes cuenta solo las instrucciones ejecutadas
+    _, cpu = _early_exit_cpu()
+    profiler = cpu.enable_profiler()
+    runs = JIT_THRESHOLD + 2
+    for _ in range(runs):
+        cpu.reset()
+        cpu.execute_block()
+    assert cpu.block_cache.lookup(0x08000000, False).compiled
+    assert profiler.blocks[(0x08000000, False)][1:3] == [runs, runs * 4]
+    cpu.disable_profiler()
+    print("✓ Salida temprana contada (intérprete y JIT)")
+    
+    print("\n=== Test de Profiler completado ===")
+
+def test_trace():
+    """Prueba el trace circular de ejecución"""
+    print("\n=== Test de Trace ===\n")
+    
+    mem = MemoryBus()
+    rom_data = bytearray(256)
+    struct.pack_into('<H', rom_data, 0, 0x2000)  # MOV R0, #0
+    struct.pack_into('<H', rom_data, 2, 0x3001)  # loop: ADD R0, #1
+    struct.pack_into('<H', rom_data, 4, 0x2810)  # CMP R0, #16
+    struct.pack_into('<H', rom_data, 6, 0xD1FC)  # BNE loop
+    struct.pack_into('<H', rom_data, 8, 0xDE00)  # (indefinida)
+    mem.load_rom(bytes(rom_data))
+    
+    cpu = ARM7TDMI(mem)
+    cpu.reset()
+    cpu.registers.thumb_mode = True
+    
+    trace = cpu.enable_trace(8)
+    for _ in range(16):
+        cpu.execute_block()
+    assert cpu.registers.get(0) == 16
+    
+    # Solo quedan los últimos 8 bloques: 8 vueltas de 3 instrucciones
+    assert trace.total == 16
+    entries = trace.entries()
+    assert len(entries) == 8 * 3
+    assert [pc for pc, _, _ in entries[-3:]] == [0x08000002, 0x08000004, 0x08000006]
+    assert entries[-1][1] == 0xD1FC
+    assert entries[-1][2] & (1 << 5)  # CPSR con bit T
+    print("✓ Buffer circular de bloques")
+    
+    # Instrucción suelta y volcado al llegar a una indefinida
+    cpu.step()
+    assert trace.entries()[-1][:2] == (0x08000008, 0xDE00)
+    dump = trace.dump(4)
+    assert dump.splitlines()[-1].startswith("08000008: DE00")
+    print(dump)
+    print("✓ Volcado del trace")
+    
+    cpu.disable_trace()
+    assert cpu.trace is None
+    
+    # Un bloque que sale antes se registra hasta la instrucción que salió,
+    # también compilado
+    _, cpu = _early_exit_cpu()
+    trace = cpu.enable_trace(1)
+    for _ in range(JIT_THRESHOLD + 2):
+        cpu.reset()
+        cpu.execute_block()
+        assert [pc for pc, _, _ in trace.entries()] == [0x08000000 + i * 4 for i in range(4)]
+    assert cpu.block_cache.lookup(0x08000000, False).compiled
+    print("✓ Salida temprana registrada (intérprete y JIT)")
+    
+    # El volcado por una instrucción indefinida incluye el bloque en curso
+    mem = MemoryBus()
+    rom = bytearray(0x100)
+    code = [0xE3A00001, 0xE3A01002, 0xE3A02003, 0xE7F000F0]  # MOV x3; indefinida
+    for i, word in enumerate(code):
+        struct.pack_into('<I', rom, i * 4, word)
+    mem.load_rom(bytes(rom))
+    cpu = ARM7TDMI(mem)
+    trace = cpu.enable_trace()
+    for _ in range(JIT_THRESHOLD + 2):
+        cpu.reset()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            cpu.execute_block()
+        lines = output.getvalue().splitlines()
+        assert lines[0] == "Instrucción indefinida E7F000F0 en 0800000C"
+        assert [line[:8] for line in lines[1:]][-4:] == [
+            f"{0x08000000 + i * 4:08X}" for i in range(4)]
+        assert lines[-1].startswith("0800000C: E7F000F0")
+    assert cpu.block_cache.lookup(0x08000000, False).compiled
+    assert len(trace.entries()) == (JIT_THRESHOLD + 2) * 4
+    print("✓ Volcado con el bloque en curso (intérprete y JIT)")
+    
+    print("\n=== Test de Trace completado ===")
+
+def test_disassembler():
+    """Prueba el desensamblador ARM/THUMB"""
+    print("\n=== Test de Desensamblador ===\n")
+    
+    mem = MemoryBus()
+    rom_data = bytearray(0x100)
+    arm_code = [
+        (0xE3A00001, "MOV R0, #0x1"),
+        (0xE0910312, "ADDS R0, R1, R2, LSL R3"),
+        (0xE59F1004, "LDR R1, [PC, #0x4] ; =0x08000014"),
+        (0xE92D4030, "STMDB SP!, {R4, R5, LR}"),
+        (0x0AFFFFFC, "BEQ 0x08000008"),
+        (0xE12FFF1E, "BX LR"),
+        (0xE129F000, "MSR CPSR_fc, R0"),
+        (0xE0C10392, "SMULL R0, R1, R2, R3"),
+    ]
+    thumb_code = [
+        (0x1DC8, "ADD R0, R1, #7"),
+        (0x4348, "MUL R0, R1"),
+        (0xB5F0, "PUSH {R4-R7, LR}"),
+        (0xD1FC, "BNE 0x08000082"),
+        (0xF000, "BL 0x08000090"),
+        (0xF802, "BL (2ª mitad) #0x4"),
+    ]
+    for i, (opcode, _) in enumerate(arm_code):
+        struct.pack_into('<I', rom_data, i * 4, opcode)
+    for i, (opcode, _) in enumerate(thumb_code):
+        struct.pack_into('<H', rom_data, 0x80 + i * 2, opcode)
+    mem.load_rom(bytes(rom_data))
+    
+    cpu = ARM7TDMI(mem)
+    disassembler = cpu.disassembler
+    
+    for i, (opcode, text) in enumerate(arm_code):
+        assert disassembler.disassemble(0x08000000 + i * 4, opcode, False) == text
+    print("✓ Instrucciones ARM")
+    
+    # En bloque desde ROM (el BL se lee con su segunda mitad)
+    listing = disassembler.disassemble_range(0x08000080, 0x08000080 + 2 * len(thumb_code), True)
+    assert [text for _, _, text in listing] == [text for _, text in thumb_code]
+    assert disassembler.disassemble_at(0x08000088, True) == "BL 0x08000090"
+    for address, opcode, text in listing:
+        print(f"  {address:08X}: {opcode:04X}  {text}")
+    print("✓ Instrucciones THUMB y rango de ROM")
+    
+    # Memoizado por (dirección, opcode): los saltos dependen de la dirección
+    first = disassembler.disassemble(0x08000010, 0xEAFFFFFE, False)
+    assert first == "B 0x08000010"
+    assert disassembler.disassemble(0x08000010, 0xEAFFFFFE, False) is first
+    assert disassembler.disassemble(0x08000020, 0xEAFFFFFE, False) == "B 0x08000020"
+    assert mem.stall_cycles == 0
+    print("✓ Caché por dirección")
+    
+    print("\n=== Test de Desensamblador completado ===")
+
 if __name__ == "__main__":
-    test_registers()
\ No newline at end of file
+    test_registers()
+    test_block_cache()
+    test_jit()
+    test_bios_hle()
+    test_irq_return()
+    test_early_exit_cycles()
+    test_profiler()
+    test_trace()
+    test_disassembler()
\ No newline at end of file
@@ -1,7 +1,11 @@
 # test_io.py
+import struct
+from gba import GBA
 from memory.memory_bus import MemoryBus
 from hw.timers import TimerController, Timer
 from hw.dma import DMAController, DMAChannel, DMAStartTiming
+from hw.scheduler import Scheduler
+from cpu.registers import CPUMode
 
 def test_timer_basic():
     """Prueba funcionamiento básico de timer"""
@@ -264,6 +268,327 @@ def test_dma_vblank_trigger():
     
     print("\n=== Test de DMA V-Blank completado ===")
 
+def test_run_cycles():
+    """Prueba la ejecución por lotes hasta el próximo evento"""
+    print("\n=== Test de run_cycles ===\n")
+    
+    gba = GBA()
+    rom = bytearray(0x200)
+    struct.pack_into('<I', rom, 0, 0xEAFFFFFE)  # B .
+    gba.memory.load_rom(bytes(rom))
+    gba.reset()
+    
+    executed = gba.run_cycles(5000)
+    assert executed >= 5000
+    assert gba.total_cycles == executed
+    assert gba.ppu.vcount == executed // 1232
+    print(f"✓ {executed} ciclos en lotes, PPU en línea {gba.ppu.vcount}")
+    
+    # El overflow de un timer acota el lote
+    gba.timers.write_reload(0, 0xFF00)
+    gba.memory.write_16(0x04000102, 0x00C0)  # Enable + IRQ
+    assert gba.scheduler.cycles_until_next() <= 0x100
+    print("✓ Overflow de timer como próximo evento")
+    
+    # Un DMA inmediato corta el lote de CPU y se ejecuta antes de seguir
+    gba.memory.write_32(0x02000000, 0xCAFEBABE)
+    channel = gba.dma.channels[3]
+    channel.write_source_high(0x0200)
+    channel.write_dest_low(0x0100)
+    channel.write_dest_high(0x0200)
+    channel.write_count(1)
+    gba.memory.write_16(0x040000DE, 0x8400)      # Enable, 32-bit, inmediato
+    assert gba.cpu._exit_requested
+    gba.run_cycles(100)
+    assert gba.memory.read_32(0x02000100) == 0xCAFEBABE
+    print("✓ DMA inmediato interrumpe el lote")
+    
+    print("\n=== Test de run_cycles completado ===")
+
+def test_scheduler():
+    """Prueba el planificador central de eventos"""
+    print("\n=== Test de Scheduler ===\n")
+    
+    scheduler = Scheduler()
+    fired = []
+    scheduler.schedule('b', 20, lambda late: fired.append(('b', late)))
+    scheduler.schedule('a', 10, lambda late: fired.append(('a', late)))
+    scheduler.schedule('c', 30, lambda late: fired.append(('c', late)))
+    assert scheduler.cycles_until_next() == 10
+    
+    # Reprogramar reemplaza, cancelar descarta
+    scheduler.schedule('b', 15, lambda late: fired.append(('b', late)))
+    scheduler.cancel('c')
+    assert not scheduler.is_scheduled('c')
+    
+    scheduler.advance(18)
+    assert fired == [('a', 8), ('b', 3)]
+    assert scheduler.cycles_until_next() > 1000
+    print("✓ Eventos en orden, con retraso, reemplazo y cancelación")
+    
+    # El timer por eventos coincide con el timer ciclo a ciclo
+    gba = GBA()
+    reference = TimerController(MemoryBus())
+    for timers in (gba.timers, reference):
+        timers.write_reload(0, 0xFFF0)
+        timers.write_control(0, 0x0081)  # Enable, prescaler 64
+    
+    for _ in range(3000):
+        reference.step(1)
+    gba.scheduler.advance(3000)
+    assert gba.timers.read_counter(0) == reference.read_counter(0)
+    print(f"✓ Timer por eventos: counter {gba.timers.read_counter(0):04X}")
+    
+    print("\n=== Test de Scheduler completado ===")
+
+def test_idle_loop():
+    """Prueba el salto de tiempo en bucles de espera"""
+    print("\n=== Test de Bucles de Espera ===\n")
+    
+    program = [
+        0xE3A01301,  # MOV  R1, #0x04000000
+        0xE1D100B6,  # LDRH R0, [R1, #6]      (VCOUNT)
+        0xE35000A0,  # CMP  R0, #160
+        0x1AFFFFFC,  # BNE  loop
+        0xE2822001,  # ADD  R2, R2, #1
+        0xEAFFFFFE,  # B    .
+    ]
+    rom = bytearray(0x200)
+    for i, word in enumerate(program):
+        struct.pack_into('<I', rom, i * 4, word)
+    
+    results = []
+    for idle_skip in (False, True):
+        gba = GBA()
+        gba.memory.load_rom(bytes(rom))
+        gba.reset()
+        gba.cpu.idle_skip = idle_skip
+        gba.run_frame()
+        gba.run_cycles(1000)
+        
+        regs = gba.cpu.registers
+        results.append((regs.get(0), regs.get(2), regs.pc, gba.ppu.vcount))
+        print(f"  idle_skip={idle_skip}: {gba.cpu.idle_cycles_skipped} ciclos saltados")
+    
+    assert results[0] == results[1]
+    assert results[1][0] == 160 and results[1][1] == 1
+    assert gba.cpu.idle_cycles_skipped > 160 * 1232 * 9 // 10
+    print("✓ Espera de VCOUNT con el mismo resultado")
+    
+    # Un bucle que lee el contador de un timer no es un bucle de espera
+    program = [
+        0xE3A01301,  # MOV  R1, #0x04000000
+        0xE2811C01,  # ADD  R1, R1, #0x100
+        0xE1D100B0,  # LDRH R0, [R1]          (TM0CNT_L)
+        0xEAFFFFFD,  # B    loop
+    ]
+    for i, word in enumerate(program):
+        struct.pack_into('<I', rom, i * 4, word)
+    
+    gba = GBA()
+    gba.memory.load_rom(bytes(rom))
+    gba.reset()
+    gba.timers.write_control(0, 0x0083)  # Enable, prescaler 1024
+    gba.run_cycles(5000)
+    assert gba.cpu.idle_cycles_skipped == 0
+    print("✓ Leer un contador de timer no se trata como espera")
+    
+    print("\n=== Test de Bucles de Espera completado ===")
+
+def test_halt():
+    """Prueba el avance rápido mientras la CPU está en HALT"""
+    print("\n=== Test de HALT ===\n")
+    
+    program = [
+        0xE3A01301,  # MOV  R1, #0x04000000
+        0xE2812C02,  # ADD  R2, R1, #0x200
+        0xE3A00001,  # MOV  R0, #1
+        0xE1C200B0,  # STRH R0, [R2]          (IE = VBlank)
+        0xE3A00008,  # MOV  R0, #8
+        0xE1C100B4,  # STRH R0, [R1, #4]      (DISPSTAT: IRQ de VBlank)
+        0xE3A00000,  # MOV  R0, #0
+        0xE2822C01,  # ADD  R2, R2, #0x100
+        0xE5C20001,  # STRB R0, [R2, #1]      (HALTCNT)
+        0xE2833001,  # ADD  R3, R3, #1
+        0xEAFFFFFE,  # B    .
+    ]
+    rom = bytearray(0x200)
+    for i, word in enumerate(program):
+        struct.pack_into('<I', rom, i * 4, word)
+    
+    gba = GBA()
+    gba.memory.load_rom(bytes(rom))
+    gba.reset()
+    
+    slices = []
+    run_slice = gba._run_slice
+    gba._run_slice = lambda budget: slices.append(budget) or run_slice(budget)
+    
+    gba.run_cycles(100)
+    assert gba.cpu.halted
+    print("✓ Escribir HALTCNT detiene la CPU")
+    
+    # Sin IME la IRQ de VBlank no se atiende, pero despierta de HALT
+    gba.run_frame()
+    assert not gba.cpu.halted
+    assert gba.ppu.vcount == 160
+    assert gba.cpu.halted_cycles > 160 * 1232 * 9 // 10
+    assert len(slices) < 1000
+    print(f"✓ Frame en HALT en {len(slices)} lotes ({gba.cpu.halted_cycles} ciclos)")
+    
+    gba.run_cycles(100)
+    assert gba.cpu.registers.get(3) == 1
+    print("✓ La ejecución sigue tras el HALT")
+    
+    print("\n=== Test de HALT completado ===")
+
+def test_intr_wait():
+    """Prueba VBlankIntrWait por HLE con el dispatcher de IRQ incorporado"""
+    print("\n=== Test de VBlankIntrWait ===\n")
+    
+    program = {
+        0x00: 0xE3A00301,  # MOV  R0, #0x04000000
+        0x04: 0xE2801C02,  # ADD  R1, R0, #0x200
+        0x08: 0xE3A02001,  # MOV  R2, #1
+        0x0C: 0xE1C120B0,  # STRH R2, [R1]           (IE = VBlank)
+        0x10: 0xE3A02008,  # MOV  R2, #8
+        0x14: 0xE1C020B4,  # STRH R2, [R0, #4]       (DISPSTAT: IRQ de VBlank)
+        0x18: 0xE28F2020,  # ADD  R2, PC, #0x20      (handler)
+        0x1C: 0xE5002004,  # STR  R2, [R0, #-4]
+        0x20: 0xE321F01F,  # MSR  CPSR_c, #0x1F      (habilitar IRQ)
+        0x24: 0xEF050000,  # SWI  0x05               (VBlankIntrWait)
+        0x28: 0xE2833001,  # ADD  R3, R3, #1
+        0x2C: 0xEAFFFFFC,  # B    0x24
+        # Handler de IRQ
+        0x40: 0xE3A00301,  # MOV  R0, #0x04000000
+        0x44: 0xE2801C02,  # ADD  R1, R0, #0x200
+        0x48: 0xE3A02001,  # MOV  R2, #1
+        0x4C: 0xE1C120B2,  # STRH R2, [R1, #2]       (acknowledge IF)
+        0x50: 0xE14020B8,  # STRH R2, [R0, #-8]      (flags de IntrWait)
+        0x54: 0xE12FFF1E,  # BX   LR
+    }
+    rom = bytearray(0x200)
+    for address, word in program.items():
+        struct.pack_into('<I', rom, address, word)
+    
+    gba = GBA()
+    gba.memory.load_rom(bytes(rom))
+    gba.reset()
+    
+    for _ in range(3):
+        gba.run_frame()
+    gba.run_cycles(2000)
+    
+    assert gba.cpu.registers.get(3) == 3
+    assert gba.cpu.halted
+    assert gba.cpu.halted_cycles > 3 * 160 * 1232 * 9 // 10
+    print(f"✓ 3 frames esperando en HALT ({gba.cpu.halted_cycles} ciclos)")
+    
+    print("\n=== Test de VBlankIntrWait completado ===")
+
+def test_timer_mid_batch():
+    """Prueba que el contador de timer avanza dentro de un lote de CPU"""
+    print("\n=== Test de Timer a Mitad de Lote ===\n")
+    
+    def run(jit: bool) -> int:
+        gba = GBA()
+        rom = bytearray(0x200)
+        code = [
+            0xE3A01301,  # MOV  R1, #0x04000000
+            0xE2811C01,  # ADD  R1, R1, #0x100
+            0xE3A04064,  # MOV  R4, #100
+            0xE1D120B0,  # LDRH R2, [R1]        (TM0CNT_L)
+        ] + [0xE1A00000] * 20 + [  # 20 x NOP (mismo bloque)
+            0xE1D130B0,  # LDRH R3, [R1]
+            0xE2544001,  # SUBS R4, R4, #1
+            0x1AFFFFE7,  # BNE  0x0C
+            0xEAFFFFFE,  # B    .
+        ]
+        for i, word in enumerate(code):
+            struct.pack_into('<I', rom, i * 4, word)
+        gba.memory.load_rom(bytes(rom))
+        gba.reset()
+        if not jit:
+            gba.cpu.jit = None
+        
+        gba.memory.write_16(0x04000102, 0x0080)  # Enable, prescaler 1
+        gba.run_cycles(50000)
+        
+        reg = gba.cpu.registers
+        assert reg.get(4) == 0
+        block = gba.cpu.block_cache.lookup(0x0800000C, False)
+        assert bool(block.compiled) == jit
+        return (reg.get(3) - reg.get(2)) & 0xFFFF
+    
+    delta = run(jit=False)
+    assert delta >= 21, delta
+    print(f"✓ Intérprete: {delta} ciclos entre lecturas del mismo bloque")
+    
+    delta = run(jit=True)
+    assert delta >= 21, delta
+    print(f"✓ JIT: {delta} ciclos entre lecturas del mismo bloque")
+    
+    print("\n=== Test de Timer a Mitad de Lote completado ===")
+
+def test_timer_irq_mid_block():
+    """Prueba una IRQ de timer que vence al leer su contador dentro de un bloque"""
+    print("\n=== Test de IRQ de Timer a Mitad de Bloque ===\n")
+    
+    program = {
+        0x00: 0xE3A00301,  # MOV  R0, #0x04000000
+        0x04: 0xE2801C01,  # ADD  R1, R0, #0x100
+        0x08: 0xE3A02CFF,  # MOV  R2, #0xFF00
+        0x0C: 0xE38228C0,  # ORR  R2, R2, #0xC00000  (TM0CNT_H: enable + IRQ)
+        0x10: 0xE2803C02,  # ADD  R3, R0, #0x200
+        0x14: 0xE28F4024,  # ADD  R4, PC, #0x24      (handler)
+        0x18: 0xE5004004,  # STR  R4, [R0, #-4]
+        0x1C: 0xE3A04008,  # MOV  R4, #8
+        0x20: 0xE1C340B0,  # STRH R4, [R3]           (IE = Timer 0)
+        0x24: 0xE3A04001,  # MOV  R4, #1
+        0x28: 0xE1C340B8,  # STRH R4, [R3, #8]       (IME)
+        0x2C: 0xE5812000,  # STR  R2, [R1]
+        0x30: 0xE321F01F,  # MSR  CPSR_c, #0x1F      (habilitar IRQ)
+        0x34: 0xEA000008,  # B    0x5C
+        # Handler de IRQ
+        0x40: 0xE3A00301,  # MOV  R0, #0x04000000
+        0x44: 0xE2800C02,  # ADD  R0, R0, #0x200
+        0x48: 0xE3A02008,  # MOV  R2, #8
+        0x4C: 0xE1C020B2,  # STRH R2, [R0, #2]       (acknowledge IF)
+        0x50: 0xE2877001,  # ADD  R7, R7, #1
+        0x54: 0xE12FFF1E,  # BX   LR
+        # Bucle principal: la IRQ vence en el LDR del contador
+        0x5C: 0xE2855001,  # ADD  R5, R5, #1
+        0x60: 0xE5912000,  # LDR  R2, [R1]           (TM0CNT)
+        0x64: 0xE28DD004,  # ADD  SP, SP, #4
+        0x68: 0xE24DD004,  # SUB  SP, SP, #4
+        0x6C: 0xE2866001,  # ADD  R6, R6, #1
+        0x70: 0xEAFFFFF9,  # B    0x5C
+    }
+    rom = bytearray(0x200)
+    for address, word in program.items():
+        struct.pack_into('<I', rom, address, word)
+    
+    for jit in (False, True):
+        gba = GBA()
+        gba.memory.load_rom(bytes(rom))
+        gba.reset()
+        if not jit:
+            gba.cpu.jit = None
+        gba.timers.write_reload(0, 0xFF00)  # Overflow cada 256 ciclos
+        sp = gba.cpu.registers.get(13)
+        gba.run_cycles(100000)
+        
+        reg = gba.cpu.registers
+        assert reg.get(7) == 100000 // 256, reg.get(7)
+        assert reg.cpsr & 0x1F == CPUMode.SYSTEM and not reg.irq_disabled
+        assert reg.get(13) == sp
+        block = gba.cpu.block_cache.lookup(0x0800005C, False)
+        assert bool(block.compiled) == jit
+        name = "JIT" if jit else "Intérprete"
+        print(f"✓ {name}: {reg.get(7)} IRQs atendidas, de vuelta en modo System")
+    
+    print("\n=== Test de IRQ de Timer a Mitad de Bloque completado ===")
+
 if __name__ == "__main__":
     test_timer_basic()
     test_timer_prescaler()
@@ -273,4 +598,11 @@ if __name__ == "__main__":
     test_dma_16bit()
     test_dma_address_control()
     test_dma_timing()
-    test_dma_vblank_trigger()
\ No newline at end of file
+    test_dma_vblank_trigger()
+    test_run_cycles()
+    test_scheduler()
+    test_idle_loop()
+    test_halt()
+    test_intr_wait()
+    test_timer_mid_batch()
+    test_timer_irq_mid_block()
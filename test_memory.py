@@ -144,10 +144,321 @@ def test_interrupts():
     assert (mem.get_io_register_16(IORegister.IF) & InterruptFlags.VBLANK) == 0
     print("✓ IF limpiado después de acknowledge")
     
+    # Bits altos de IE/IF (DMA, keypad) también disparan la IRQ
+    mem.write_16(0x04000200, InterruptFlags.DMA0)
+    mock_cpu.irq_triggered = False
+    mem.request_interrupt(InterruptFlags.DMA0)
+    assert mock_cpu.irq_triggered
+    assert mem.get_io_register_16(IORegister.IF) == InterruptFlags.DMA0
+    print("✓ Interrupción de DMA 0 (bit 8) disparada")
+    
     print("\n=== Test de Interrupciones completado ===")
 
+def test_wait_states():
+    """Prueba la contabilidad de wait states según WAITCNT"""
+    mem = MemoryBus()
+    
+    print("\n=== Test de Wait States ===\n")
+    
+    # IWRAM no tiene esperas; EWRAM 2 por halfword
+    mem.read_32(0x03000000)
+    assert mem.stall_cycles == 0
+    mem.read_16(0x02000000)
+    assert mem.stall_cycles == 2
+    mem.write_32(0x02000000, 0)
+    assert mem.stall_cycles == 2 + 5
+    print("✓ Esperas de IWRAM/EWRAM")
+    
+    # ROM WS0 por defecto: 4 N, 2 S; 32 bits = N + S
+    mem.stall_cycles = 0
+    mem.read_16(0x08000000)
+    assert mem.stall_cycles == 4
+    mem.stall_cycles = 0
+    mem.read_32(0x08000000)
+    assert mem.stall_cycles == 4 + 1 + 2
+    mem.stall_cycles = 0
+    mem.read_block_32(0x08000000, 4)
+    assert mem.stall_cycles == 7 + 3 * 5
+    print("✓ Esperas de ROM (N/S)")
+    
+    # Configuración típica de juegos: WS0 3/1, SRAM 8, prefetch activo
+    mem.write_16(0x04000204, 0x4317)
+    assert mem.wait_n16[0x8] == 3 and mem.wait_s16[0x8] == 1
+    assert mem.wait_n32[0x8] == 3 + 1 + 1
+    assert mem.wait_n16[0xE] == 8
+    assert mem.fetch_wait_16[0x8] == 0 and mem.fetch_wait_32[0x8] == 0
+    print("✓ WAITCNT recalcula las tablas")
+    
+    # Sin prefetch el fetch secuencial paga las esperas S
+    mem.write_16(0x04000204, 0x0317)
+    assert mem.fetch_wait_16[0x8] == 1
+    print("✓ Prefetch desactivado")
+    
+    print("\n=== Test de Wait States completado ===")
+
+def test_rom_views():
+    """Prueba las vistas tipadas de la ROM"""
+    mem = MemoryBus()
+    
+    print("\n=== Test de Vistas de ROM ===\n")
+    
+    # Tamaño impar: los últimos bytes quedan fuera de las vistas anchas
+    mem.load_rom(bytes(range(1, 12)))
+    assert mem.read_8(0x08000000) == 0x01
+    assert mem.read_16(0x08000002) == 0x0403
+    assert mem.read_32(0x08000004) == 0x08070605
+    # Mirrors de los wait states
+    assert mem.read_32(0x0A000004) == 0x08070605
+    assert mem.read_16(0x0C000000) == 0x0201
+    assert len(mem.rom_halfwords) == 5 and len(mem.rom_words) == 2
+    print("✓ Lecturas por vistas de 8/16/32 bits")
+    
+    # Cola fuera de la vista de 32 bits y open bus más allá del final
+    assert mem.read_16(0x0800000A) == 0x000B | (((0x0B >> 1) & 0xFF) << 8)
+    assert mem.read_32(0x08000008) == (0x09 | (0x0A << 8) | (0x0B << 16) |
+                                       (((0x0B >> 1) & 0xFF) << 24))
+    assert mem.read_8(0x08000100) == 0x80
+    print("✓ Bytes finales y open bus")
+    
+    assert mem.read_block_32(0x08000000, 2) == [0x04030201, 0x08070605]
+    print("✓ Lectura múltiple desde ROM")
+    
+    print("\n=== Test de Vistas de ROM completado ===")
+
+def test_page_tables():
+    """Prueba el despacho por tabla de regiones"""
+    mem = MemoryBus()
+    
+    print("\n=== Test de Tablas de Regiones ===\n")
+    
+    assert len(mem._read8) == len(mem._write32) == 256
+    
+    # Regiones sin mapear: leen 0 y descartan escrituras
+    mem.write_32(0x01000000, 0x12345678)
+    assert mem.read_32(0x01000000) == 0
+    assert mem.read_16(0x10000000) == 0
+    print("✓ Regiones sin mapear")
+    
+    # Escritura de 32 bits directa en RAM y por mitades en el resto
+    mem.write_32(0x02000010, 0xCAFEBABE)
+    assert mem.read_16(0x02000012) == 0xCAFE
+    mem.write_32(0x07000000, 0x11223344)
+    assert mem.read_32(0x07000000) == 0x11223344
+    mem.write_8(0x07000004, 0xFF)  # OAM ignora 8 bits
+    assert mem.read_8(0x07000004) == 0
+    print("✓ Escrituras por región")
+    
+    # BIOS protegido: cambia el handler y devuelve la última lectura
+    mem.load_bios(bytes([0xAA, 0xBB, 0xCC, 0xDD]))
+    assert mem.read_8(0x00000001) == 0xBB
+    mem.bios_readable = False
+    assert mem._read8[0x00] == mem._read8_bios_protected
+    assert mem.read_8(0x00000000) == 0xBB
+    mem.bios_readable = True
+    assert mem.read_32(0x00000000) == 0xDDCCBBAA
+    print("✓ Handlers del BIOS según protección")
+    
+    print("\n=== Test de Tablas de Regiones completado ===")
+
+def test_typed_views():
+    """Prueba que las vistas tipadas comparten buffer con los arrays de NumPy"""
+    mem = MemoryBus()
+    
+    print("\n=== Test de Vistas Tipadas ===\n")
+    
+    # Lo escrito por el bus lo ve la PPU en los arrays de NumPy
+    mem.write_32(0x06000100, 0xA1B2C3D4)
+    assert list(mem.vram[0x100:0x104]) == [0xD4, 0xC3, 0xB2, 0xA1]
+    mem.write_16(0x05000002, 0x7FFF)
+    assert mem.palette_ram.view('<u2')[1] == 0x7FFF
+    print("✓ Escrituras visibles en los arrays")
+    
+    # Y al revés: lo escrito en bloque se lee por las vistas
+    mem.ewram[0x20:0x24] = [0x78, 0x56, 0x34, 0x12]
+    assert mem.read_32(0x02000020) == 0x12345678
+    assert mem.read_16(0x02000022) == 0x1234
+    assert isinstance(mem.read_32(0x02000020), int)
+    print("✓ Lecturas de 16/32 bits sin ensamblar bytes")
+    
+    # Escrituras de 8 bits en paleta/VRAM duplican el byte
+    mem.write_8(0x05000011, 0x3C)
+    assert mem.read_16(0x05000010) == 0x3C3C
+    mem.write_8(0x06010001, 0x55)  # OBJ VRAM ignora 8 bits
+    assert mem.read_16(0x06010000) == 0
+    # Mirror de los últimos 32 KB de VRAM
+    mem.write_32(0x06018004, 0xDEADBEEF)
+    assert mem.read_32(0x06010004) == 0xDEADBEEF
+    print("✓ Duplicado de bytes y mirror de VRAM")
+    
+    print("\n=== Test de Vistas Tipadas completado ===")
+
+def test_io_dispatch():
+    """Prueba el dispatch de I/O por tablas y las máscaras de escritura"""
+    mem = MemoryBus()
+    
+    print("\n=== Test de Dispatch de I/O ===\n")
+    
+    class MockDMA:
+        def __init__(self):
+            self.writes = []
+        
+        def write_control(self, channel, value):
+            self.writes.append((channel, value))
+    
+    class MockAPU:
+        def __init__(self):
+            self.fifo_a = []
+        
+        def write_fifo_a(self, value, count=4):
+            self.fifo_a.append((value, count))
+    
+    mem.dma = MockDMA()
+    mem.apu = MockAPU()
+    
+    # Una escritura de 16 bits llama al handler una sola vez, con el valor completo
+    mem.write_16(0x040000DE, 0x8400)
+    assert mem.dma.writes == [(3, 0x8400)]
+    # Una de 8 bits lo llama con la halfword ya combinada
+    mem.write_8(0x040000DE, 0x01)
+    assert mem.dma.writes[-1] == (3, 0x8401)
+    print("✓ Handlers de 16 bits invocados una vez por escritura")
+    
+    # 32 bits: DMA3CNT_L + DMA3CNT_H, el handler recibe solo la parte alta
+    mem.write_32(0x040000DC, 0x80000010)
+    assert mem.dma.writes[-1] == (3, 0x8000)
+    assert mem.read_16(0x040000DC) == 0x0010
+    
+    # El FIFO recibe la word entera de una vez
+    mem.write_32(0x040000A0, 0x04030201)
+    assert mem.apu.fifo_a == [(0x04030201, 4)]
+    print("✓ Escrituras de 32 bits")
+    
+    # Máscaras de IO_REGISTER_INFO: bit 3 de DISPCNT fijo, VCOUNT solo lectura
+    mem.write_16(0x04000000, 0xFFFF)
+    assert mem.read_16(0x04000000) == 0xFFF7
+    mem.write_16(0x04000006, 0x1234)
+    assert mem.get_io_register_16(IORegister.VCOUNT) == 0
+    # Los bits no escribibles conservan su valor
+    mem.set_io_register_16(IORegister.SOUNDCNT_X, 0x000F)
+    mem.write_16(0x04000084, 0x0080)
+    assert mem.get_io_register_16(IORegister.SOUNDCNT_X) == 0x008F
+    print("✓ Máscaras de escritura aplicadas")
+    
+    # Un byte a POSTFLG no dispara HALTCNT
+    class MockCPU:
+        def __init__(self):
+            self.halts = 0
+        
+        def halt(self):
+            self.halts += 1
+    
+    mem.cpu = MockCPU()
+    mem.write_8(0x04000300, 0x01)
+    assert mem.cpu.halts == 0
+    mem.write_8(0x04000301, 0x00)
+    assert mem.cpu.halts == 1
+    print("✓ HALTCNT solo con escrituras que lo incluyen")
+    
+    # Lecturas con handler, por byte y por halfword
+    mem.key_state = 0x03FE
+    assert mem.read_16(0x04000130) == 0x03FE
+    assert mem.read_8(0x04000131) == 0x03
+    print("✓ Lecturas por tabla")
+    
+    print("\n=== Test de Dispatch de I/O completado ===")
+
+def test_rom_mapping():
+    """Prueba que la ROM se carga sin copias"""
+    import gc
+    import os
+    import tempfile
+    from gba import GBA
+    
+    print("\n=== Test de ROM Mapeada ===\n")
+    
+    # Desde un bytearray el bus usa el mismo buffer
+    mem = MemoryBus()
+    data = bytearray(0x200)
+    mem.load_rom(data)
+    data[0x10:0x14] = b'\x78\x56\x34\x12'
+    assert mem.read_32(0x08000010) == 0x12345678
+    print("✓ load_rom no copia el buffer")
+    
+    # Desde archivo: mmap de solo lectura con la cabecera leída del mapeo
+    rom = bytearray(0x400)
+    rom[0xA0:0xAC] = b'TESTROM\x00\x00\x00\x00\x00'
+    rom[0x100:0x10C] = b'SRAM_V113\x00\x00\x00'
+    rom[0x200:0x204] = b'\xEF\xBE\xAD\xDE'
+    fd, path = tempfile.mkstemp(suffix='.gba')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(rom)
+    
+    try:
+        gba = GBA()
+        assert gba.load_rom(path)
+        assert gba.memory.read_32(0x08000200) == 0xDEADBEEF
+        assert not gba.memory.rom.flags.writeable
+        print("✓ ROM mapeada en solo lectura")
+        
+        # La ROM sigue accesible después de cerrar el archivo
+        assert gba.memory.read_16(0x08000100) == 0x5253  # 'SR'
+        # Soltar el mapeo antes de borrar el archivo (necesario en Windows)
+        del gba
+        gc.collect()
+    finally:
+        os.remove(path)
+    
+    print("\n=== Test de ROM Mapeada completado ===")
+
+def test_save_detection():
+    """Prueba la detección del tipo de guardado"""
+    from memory import save_manager
+    from memory.save_manager import SaveManager, SaveType, detect_save_type
+    
+    print("\n=== Test de Detección de Guardado ===\n")
+    
+    rom = bytearray(0x1000)
+    assert detect_save_type(rom) == (SaveType.NONE, None)
+    
+    # Solo cuentan los strings alineados a 4 bytes
+    rom[0x101:0x10D] = b'FLASH1M_V103'
+    assert detect_save_type(rom) == (SaveType.NONE, None)
+    rom[0x200:0x20C] = b'FLASH1M_V103'
+    assert detect_save_type(rom) == (SaveType.FLASH_128K, 'FLASH1M_V103')
+    print("✓ Tipo y versión de la librería")
+    
+    # EEPROM tiene prioridad aunque aparezca después
+    rom[0x800:0x80B] = b'EEPROM_V124'
+    assert detect_save_type(rom) == (SaveType.EEPROM_8K, 'EEPROM_V124')
+    print("✓ Prioridad entre librerías")
+    
+    # El resultado se cachea por tamaño y CRC32 de la ROM
+    key = next(k for k, v in save_manager._detect_cache.items() if v[1] == 'EEPROM_V124')
+    save_manager._detect_cache[key] = (SaveType.SRAM, 'SRAM_V113')
+    assert detect_save_type(bytes(rom)) == (SaveType.SRAM, 'SRAM_V113')
+    del save_manager._detect_cache[key]
+    print("✓ Caché por hash de la ROM")
+    
+    # El bus y el gestor de guardado usan la misma detección
+    mem = MemoryBus()
+    mem.load_rom(bytes(rom))
+    assert (mem.save_type, mem.save_library) == (SaveType.EEPROM_8K, 'EEPROM_V124')
+    manager = SaveManager("test.gba")
+    assert manager.detect_type(bytes(0x100)) == SaveType.SRAM
+    assert manager.library is None
+    print("✓ MemoryBus y SaveManager")
+    
+    print("\n=== Test de Detección de Guardado completado ===")
+
 if __name__ == "__main__":
     test_memory_regions()
     test_io_registers()
     test_keypad()
-    test_interrupts()
\ No newline at end of file
+    test_interrupts()
+    test_wait_states()
+    test_rom_views()
+    test_page_tables()
+    test_typed_views()
+    test_io_dispatch()
+    test_rom_mapping()
+    test_save_detection()
@@ -127,7 +127,46 @@ def test_push_pop():
     
     print("\n✓ PUSH/POP funciona")
 
+def test_thumb_alu_dispatch():
+    """Prueba la tabla de despacho THUMB con operaciones ALU especializadas"""
+    mem = MemoryBus()
+    
+    rom_data = bytearray(256)
+    
+    struct.pack_into('<H', rom_data, 0, 0x200F)   # MOV R0, #0x0F
+    struct.pack_into('<H', rom_data, 2, 0x2133)   # MOV R1, #0x33
+    struct.pack_into('<H', rom_data, 4, 0x4008)   # AND R0, R1
+    struct.pack_into('<H', rom_data, 6, 0x4348)   # MUL R0, R1
+    struct.pack_into('<H', rom_data, 8, 0x43CA)   # MVN R2, R1
+    struct.pack_into('<H', rom_data, 10, 0x4288)  # CMP R0, R1
+    
+    mem.load_rom(bytes(rom_data))
+    
+    cpu = ARM7TDMI(mem)
+    cpu.reset()
+    cpu.registers.thumb_mode = True
+    
+    print("\n=== Test de Despacho ALU THUMB ===\n")
+    
+    thumb = cpu.thumb_decoder
+    assert len(thumb._decode_table) == 1024
+    assert thumb._decode_table[0x4008 >> 6] == thumb._format4_and
+    assert thumb._decode_table[0x4348 >> 6] == thumb._format4_mul
+    assert thumb._decode_table[0x0093 >> 6] == thumb._format1_lsl
+    assert thumb._decode_table[0x2B48 >> 6] == thumb._format3_cmp
+    
+    for _ in range(6):
+        cpu.step()
+    
+    assert cpu.registers.get(0) == (0x03 * 0x33)
+    assert cpu.registers.get(2) == 0xFFFFFFCC
+    assert cpu.registers.flag_c == True  # 0x99 >= 0x33
+    assert cpu.registers.flag_z == False
+    
+    print("✓ Handlers especializados de Format 1/3/4 funcionan")
+
 if __name__ == "__main__":
     test_thumb_instructions()
     test_thumb_branch()
-    test_push_pop()
\ No newline at end of file
+    test_push_pop()
+    test_thumb_alu_dispatch()
\ No newline at end of file